@@ -0,0 +1,100 @@
+"""Account search benchmark
+
+Measure the latency of the account search of the in-process n-gram index
+(the fallback of the pg_trgm indexes) as the number of accounts of a user
+grows, the first search builds the index and the next ones reuse it.
+
+Usage:
+
+    $ SECRET_KEY=benchmark python -m benchmarks.account_search_benchmark
+"""
+import argparse
+import random
+import string
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from src.infra.database.config.database import Base
+from src.infra.database.models import UserModel, VaultModel, AccountModel
+from src.infra.database.repositories.account_repository import AccountRepository
+from src.utils import search_utils
+
+QUERIES = ('facebok', 'gmail', 'account-123', 'example.com', 'usrname', 'zzzzzz')
+
+
+def word(randomizer: random.Random, length: int) -> str:
+    return ''.join(randomizer.choices(string.ascii_lowercase, k=length))
+
+
+def seed(session, accounts_count: int) -> UserModel:
+    randomizer = random.Random(accounts_count)
+    user = UserModel(
+        username='benchmark',
+        email='benchmark@example.com',
+        password='not-used',
+        secret_key='not-used',
+    )
+    session.add(user)
+    session.flush()
+
+    vault = VaultModel(name='Benchmark', icon_type='icon', user_id=user.id)
+    session.add(vault)
+    session.flush()
+
+    session.add_all(
+        AccountModel(
+            name=f'{word(randomizer, 8)} account-{number}',
+            username=f'username-{word(randomizer, 5)}',
+            email=f'{word(randomizer, 6)}@example.com',
+            password='not-used',
+            page_url=f'https://www.{word(randomizer, 10)}.com/',
+            icon_type='icon',
+            vault_id=vault.id,
+            user_id=user.id,
+        )
+        for number in range(accounts_count)
+    )
+    session.commit()
+    return user
+
+
+def measure(session, user: UserModel, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        for query in QUERIES:
+            session.expire_all()
+            start = time.perf_counter()
+            AccountRepository(session).search_accounts(user_id=user.id, query=query, limit=20)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[int(len(timings) * 0.95) - 1] * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', type=int, nargs='+',
+                        default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f'{"accounts":>10} {"index build (ms)":>18} {"search p95 (ms)":>17}')
+    for accounts_count in args.counts:
+        engine = create_engine('sqlite://', poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        user = seed(session, accounts_count)
+
+        search_utils.search_index_cache.clear()
+        start = time.perf_counter()
+        AccountRepository(session).search_accounts(user_id=user.id, query=QUERIES[0], limit=20)
+        build = (time.perf_counter() - start) * 1000
+        search = measure(session, user, args.repeat)
+
+        print(f'{accounts_count:>10} {build:>18.1f} {search:>17.2f}')
+        session.close()
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Accounts list benchmark
+
+Measure the latency of the GET /accounts path operation as the number of
+accounts of a user grows, comparing the per-row secret key unwrap against
+the key cache.
+
+Usage:
+
+    $ SECRET_KEY=benchmark python -m benchmarks.accounts_list_benchmark
+"""
+import argparse
+import asyncio
+import time
+from fastapi import Request, Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from src.core import security, key_management
+from src.infra.database.config.database import Base
+from src.infra.database.models import UserModel, VaultModel, AccountModel
+from src.infra.database.repositories.account_repository import AccountRepository
+from src.apps.v1.routes import accounts_route
+
+
+def seed(session, accounts_count: int) -> UserModel:
+    secret_key = security.secret_key_generator()
+    user_key = security.derive_user_key(secret_key)
+    user = UserModel(
+        username='benchmark',
+        email='benchmark@example.com',
+        password='not-used',
+        secret_key=security.encode_secret_key(secret_key),
+    )
+    session.add(user)
+    session.flush()
+
+    vault = VaultModel(name='Benchmark', icon_type='icon', user_id=user.id)
+    session.add(vault)
+    session.flush()
+
+    session.add_all(
+        AccountModel(
+            name=f'account-{number}',
+            username='username',
+            email='benchmark@example.com',
+            password=security.encode_password(f'password-{number}', user_key),
+            icon_type='icon',
+            vault_id=vault.id,
+            user_id=user.id,
+        )
+        for number in range(accounts_count)
+    )
+    session.commit()
+    return user
+
+
+def list_per_row_unwrap(session, user: UserModel) -> None:
+    for account in AccountRepository(session).get_accounts(
+            user_id=user.id, fields=list(accounts_route.ACCOUNT_FIELDS)):
+        security.decode_password(
+            password_encode=account.password,
+            user_key=security.derive_user_key(security.decode_secret_key(
+                secret_key_encode=user.secret_key)),
+        )
+
+
+def list_key_cache(session, user: UserModel) -> None:
+    request = Request({'type': 'http', 'method': 'GET', 'path': '/accounts/',
+                       'query_string': b'', 'headers': []})
+    asyncio.run(accounts_route.get_accounts(
+        request=request, response=Response(), limit=None, cursor=None, sort='id',
+        fields=','.join(accounts_route.ACCOUNT_FIELDS), current_user=user, session=session))
+
+
+def measure(function, session, user: UserModel, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        session.expire_all()
+        start = time.perf_counter()
+        function(session, user)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', type=int, nargs='+',
+                        default=[10, 25, 50, 100, 200])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"accounts":>10} {"per-row (ms)":>14} {"cached (ms)":>14} {"speedup":>9}')
+    for accounts_count in args.counts:
+        # The sync repositories run in the threadpool, share the in-memory database
+        engine = create_engine('sqlite://', poolclass=StaticPool,
+                               connect_args={'check_same_thread': False})
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        user = seed(session, accounts_count)
+
+        key_management.key_cache.clear()
+        per_row = measure(list_per_row_unwrap, session, user, args.repeat)
+        cached = measure(list_key_cache, session, user, args.repeat)
+
+        print(f'{accounts_count:>10} {per_row:>14.1f} {cached:>14.1f} {per_row / cached:>8.1f}x')
+        session.close()
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Envelope benchmark
+
+Compare the per-field encrypt and decrypt cost of the legacy cryptocode
+format against the versioned AES-GCM envelope.
+
+Usage:
+
+    $ SECRET_KEY=benchmark python -m benchmarks.envelope_benchmark
+"""
+import argparse
+import time
+import cryptocode
+from src.core import security
+
+
+def measure(function, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    password = 'Mypassword123.'
+    secret_key = security.secret_key_generator()
+    user_key = security.derive_user_key(secret_key)
+    legacy_password = cryptocode.encrypt(password, secret_key)
+    envelope_password = security.encode_password(password, user_key)
+
+    # The envelope cipher is orders of magnitude cheaper, run it more often
+    envelope_iterations = args.iterations * 1000
+    results = {
+        'legacy encrypt': measure(
+            lambda: cryptocode.encrypt(password, secret_key), args.iterations),
+        'legacy decrypt': measure(
+            lambda: security.decode_password(legacy_password, user_key), args.iterations),
+        'envelope encrypt': measure(
+            lambda: security.encode_password(password, user_key), envelope_iterations),
+        'envelope decrypt': measure(
+            lambda: security.decode_password(envelope_password, user_key), envelope_iterations),
+    }
+
+    print(f'{"operation":>18} {"us/field":>12}')
+    for operation, cost in results.items():
+        print(f'{operation:>18} {cost:>12.1f}')
+    print(f'{"decrypt speedup":>18} {results["legacy decrypt"] / results["envelope decrypt"]:>11.0f}x')
+
+
+if __name__ == '__main__':
+    main()
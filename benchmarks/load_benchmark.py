@@ -0,0 +1,382 @@
+"""Load benchmark
+
+Boot the app in-process against a local database, seed synthetic users,
+vaults and accounts, and drive every v1 route with a concurrent async HTTP
+client. The p50/p95/p99 latency and the throughput of every route are
+reported as JSON, and can be compared against a stored baseline.
+
+Usage:
+
+    $ python -m benchmarks.load_benchmark --output results.json
+    $ python -m benchmarks.load_benchmark --baseline results.json
+
+The database is a sqlite file by default, set DATABASE_URL to run against
+postgres. The comparison exits with status 1 when a route regressed.
+"""
+import os
+
+# The settings are read on import, the defaults make the suite self contained
+BENCHMARK_DATABASE = '/tmp/11pass-load-benchmark.sqlite'
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{BENCHMARK_DATABASE}')
+os.environ.setdefault('PROJECT_NAME', '11Pass API benchmark')
+os.environ.setdefault('PROJECT_DESCRIPTION', '')
+os.environ.setdefault('SECRET_KEY', 'benchmark-secret-key')
+os.environ.setdefault('ALGORITHM', 'HS256')
+os.environ.setdefault('ACCESS_TOKEN_EXPIRE_MINUTES', '60')
+os.environ.setdefault('API_PREFIX_ROUTER', '/api/v1')
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+import httpx
+from src.application import create_app
+from src.core import security
+from src.core.settings import Settings
+from src.infra.database.config import database, sharding
+from src.infra.database.models import UserModel, VaultModel, AccountModel
+from src.infra.database.repositories.directory_repository import DirectoryRepository
+from src.infra.providers import password_provider
+
+settings = Settings()
+
+PASSWORD = 'Benchmark123.'
+ACCOUNT_PASSWORD = 'account-password'
+# Latency percentiles and throughput compared against the baseline
+COMPARED_METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps')
+
+
+class Context():
+    """The seeded users and the ids created while the routes run."""
+
+    def __init__(self) -> None:
+        self.users: List[Dict[str, Any]] = []
+        self.sequence = itertools.count()
+
+    def user(self, number: int) -> Dict[str, Any]:
+        return self.users[number % len(self.users)]
+
+    def unique(self, prefix: str) -> str:
+        return f'{prefix}-{next(self.sequence)}'
+
+
+def seed(users_count: int, vaults_count: int, accounts_count: int) -> List[Dict[str, Any]]:
+    """Create the tables and insert the users, every one with its vaults and accounts.
+
+    The users are registered in the directory first, as the signup does, the
+    login finds them there and the rows take the ids it allocates.
+    """
+    if database.SQLALCHEMY_DATABASE_URL.startswith('sqlite') and os.path.exists(BENCHMARK_DATABASE):
+        os.remove(BENCHMARK_DATABASE)
+    for engine in (database.engine, *database.shard_engines):
+        database.Base.metadata.drop_all(engine)
+        database.Base.metadata.create_all(engine)
+
+    # bcrypt is slow on purpose, every user has the same password
+    password_hash = password_provider.hash_password(PASSWORD)
+    users = []
+    with database.SessionLocal() as directory:
+        for user_number in range(users_count):
+            entry = DirectoryRepository(directory).create_entry(
+                email=f'user{user_number}@example.com', username=f'user{user_number}',
+                place=sharding.shard_map.place)
+
+            with database.ShardSessionLocal[entry.shard]() as session:
+                secret_key = security.secret_key_generator()
+                user_key = security.derive_user_key(secret_key)
+                user = UserModel(
+                    id=entry.id,
+                    username=entry.username,
+                    email=entry.email,
+                    password=password_hash,
+                    secret_key=security.encode_secret_key(secret_key),
+                )
+                session.add(user)
+                session.flush()
+
+                vaults = [
+                    VaultModel(name=f'vault-{number}', icon_type='icon', user_id=user.id)
+                    for number in range(vaults_count)
+                ]
+                session.add_all(vaults)
+                session.flush()
+
+                accounts = [
+                    AccountModel(
+                        name=f'account-{number}',
+                        username='username',
+                        email='account@example.com',
+                        password=security.encode_password(ACCOUNT_PASSWORD, user_key),
+                        icon_type='icon',
+                        vault_id=vaults[number % vaults_count].id,
+                        user_id=user.id,
+                    )
+                    for number in range(accounts_count)
+                ]
+                session.add_all(accounts)
+                session.commit()
+
+            users.append({
+                'id': user.id,
+                'email': user.email,
+                'vault_ids': [vault.id for vault in vaults],
+                'account_ids': [account.id for account in accounts],
+                'created_vault_ids': [],
+                'created_account_ids': [],
+            })
+    return users
+
+
+def scenarios(prefix: str) -> List[tuple]:
+    """The routes in run order, as (route, request factory)."""
+
+    def auth(user: Dict[str, Any]) -> Dict[str, str]:
+        return {'Authorization': f'Bearer {user["token"]}'}
+
+    def vault_body(context: Context, user: Dict[str, Any]) -> Dict[str, Any]:
+        return {'name': context.unique('vault'), 'description': 'Benchmark vault.',
+                'icon_type': 'icon', 'user_id': user['id']}
+
+    def account_body(context: Context, user: Dict[str, Any]) -> Dict[str, Any]:
+        return {'name': context.unique('account'), 'username': 'username',
+                'email': 'account@example.com', 'password': ACCOUNT_PASSWORD,
+                'description': None, 'page_url': None, 'icon_type': 'icon',
+                'vault_id': user['vault_ids'][0], 'user_id': user['id']}
+
+    async def signup(client, context, number):
+        name = context.unique('signup')
+        return await client.post(f'{prefix}/auth/signup', json={
+            'username': name, 'email': f'{name}@example.com', 'profile_url': None,
+            'password': PASSWORD, 'secret_key': None})
+
+    async def login(client, context, number):
+        return await client.post(f'{prefix}/auth/login', data={
+            'username': context.user(number)['email'], 'password': PASSWORD})
+
+    async def get_vaults(client, context, number):
+        return await client.get(f'{prefix}/vaults/', headers=auth(context.user(number)))
+
+    async def create_vault(client, context, number):
+        user = context.user(number)
+        response = await client.post(
+            f'{prefix}/vaults/', json=vault_body(context, user), headers=auth(user))
+        if response.status_code == 201:
+            user['created_vault_ids'].append(response.json()['id'])
+        return response
+
+    async def get_vault(client, context, number):
+        user = context.user(number)
+        vault_id = user['vault_ids'][number % len(user['vault_ids'])]
+        return await client.get(f'{prefix}/vaults/{vault_id}', headers=auth(user))
+
+    async def update_vault(client, context, number):
+        user = context.user(number)
+        vault_id = user['vault_ids'][number % len(user['vault_ids'])]
+        return await client.put(
+            f'{prefix}/vaults/{vault_id}', json=vault_body(context, user), headers=auth(user))
+
+    async def get_accounts(client, context, number):
+        return await client.get(f'{prefix}/accounts/', headers=auth(context.user(number)))
+
+    async def get_accounts_page(client, context, number):
+        return await client.get(f'{prefix}/accounts/', params={'limit': 50},
+                                headers=auth(context.user(number)))
+
+    async def create_account(client, context, number):
+        user = context.user(number)
+        response = await client.post(
+            f'{prefix}/accounts/', json=account_body(context, user), headers=auth(user))
+        if response.status_code == 201:
+            user['created_account_ids'].append(response.json()['id'])
+        return response
+
+    async def get_account(client, context, number):
+        user = context.user(number)
+        account_id = user['account_ids'][number % len(user['account_ids'])]
+        return await client.get(f'{prefix}/accounts/{account_id}', headers=auth(user))
+
+    async def reveal_account(client, context, number):
+        user = context.user(number)
+        account_id = user['account_ids'][number % len(user['account_ids'])]
+        return await client.post(f'{prefix}/accounts/{account_id}/reveal', headers=auth(user))
+
+    async def reveal_accounts(client, context, number):
+        user = context.user(number)
+        return await client.post(
+            f'{prefix}/accounts/reveal', json={'ids': user['account_ids'][:50]}, headers=auth(user))
+
+    async def update_account(client, context, number):
+        user = context.user(number)
+        account_id = user['account_ids'][number % len(user['account_ids'])]
+        return await client.put(
+            f'{prefix}/accounts/{account_id}', json=account_body(context, user), headers=auth(user))
+
+    async def delete_account(client, context, number):
+        user = context.user(number)
+        account_id = user['created_account_ids'].pop()
+        return await client.delete(f'{prefix}/accounts/{account_id}', headers=auth(user))
+
+    async def delete_vault(client, context, number):
+        user = context.user(number)
+        vault_id = user['created_vault_ids'].pop()
+        return await client.delete(f'{prefix}/vaults/{vault_id}', headers=auth(user))
+
+    # The deletes remove what the creates added, so they run after them
+    return [
+        ('POST /auth/signup', signup),
+        ('POST /auth/login', login),
+        ('GET /vaults/', get_vaults),
+        ('POST /vaults/', create_vault),
+        ('GET /vaults/{id}', get_vault),
+        ('PUT /vaults/{id}', update_vault),
+        ('GET /accounts/', get_accounts),
+        ('GET /accounts/?limit=50', get_accounts_page),
+        ('POST /accounts/', create_account),
+        ('GET /accounts/{id}', get_account),
+        ('POST /accounts/{id}/reveal', reveal_account),
+        ('POST /accounts/reveal', reveal_accounts),
+        ('PUT /accounts/{id}', update_account),
+        ('DELETE /accounts/{id}', delete_account),
+        ('DELETE /vaults/{id}', delete_vault),
+    ]
+
+
+def percentile(timings: List[float], fraction: float) -> float:
+    """Nearest rank percentile of sorted timings."""
+    if not timings:
+        return 0.0
+    return timings[max(math.ceil(fraction * len(timings)) - 1, 0)]
+
+
+async def run_route(client: httpx.AsyncClient, context: Context, request: Callable[..., Awaitable],
+                    requests_count: int, concurrency: int) -> Dict[str, Any]:
+    """Run a route requests_count times with concurrency workers."""
+    numbers = iter(range(requests_count))
+    timings = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        for number in numbers:
+            start = time.perf_counter()
+            response = await request(client, context, number)
+            timings.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    timings.sort()
+    return {
+        'requests': requests_count,
+        'errors': errors,
+        'p50_ms': percentile(timings, 0.50) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'p99_ms': percentile(timings, 0.99) * 1000,
+        'throughput_rps': requests_count / elapsed if elapsed else 0.0,
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    prefix = settings.api_v1_url
+    context = Context()
+    context.users = seed(args.users, args.vaults, args.accounts)
+
+    app = create_app()
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://benchmark') as client:
+            for user in context.users:
+                response = await client.post(f'{prefix}/auth/login', data={
+                    'username': user['email'], 'password': PASSWORD})
+                user['token'] = response.json()['access_token']
+                # Warm the principal and key caches and the connection pool
+                await client.get(f'{prefix}/accounts/', params={'limit': 1},
+                                 headers={'Authorization': f'Bearer {user["token"]}'})
+
+            routes = {}
+            for route, request in scenarios(prefix):
+                if args.routes and route not in args.routes:
+                    continue
+                routes[route] = await run_route(
+                    client, context, request, args.requests, args.concurrency)
+                print(f'{route:<26} {json.dumps(routes[route])}', file=sys.stderr)
+    finally:
+        await app.router.shutdown()
+
+    return {
+        'config': {
+            'users': args.users,
+            'vaults': args.vaults,
+            'accounts': args.accounts,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'database': database.engine.dialect.name,
+            'db_async': settings.db_async,
+        },
+        'routes': routes,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Return the regressions of the results against the baseline.
+
+    A latency percentile regresses when it grows more than the threshold,
+    the throughput when it drops more than the threshold.
+    """
+    regressions = []
+    for route, baseline_route in baseline['routes'].items():
+        route_results = results['routes'].get(route)
+        if route_results is None:
+            continue
+        for metric in COMPARED_METRICS:
+            before, after = baseline_route[metric], route_results[metric]
+            if not before:
+                continue
+            change = (after - before) / before
+            if metric == 'throughput_rps':
+                change = -change
+            if change > threshold:
+                regressions.append(
+                    f'{route} {metric}: {before:.2f} -> {after:.2f} ({change:+.0%} worse)')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--vaults', type=int, default=5, help='Vaults by user.')
+    parser.add_argument('--accounts', type=int, default=100, help='Accounts by user.')
+    parser.add_argument('--requests', type=int, default=200, help='Requests by route.')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--routes', nargs='+', help='Run only these routes, e.g. "GET /accounts/".')
+    parser.add_argument('--output', help='Write the results to this JSON file.')
+    parser.add_argument('--baseline', help='Compare the results against this JSON file.')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative change allowed before a regression, 0.2 is 20%%.')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
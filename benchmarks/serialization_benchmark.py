@@ -0,0 +1,123 @@
+"""Serialization benchmark
+
+Measure the serialization of the GET /accounts and GET /vaults responses,
+from the selected rows to the response body. The response model path
+validates every row again and encodes it with the standard json module,
+the fast path (FAST_SERIALIZATION=true) builds the dicts with the cached
+row serializers and encodes them with orjson.
+
+Usage:
+
+    $ SECRET_KEY=benchmark python -m benchmarks.serialization_benchmark
+"""
+import argparse
+import asyncio
+import time
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.infra.database.config.database import Base
+from src.infra.database.models import UserModel, VaultModel, AccountModel
+from src.infra.database.repositories.account_repository import AccountRepository
+from src.infra.database.repositories.vault_repository import VaultRepository
+from src.apps.v1.routes import accounts_route, vaults_route
+from src.utils import serialization_utils
+
+
+def seed(session, rows_count: int) -> UserModel:
+    user = UserModel(
+        username='benchmark',
+        email='benchmark@example.com',
+        password='not-used',
+        secret_key='not-used',
+    )
+    session.add(user)
+    session.flush()
+
+    session.add_all(
+        VaultModel(name=f'vault-{number}', description='Benchmark vault',
+                   icon_type='icon', user_id=user.id)
+        for number in range(rows_count)
+    )
+    session.flush()
+
+    session.add_all(
+        AccountModel(
+            name=f'account-{number}',
+            username='username',
+            email='benchmark@example.com',
+            password='not-used',
+            description='Benchmark account',
+            page_url='https://example.com/',
+            icon_type='icon',
+            vault_id=1,
+            user_id=user.id,
+        )
+        for number in range(rows_count)
+    )
+    session.commit()
+    return user
+
+
+def list_route(router, path: str = '/'):
+    return next(route for route in router.routes if route.path == path and 'GET' in route.methods)
+
+
+def response_model_body(route, fields, rows) -> bytes:
+    content = asyncio.run(serialize_response(
+        field=route.response_field, response_content=[row._asdict() for row in rows],
+        exclude_unset=True))
+    return JSONResponse(content).body
+
+
+def fast_body(schema_fields, fields, rows) -> bytes:
+    to_dict = serialization_utils.row_serializer(tuple(fields), schema_fields)
+    return serialization_utils.json_response(list(map(to_dict, rows)), Response()).body
+
+
+def measure(function, *args, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    accounts_fields = list(accounts_route.ACCOUNT_METADATA_FIELDS)
+    vaults_fields = list(vaults_route.VAULT_FIELDS)
+
+    print(f'{"list":>10} {"rows":>8} {"model (ms)":>12} {"fast (ms)":>12} {"speedup":>9}')
+    for rows_count in args.counts:
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        user = seed(session, rows_count)
+
+        cases = [
+            ('accounts', list_route(accounts_route.router), accounts_route.ACCOUNT_FIELDS, accounts_fields,
+             AccountRepository(session).get_accounts(user_id=user.id, fields=accounts_fields)),
+            ('vaults', list_route(vaults_route.router), vaults_route.VAULT_FIELDS, vaults_fields,
+             VaultRepository(session).get_vaults(user_id=user.id, fields=vaults_fields)),
+        ]
+        for name, route, schema_fields, fields, rows in cases:
+            # Both paths must answer the same document
+            assert response_model_body(route, fields, rows) == fast_body(schema_fields, fields, rows)
+            model = measure(response_model_body, route, fields, rows, repeat=args.repeat)
+            fast = measure(fast_body, schema_fields, fields, rows, repeat=args.repeat)
+            print(f'{name:>10} {rows_count:>8} {model:>12.1f} {fast:>12.1f} {model / fast:>8.1f}x')
+
+        session.close()
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
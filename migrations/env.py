@@ -22,9 +22,13 @@ from src.infra.database.models.account_model import AccountModel
 from src.infra.database.models.card_model import CardModel
 from src.infra.database.models.user_model import UserModel
 from src.infra.database.models.vault_model import VaultModel
+from src.infra.database.models.user_directory_model import UserDirectoryModel
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+# Migrate a shard with: alembic -x url=postgresql://... upgrade head
+database_url = context.get_x_argument(as_dictionary=True).get('url', database_url)
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -0,0 +1,24 @@
+"""add users collection version
+
+Revision ID: 4a9c1d7e3f62
+Revises: e81a4f6c2b57
+Create Date: 2026-10-18 12:20:54.619302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a9c1d7e3f62'
+down_revision = 'e81a4f6c2b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('collection_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'collection_version')
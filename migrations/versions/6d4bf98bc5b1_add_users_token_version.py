@@ -0,0 +1,24 @@
+"""add users token version
+
+Revision ID: 6d4bf98bc5b1
+Revises: 0f32b2531c84
+Create Date: 2026-10-18 10:12:31.418207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d4bf98bc5b1'
+down_revision = '0f32b2531c84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
@@ -0,0 +1,30 @@
+"""add list pagination indexes
+
+Revision ID: b3e5c07a9d21
+Revises: 6d4bf98bc5b1
+Create Date: 2026-10-18 11:02:47.530916
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e5c07a9d21'
+down_revision = '6d4bf98bc5b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_accounts_user_id_id', 'accounts', ['user_id', 'id'], unique=False)
+    op.create_index('ix_accounts_user_id_name_id', 'accounts', ['user_id', 'name', 'id'], unique=False)
+    op.create_index('ix_vaults_user_id_id', 'vaults', ['user_id', 'id'], unique=False)
+    op.create_index('ix_vaults_user_id_name_id', 'vaults', ['user_id', 'name', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_vaults_user_id_name_id', table_name='vaults')
+    op.drop_index('ix_vaults_user_id_id', table_name='vaults')
+    op.drop_index('ix_accounts_user_id_name_id', table_name='accounts')
+    op.drop_index('ix_accounts_user_id_id', table_name='accounts')
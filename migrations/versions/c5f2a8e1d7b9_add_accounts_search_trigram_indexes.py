@@ -0,0 +1,36 @@
+"""add accounts search trigram indexes
+
+Revision ID: c5f2a8e1d7b9
+Revises: 4a9c1d7e3f62
+Create Date: 2026-10-18 13:05:12.204417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f2a8e1d7b9'
+down_revision = '4a9c1d7e3f62'
+branch_labels = None
+depends_on = None
+
+SEARCH_FIELDS = ('name', 'username', 'email', 'page_url')
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for field in SEARCH_FIELDS:
+        op.create_index(f'ix_accounts_{field}_trgm', 'accounts', [field], unique=False,
+                        postgresql_using='gin', postgresql_ops={field: 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for field in reversed(SEARCH_FIELDS):
+        op.drop_index(f'ix_accounts_{field}_trgm', table_name='accounts')
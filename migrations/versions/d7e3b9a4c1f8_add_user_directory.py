@@ -0,0 +1,44 @@
+"""add user directory
+
+Revision ID: d7e3b9a4c1f8
+Revises: c5f2a8e1d7b9
+Create Date: 2026-10-18 16:02:37.418205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e3b9a4c1f8'
+down_revision = 'c5f2a8e1d7b9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_directory',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(length=50), nullable=True),
+        sa.Column('username', sa.String(length=40), nullable=True),
+        sa.Column('shard', sa.Integer(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email', name='uq_user_directory_email'),
+        sa.UniqueConstraint('username', name='uq_user_directory_username'),
+    )
+    # The users of the unsharded database are in the first shard, the names
+    # are nullable in the users table, a user with a single name logs in by it
+    op.execute(
+        'INSERT INTO user_directory (id, email, username, shard) '
+        'SELECT id, email, username, 0 FROM users'
+    )
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "SELECT setval(pg_get_serial_sequence('user_directory', 'id'), "
+            "COALESCE((SELECT MAX(id) FROM user_directory), 0) + 1, false)"
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('user_directory')
@@ -0,0 +1,145 @@
+"""partition accounts and cards
+
+Revision ID: e4a7c2d9f0b3
+Revises: d7e3b9a4c1f8
+Create Date: 2026-10-18 17:41:09.305126
+
+Moves the accounts and cards tables to Postgres PARTITION BY HASH (user_id)
+with DB_HASH_PARTITIONS partitions, the other databases are unchanged. The
+rows are copied online: a trigger mirrors the writes of the old table to
+the new one while the existing rows are copied in batches, each in its own
+transaction, and the tables are swapped under a short lock at the end.
+
+"""
+import re
+from alembic import op
+import sqlalchemy as sa
+from src.core.settings import Settings
+from src.infra.database.config.partitioning import create_partitions_ddl
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c2d9f0b3'
+down_revision = 'd7e3b9a4c1f8'
+branch_labels = None
+depends_on = None
+
+TABLES = ('accounts', 'cards')
+# Rows by copy transaction
+BATCH_SIZE = 5000
+
+
+def _prepare(table: str, partitions: int | None) -> None:
+    # The new table and its keys take temporary names, the old table keeps them until the swap
+    bind = op.get_bind()
+    rebuild = f'{table}_rebuild'
+    if partitions and bind.scalar(sa.text(f'SELECT EXISTS (SELECT 1 FROM {table} WHERE user_id IS NULL)')):
+        raise RuntimeError(f'The {table} without user_id can not be partitioned, delete or assign them first.')
+
+    partition_by = ' PARTITION BY HASH (user_id)' if partitions else ''
+    op.execute(f'CREATE TABLE {rebuild} (LIKE {table} INCLUDING DEFAULTS){partition_by}')
+    op.execute(f'ALTER TABLE {rebuild} ADD CONSTRAINT {rebuild}_pkey '
+               f'PRIMARY KEY ({"id, user_id" if partitions else "id"})')
+    if not partitions:
+        op.execute(f'ALTER TABLE {rebuild} ALTER COLUMN user_id DROP NOT NULL')
+    for statement in create_partitions_ddl(table, partitions or 0, parent=rebuild):
+        op.execute(statement)
+
+    # The unique and foreign keys, then the indexes, before the copy, they are built as the rows arrive
+    constraints = bind.execute(sa.text(
+        'SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint '
+        "WHERE conrelid = CAST(:table AS regclass) AND contype IN ('u', 'f') ORDER BY conname"
+    ), {'table': table}).all()
+    for name, definition in constraints:
+        op.execute(f'ALTER TABLE {rebuild} ADD CONSTRAINT {name}_rebuild {definition}')
+    indexes = bind.execute(sa.text(
+        'SELECT CAST(indexrelid AS regclass), pg_get_indexdef(indexrelid) FROM pg_index '
+        'WHERE indrelid = CAST(:table AS regclass) AND NOT indisprimary '
+        'AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = indexrelid) ORDER BY 1'
+    ), {'table': table}).all()
+    for name, definition in indexes:
+        unique, method = re.match(r'CREATE (UNIQUE )?INDEX .+? USING (.+)$', definition).groups()
+        op.execute(f'CREATE {unique or ""}INDEX {name}_rebuild ON {rebuild} USING {method}')
+
+    # Mirror the writes of the old table until the swap
+    columns = [column['name'] for column in sa.inspect(bind).get_columns(table)]
+    assignments = ', '.join(f'{column} = EXCLUDED.{column}' for column in columns)
+    op.execute(f"""
+        CREATE FUNCTION {table}_mirror() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM {rebuild} WHERE id = OLD.id AND user_id IS NOT DISTINCT FROM OLD.user_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO {rebuild} SELECT NEW.* ON CONFLICT ({"id, user_id" if partitions else "id"})
+                DO UPDATE SET {assignments};
+            END IF;
+            RETURN NULL;
+        END $$
+    """)
+    op.execute(f'CREATE TRIGGER {table}_mirror AFTER INSERT OR UPDATE OR DELETE ON {table} '
+               f'FOR EACH ROW EXECUTE FUNCTION {table}_mirror()')
+
+
+def _copy(table: str) -> None:
+    # The rows committed before the trigger, FOR SHARE orders the copy with their concurrent writes
+    bind = op.get_bind()
+    first, last = bind.execute(sa.text(f'SELECT MIN(id), MAX(id) FROM {table}')).one()
+    if first is None:
+        return
+    for start in range(first - 1, last, BATCH_SIZE):
+        bind.execute(sa.text(
+            f'INSERT INTO {table}_rebuild SELECT * FROM {table} WHERE id > :start AND id <= :end '
+            'ORDER BY id FOR SHARE ON CONFLICT DO NOTHING'
+        ), {'start': start, 'end': start + BATCH_SIZE})
+
+
+def _swap(table: str) -> None:
+    bind = op.get_bind()
+    rebuild = f'{table}_rebuild'
+    op.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+    op.execute(f'DROP TRIGGER {table}_mirror ON {table}')
+    op.execute(f'DROP FUNCTION {table}_mirror()')
+
+    sequence = bind.scalar(sa.text('SELECT pg_get_serial_sequence(:table, :column)'),
+                           {'table': table, 'column': 'id'})
+    op.execute(f'ALTER SEQUENCE {sequence} OWNED BY {rebuild}.id')
+    op.execute(f'DROP TABLE {table}')
+    op.execute(f'ALTER TABLE {rebuild} RENAME TO {table}')
+
+    constraints = bind.scalars(sa.text(
+        'SELECT conname FROM pg_constraint WHERE conrelid = CAST(:table AS regclass) ORDER BY conname'
+    ), {'table': table}).all()
+    for name in constraints:
+        op.execute(f'ALTER TABLE {table} RENAME CONSTRAINT {name} TO {name.replace("_rebuild", "")}')
+    indexes = bind.scalars(sa.text(
+        'SELECT CAST(indexrelid AS regclass) FROM pg_index WHERE indrelid = CAST(:table AS regclass) '
+        'AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = indexrelid) ORDER BY 1'
+    ), {'table': table}).all()
+    for name in indexes:
+        op.execute(f'ALTER INDEX {name} RENAME TO {name.replace("_rebuild", "")}')
+
+
+def _rebuild(table: str, partitions: int | None) -> None:
+    _prepare(table, partitions)
+    # Commit the new table and the trigger, then every batch on its own
+    with op.get_context().autocommit_block():
+        _copy(table)
+    _swap(table)
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    partitions = Settings().db_hash_partitions
+    for table in TABLES:
+        _rebuild(table, partitions)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for table in reversed(TABLES):
+        _rebuild(table, None)
@@ -0,0 +1,26 @@
+"""add user name unique constraints
+
+Revision ID: e81a4f6c2b57
+Revises: b3e5c07a9d21
+Create Date: 2026-10-18 11:41:09.274813
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81a4f6c2b57'
+down_revision = 'b3e5c07a9d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_unique_constraint('uq_accounts_user_id_name', 'accounts', ['user_id', 'name'])
+    op.create_unique_constraint('uq_vaults_user_id_name', 'vaults', ['user_id', 'name'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_vaults_user_id_name', 'vaults', type_='unique')
+    op.drop_constraint('uq_accounts_user_id_name', 'accounts', type_='unique')
@@ -0,0 +1,32 @@
+"""add vaults deleted
+
+Revision ID: f2b8d4e6a1c3
+Revises: e4a7c2d9f0b3
+Create Date: 2026-10-18 19:26:53.811402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8d4e6a1c3'
+down_revision = 'e4a7c2d9f0b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('vaults', sa.Column('deleted', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.create_index('ix_vaults_deleted_id', 'vaults', ['id'], unique=False,
+                    postgresql_where=sa.text('deleted'), sqlite_where=sa.text('deleted'))
+    # The cascade of a vault delete and the purge find the items by vault
+    op.create_index('ix_accounts_vault_id', 'accounts', ['vault_id'], unique=False)
+    op.create_index('ix_cards_vault_id', 'cards', ['vault_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_cards_vault_id', table_name='cards')
+    op.drop_index('ix_accounts_vault_id', table_name='accounts')
+    op.drop_index('ix_vaults_deleted_id', table_name='vaults')
+    op.drop_column('vaults', 'deleted')
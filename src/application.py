@@ -1,5 +1,11 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
 from src.extensions.router_extensions import register_api_routers
+from src.extensions.exception_extensions import register_exception_handlers
+from src.extensions.metrics_extensions import register_metrics
+from src.extensions.invalidation_extensions import register_invalidation_bus
+from src.extensions.purge_extensions import register_vault_purger
+from src.infra.providers.hashing_executor import hashing_executor
 from src.core.settings import Settings
 
 settings = Settings()
@@ -19,8 +25,15 @@ def create_app() -> FastAPI:
         title=settings.project_name,
         openapi_url=f'{settings.api_v1_url}/openapi.json',
         description=settings.project_description,
+        default_response_class=ORJSONResponse if settings.fast_serialization else JSONResponse,
     )
 
     register_api_routers(app, prefix_url=settings.api_v1_url)
+    register_exception_handlers(app)
+    register_metrics(app)
+    register_invalidation_bus(app)
+    register_vault_purger(app)
+
+    app.add_event_handler('shutdown', hashing_executor.shutdown)
 
     return app
@@ -1,16 +1,38 @@
-from fastapi import APIRouter, Depends, Body, Path, HTTPException, status, Query
-from typing import List
-from sqlalchemy.orm import Session
-from src.core import security
-from src.infra.schemas import account_schema
+from fastapi import APIRouter, Depends, Body, Path, HTTPException, status, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import Any, Dict, List
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core import security, key_management
+from src.core.settings import Settings
+from src.infra.schemas import account_schema, user_schema
 from src.infra.database.models import user_model, vault_model, account_model
-from src.infra.database.repositories.account_repository import AccountRepository
-from src.infra.database.repositories.vault_repository import VaultRepository
-from src.infra.database.config.database import get_db
+from src.infra.database.repositories.base_repository import DuplicateError
+from src.infra.database.repositories.account_repository import AsyncAccountRepository
+from src.infra.database.repositories.vault_repository import AsyncVaultRepository
+from src.infra.database.config.sharding import get_db
 from src.utils.auth_utils import get_current_user
+from src.utils import account_utils, etag_utils, import_utils, pagination_utils, serialization_utils
 
 
 router = APIRouter()
+settings = Settings()
+
+ACCOUNT_FIELDS = tuple(account_schema.AccountPartialOut.__fields__)
+# The list leaves out the password, it is decrypted when requested or revealed
+ACCOUNT_METADATA_FIELDS = tuple(field for field in ACCOUNT_FIELDS if field != 'password')
+MAX_PAGE_SIZE = 500
+MAX_SEARCH_RESULTS = 100
+MAX_BATCH_ITEMS = 1000
+# The status of the changed accounts, and the detail of the skipped operations, by operation
+BATCH_STATUS = {'delete': 'deleted', 'move': 'moved', 'update': 'updated'}
+BATCH_SKIPPED = {'move': ('not_found', 'Vault not found.'), 'update': ('duplicate', 'Account name already exists.')}
+
+
+def _encrypt_passwords(accounts: List[account_schema.AccountCreate], user_key: security.UserKey) -> None:
+    """Encrypt the passwords of the new accounts in place."""
+    for account in accounts:
+        account.password = security.encode_password(
+            password=account.password, user_key=user_key)
 
 
 @router.post(path='/',
@@ -18,10 +40,10 @@ router = APIRouter()
              response_model=account_schema.AccountOut,
              summary='Add a new account to the app'
              )
-def create_account(
+async def create_account(
     account: account_schema.AccountCreate = Body(...,),
-    current_user: user_model.UserModel = Depends(get_current_user),
-    session: Session = Depends(get_db)
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db)
 ):
     """Add a new account to the app
 
@@ -57,38 +79,222 @@ def create_account(
             detail='User not found.',
         )
 
+    user_key = await key_management.get_user_key_async(
+        user_id=current_user.id, secret_key_encode=current_user.secret_key)
+    # Encode password
+    account.password = security.encode_password(
+        password=account.password, user_key=user_key)
+
+    # Add to db, the vault and the account name are verified by the insert
+    try:
+        account_db = await AsyncAccountRepository(session).create_account(account)
+    except DuplicateError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Account name already exists.'
+        )
+    if not account_db:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Vault not found.',
+        )
+
+    # Decode password to display in update data, a single envelope is cheaper
+    # to decrypt than a threadpool hop
+    account_db.password = security.decode_password(
+        password_encode=account_db.password, user_key=user_key)
+
+    return account_db
+
+
+@router.post(path='/import',
+             status_code=status.HTTP_200_OK,
+             response_model=account_schema.AccountImportReport,
+             summary='Import accounts to a vault',
+             openapi_extra={
+                 'requestBody': {
+                     'required': True,
+                     'content': {
+                         import_utils.CSV_MEDIA_TYPE: {'schema': {'type': 'string'}},
+                         import_utils.JSON_MEDIA_TYPE: {'schema': {'type': 'array', 'items': {'type': 'object'}}},
+                     },
+                 },
+             },
+             )
+async def import_accounts(
+    request: Request,
+    vault_id: int = Query(...,
+                          gt=0,
+                          example=1,
+                          description='ID of the vault of the imported accounts.',
+                          ),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+) -> account_schema.AccountImportReport:
+    """Import accounts to a vault
+
+    This is the path operation to add many accounts at once, from a CSV with
+    a header row or a JSON array of items. The columns of the common password
+    manager exports are accepted (name or title, username, password, url,
+    notes). Every item is validated as a new account, the valid ones are
+    inserted in a single transaction and the result of every row is returned.
+
+    Args:
+
+        vault_id (int): This is the vault ID.
+        Body (csv | json): The items to import.
+        Token (str): This is the bearer token.
+
+    Raises:
+
+        HTTPException(json): If it is not a valid vault id.
+            Code: 404,
+            detail: Vault not found.
+
+        HTTPException(json): If the body can not be parsed.
+            Code: 400,
+            detail: Invalid import file.
+
+        HTTPException(json): If there are more items than allowed.
+            Code: 413,
+            detail: Too many items.
+
+        HTTPException(json): If the body is larger than allowed.
+            Code: 413,
+            detail: Import file too large.
+
+        HTTPException(json): If it is not a CSV or JSON body.
+            Code: 415,
+            detail: Unsupported media type.
+
+    Returns:
+
+        json: The number of accounts imported and failed, and the result by row.
+    """
     # Verify vault
-    vault_reference = VaultRepository(session).get_vault_by_id(
-        vault_id=account.vault_id, user_id=account.user_id)
+    vault_reference = await AsyncVaultRepository(session).get_vault_by_id(
+        vault_id=vault_id, user_id=current_user.id)
     if not vault_reference:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='Vault not found.',
         )
 
-    # Verify account name reference
-    account_name_reference = AccountRepository(session).get_account_by_name(
-        account_name=account.name, user_id=current_user.id)
-    if account_name_reference:
+    content_type = request.headers.get('content-type', '')
+    if not content_type.startswith((import_utils.CSV_MEDIA_TYPE, import_utils.JSON_MEDIA_TYPE)):
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail='Account name already exists.'
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail='Unsupported media type.',
         )
 
-    secret_key = security.decode_secret_key(
-        secret_key_encode=current_user.secret_key)
-    # Encode password
-    account.password = security.encode_password(
-        password=account.password, secret_key=secret_key)
+    # Parse and validate the items
+    body = await import_utils.read_body(request, max_bytes=settings.import_max_bytes)
+    items = await run_in_threadpool(import_utils.parse_items, body, content_type)
+    if len(items) > settings.import_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail='Too many items.',
+        )
+
+    accounts, errors = await run_in_threadpool(
+        import_utils.validate_items, items, vault_id, current_user.id)
+    results = {
+        row: account_schema.AccountImportResult(
+            row=row, status='invalid', name=import_utils.item_name(items[row - 1]), detail=detail)
+        for row, detail in errors.items()
+    }
+
+    # Verify account names, in the import and in db with a single query
+    account_names = await AsyncAccountRepository(session).get_account_names(
+        account_names={account.name for account in accounts.values()}, user_id=current_user.id)
+    for row, account in list(accounts.items()):
+        if account.name in account_names:
+            results[row] = account_schema.AccountImportResult(
+                row=row, status='duplicate', name=account.name,
+                detail='Account name already exists.')
+            del accounts[row]
+        account_names.add(account.name)
+
+    # Encode passwords, a batch at a time in the threadpool
+    user_key = await key_management.get_user_key_async(
+        user_id=current_user.id, secret_key_encode=current_user.secret_key)
+    new_accounts = list(accounts.values())
+    for start in range(0, len(new_accounts), settings.import_batch_size):
+        await run_in_threadpool(
+            _encrypt_passwords, new_accounts[start:start + settings.import_batch_size], user_key)
 
     # Add to db
-    account_db = AccountRepository(session).create_account(account)
+    account_ids = []
+    if new_accounts:
+        try:
+            account_ids = await AsyncAccountRepository(session).create_accounts(new_accounts)
+        except DuplicateError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail='Account name already exists.'
+            )
 
-    # Decode password to display in update data
-    account_db.password = security.decode_password(
-        password_encode=account_db.password, secret_key=secret_key)
+    for (row, account), account_id in zip(accounts.items(), account_ids):
+        results[row] = account_schema.AccountImportResult(
+            row=row, status='imported', id=account_id, name=account.name)
+
+    return account_schema.AccountImportReport(
+        imported=len(account_ids),
+        failed=len(results) - len(account_ids),
+        results=[results[row] for row in sorted(results)],
+    )
 
-    return account_db
+
+@router.get(path='/search',
+            status_code=status.HTTP_200_OK,
+            response_model=List[account_schema.AccountMetadataOut],
+            summary='Search accounts by name, username, email or page url.',
+            )
+async def search_accounts(
+    request: Request,
+    response: Response,
+    q: str = Query(...,
+                   min_length=1,
+                   max_length=100,
+                   example='facebok',
+                   description='Search text, typos are tolerated.',
+                   ),
+    limit: int = Query(20,
+                       ge=1,
+                       le=MAX_SEARCH_RESULTS,
+                       description='Max number of accounts.',
+                       ),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+) -> List[account_model.AccountModel]:
+    """Search accounts
+
+    This is the path operation to find the accounts similar to the search
+    text, best match first. The name, username, email and page url are
+    compared by trigrams, the passwords are left out and revealed with
+    POST /accounts/reveal. The response has an ETag, with a matching
+    If-None-Match the answer is 304 without searching.
+
+    Args:
+
+        q (str): Search text.
+        limit (int): Max number of accounts.
+        Token (str): This is the bearer token.
+
+    Returns:
+
+        List[json]: Accounts data, an empty list if nothing matches.
+    """
+    # Answer from the client cache if the accounts did not change
+    not_modified, _ = await etag_utils.conditional_get(
+        request, response, current_user.id, session)
+    if not_modified:
+        return not_modified
+
+    accounts_db = await AsyncAccountRepository(session).search_accounts(
+        user_id=current_user.id, query=q, limit=limit)
+
+    return accounts_db
 
 
 @router.get(path='/{id}',
@@ -96,18 +302,22 @@ def create_account(
             response_model=account_schema.AccountOut,
             summary='Find account by ID',
             )
-def get_account(
+async def get_account(
+    request: Request,
+    response: Response,
     id: int = Path(...,
                    gt=0,
                    example=1,
                    description='ID of account to return.',
                    ),
-    current_user: user_model.UserModel = Depends(get_current_user),
-    session: Session = Depends(get_db),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
 ) -> account_schema.AccountOut:
     """Find account by ID
 
     This path operation get account by ID, and return a single account.
+    The response has an ETag, with a matching If-None-Match the answer is 304
+    without reading the account.
 
     Args:
 
@@ -124,7 +334,13 @@ def get_account(
 
         json: Account data.
     """
-    account_db = AccountRepository(session).get_account_by_id(
+    # Answer from the client cache if the accounts did not change
+    not_modified, _ = await etag_utils.conditional_get(
+        request, response, current_user.id, session)
+    if not_modified:
+        return not_modified
+
+    account_db = await AsyncAccountRepository(session).get_account_by_id(
         account_id=id, user_id=current_user.id)
     if not account_db:
         raise HTTPException(
@@ -132,37 +348,67 @@ def get_account(
             detail='Account not found.',
         )
 
-    decode_password = security.decode_password(
-        password_encode=account_db.password,
-        secret_key=security.decode_secret_key(
-            secret_key_encode=current_user.secret_key
-        )
-    )
-
-    account_db.password = decode_password
+    user_key = await key_management.get_user_key_async(
+        user_id=current_user.id, secret_key_encode=current_user.secret_key)
+    account_db.password, = await account_utils.decode_passwords(
+        [account_db], current_user.id, user_key, session)
 
     return account_db
 
 
 @router.get(path='/',
             status_code=status.HTTP_200_OK,
-            response_model=List[account_schema.AccountOut],
+            response_model=List[account_schema.AccountPartialOut],
+            response_model_exclude_unset=True,
             summary='Get a list with all accounts.',
             )
-def get_accounts(
-    current_user: user_model.UserModel = Depends(get_current_user),
-    session: Session = Depends(get_db),
-) -> List[account_schema.AccountOut]:
+async def get_accounts(
+    request: Request,
+    response: Response,
+    limit: int | None = Query(None,
+                              ge=1,
+                              le=MAX_PAGE_SIZE,
+                              description='Max number of accounts, all the accounts if it is not set.',
+                              ),
+    cursor: str | None = Query(None,
+                               description=f'Cursor of the next page, from the {pagination_utils.NEXT_CURSOR_HEADER} header.',
+                               ),
+    sort: str = Query('id',
+                      regex=pagination_utils.SORT_PATTERN,
+                      example='-name',
+                      description='Sort field, prefixed with - for descending order.',
+                      ),
+    fields: str | None = Query(None,
+                               example='name,username',
+                               description='Comma separated fields to return, all the fields but the password if it is not set.',
+                               ),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+) -> List[Dict[str, Any]]:
     """Get a list with all accounts.
 
     This is the path operation to return a list of all accounts in the app.
+    The list is paginated when a limit is set, the cursor of the next page is
+    returned in the X-Next-Cursor header. The id and the sort field are
+    always returned, the passwords are only decrypted when they are in the
+    fields, else they are revealed with POST /accounts/reveal.
+    The response has an ETag, with a matching If-None-Match the answer is 304
+    without reading the accounts.
 
     Args:
 
+        limit (int): Max number of accounts.
+        cursor (str): Cursor of the next page.
+        sort (str): Sort field, id or name, prefixed with - for descending order.
+        fields (str): Comma separated fields to return.
         Token (str): This is the bearer token.
 
     Raises:
 
+        HTTPException(json): If it is not a valid field or cursor.
+            Code: 400,
+            detail: Unknown fields or Invalid cursor.
+
         HTTPException(json): If it is not accounts.
             Code: 404,
             detail: Accounts not found.
@@ -171,25 +417,215 @@ def get_accounts(
 
         List[json]: Accounts data.
     """
-    accounts_db = AccountRepository(
-        session).get_accounts(user_id=current_user.id)
+    sort_field, _ = pagination_utils.parse_sort(sort)
+    columns = pagination_utils.parse_fields(
+        fields, ACCOUNT_FIELDS, required_fields=('id', sort_field),
+        default_fields=ACCOUNT_METADATA_FIELDS)
+    after = pagination_utils.decode_cursor(cursor, sort)
+
+    # Answer from the client cache if the accounts did not change
+    not_modified, _ = await etag_utils.conditional_get(
+        request, response, current_user.id, session)
+    if not_modified:
+        return not_modified
+
+    # Fetch one more row to know if there is a next page
+    accounts_db = await AsyncAccountRepository(session).get_accounts(
+        user_id=current_user.id, fields=columns, sort=sort, after=after,
+        limit=limit + 1 if limit else None)
+    if not accounts_db and after is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Accounts not found.',
+        )
+
+    accounts_db, next_cursor = pagination_utils.split_page(accounts_db, limit, sort)
+    if next_cursor:
+        response.headers[pagination_utils.NEXT_CURSOR_HEADER] = next_cursor
+
+    to_dict = serialization_utils.row_serializer(tuple(columns), ACCOUNT_FIELDS)
+    accounts = list(map(to_dict, accounts_db))
+    if 'password' in columns:
+        # Decode all passwords, the user key is unwrapped once per request
+        user_key = await key_management.get_user_key_async(
+            user_id=current_user.id, secret_key_encode=current_user.secret_key)
+        passwords = await account_utils.decode_passwords(accounts_db, current_user.id, user_key, session)
+        for account, password in zip(accounts, passwords):
+            account['password'] = password
+
+    if settings.fast_serialization:
+        return serialization_utils.json_response(accounts, response)
+    return accounts
+
+
+@router.post(path='/reveal',
+             status_code=status.HTTP_200_OK,
+             response_model=List[account_schema.AccountSecretOut],
+             summary='Reveal the passwords of a list of accounts',
+             )
+async def reveal_accounts(
+    reveal: account_schema.AccountRevealIn = Body(...,),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+) -> List[Dict[str, Any]]:
+    """Reveal the passwords of a list of accounts
+
+    This is the path operation to decrypt only the requested passwords, in
+    one batch. The ids that are not accounts of the user are left out.
+
+    Args:
+
+        reveal (json): The account ids. The example in the request body.
+        Token (str): This is the bearer token.
+
+    Raises:
+
+        HTTPException(json): If it is not accounts.
+            Code: 404,
+            detail: Accounts not found.
+
+    Returns:
+
+        List[json]: The account ids and passwords, in the requested order.
+    """
+    accounts_db = await AsyncAccountRepository(session).get_account_passwords(
+        account_ids=reveal.ids, user_id=current_user.id)
     if not accounts_db:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='Accounts not found.',
         )
 
-    # Decode all passwords
-    for account in accounts_db:
-        decode_password = security.decode_password(
-            password_encode=account.password,
-            secret_key=security.decode_secret_key(
-                secret_key_encode=current_user.secret_key
-            )
+    user_key = await key_management.get_user_key_async(
+        user_id=current_user.id, secret_key_encode=current_user.secret_key)
+    passwords = await account_utils.decode_passwords(accounts_db, current_user.id, user_key, session)
+    revealed = {account.id: password for account, password in zip(accounts_db, passwords)}
+
+    return [
+        {'id': account_id, 'password': revealed[account_id]}
+        for account_id in reveal.ids if account_id in revealed
+    ]
+
+
+@router.post(path='/batch',
+             status_code=status.HTTP_200_OK,
+             response_model=account_schema.AccountBatchReport,
+             summary='Delete, move or update many accounts',
+             )
+async def batch_accounts(
+    batch: account_schema.AccountBatchIn = Body(...,),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+) -> account_schema.AccountBatchReport:
+    """Delete, move or update many accounts
+
+    This is the path operation to change many accounts at once. Every
+    operation deletes its accounts, moves them to a vault or updates the set
+    fields, with a single statement. The operations run in order in one
+    transaction and the result of every account is returned, the accounts
+    that are not of the user are not found.
+
+    Args:
+
+        batch (json): The operations. The example in the request body.
+        Token (str): This is the bearer token.
+
+    Raises:
+
+        HTTPException(json): If there are more accounts than allowed.
+            Code: 413,
+            detail: Too many items.
+
+    Returns:
+
+        json: The number of accounts changed and failed, and the result by account.
+    """
+    if sum(len(operation.ids) for operation in batch.operations) > MAX_BATCH_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail='Too many items.',
         )
-        account.password = decode_password
 
-    return accounts_db
+    # Encode the new passwords
+    updates = [operation.values for operation in batch.operations
+               if operation.op == 'update' and operation.values.password is not None]
+    if updates:
+        user_key = await key_management.get_user_key_async(
+            user_id=current_user.id, secret_key_encode=current_user.secret_key)
+        for values in updates:
+            values.password = security.encode_password(
+                password=values.password, user_key=user_key)
+
+    # A name taken by a concurrent write is a duplicate of its account
+    outcomes = await AsyncAccountRepository(session).batch_accounts(
+        user_id=current_user.id, operations=batch.operations)
+
+    results = []
+    for number, (operation, changed) in enumerate(zip(batch.operations, outcomes), start=1):
+        for account_id in operation.ids:
+            if changed is None:
+                result_status, detail = BATCH_SKIPPED[operation.op]
+            elif account_id in changed:
+                result_status, detail = BATCH_STATUS[operation.op], None
+            else:
+                result_status, detail = 'not_found', 'Account not found.'
+            results.append(account_schema.AccountBatchResult(
+                operation=number, id=account_id, status=result_status, detail=detail))
+
+    applied = sum(len(changed) for changed in outcomes if changed)
+    return account_schema.AccountBatchReport(
+        applied=applied,
+        failed=len(results) - applied,
+        results=results,
+    )
+
+
+@router.post(path='/{id}/reveal',
+             status_code=status.HTTP_200_OK,
+             response_model=account_schema.AccountSecretOut,
+             summary='Reveal the password of an account',
+             )
+async def reveal_account(
+    id: int = Path(...,
+                   gt=0,
+                   example=1,
+                   description='ID of account to reveal.',
+                   ),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+) -> Dict[str, Any]:
+    """Reveal the password of an account
+
+    This is the path operation to decrypt the password of a single account.
+
+    Args:
+
+        id (int): This is the account ID.
+        Token (str): This is the bearer token.
+
+    Raises:
+
+        HTTPException(json): If it is not a valid account id.
+            Code: 404,
+            detail: Account not found.
+
+    Returns:
+
+        json: The account id and password.
+    """
+    accounts_db = await AsyncAccountRepository(session).get_account_passwords(
+        account_ids=[id], user_id=current_user.id)
+    if not accounts_db:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Account not found.',
+        )
+
+    user_key = await key_management.get_user_key_async(
+        user_id=current_user.id, secret_key_encode=current_user.secret_key)
+    password, = await account_utils.decode_passwords(accounts_db, current_user.id, user_key, session)
+
+    return {'id': id, 'password': password}
 
 
 @router.put(path='/{id}',
@@ -197,15 +633,15 @@ def get_accounts(
             response_model=account_schema.AccountOut,
             summary='Update an existing account',
             )
-def update_account(
+async def update_account(
     id: int = Path(...,
                    gt=0,
                    example=1,
                    description='ID of account to update.',
                    ),
     update_data: account_schema.AccountCreate = Body(...,),
-    current_user: user_model.UserModel = Depends(get_current_user),
-    session: Session = Depends(get_db),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
 ) -> account_schema.AccountOut:
     """Update an existing account
 
@@ -235,42 +671,32 @@ def update_account(
 
         json: Account data.
     """
-    # Verify account
-    account_reference = AccountRepository(session).get_account_by_id(
-        account_id=id, user_id=current_user.id)
-    if not account_reference:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail='Account not found.'
-        )
-
-    # Verify account name duplicate in db
-    new_name = update_data.name
-    old_name = account_reference.name
-    if new_name != old_name:
-        account_name_reference = AccountRepository(session).get_account_by_name(
-            account_name=new_name, user_id=current_user.id)
-        if account_name_reference:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail='Account name already exists.'
-            )
-
-    # Decode secret key
-    secret_key = security.decode_secret_key(
-        secret_key_encode=current_user.secret_key)
+    # Get user key
+    user_key = await key_management.get_user_key_async(
+        user_id=current_user.id, secret_key_encode=current_user.secret_key)
 
     # Encode password
     update_data.password = security.encode_password(
-        password=update_data.password, secret_key=secret_key)
+        password=update_data.password, user_key=user_key)
 
-    # Add to db
-    account_db = AccountRepository(session).update_account(
-        user_id=current_user.id, account_id=id, update_data=update_data)
+    # Update in db, the account name is verified by the update
+    try:
+        account_db = await AsyncAccountRepository(session).update_account(
+            user_id=current_user.id, account_id=id, update_data=update_data)
+    except DuplicateError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Account name already exists.'
+        )
+    if not account_db:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Account not found.'
+        )
 
     # Decode password to display in update data
     account_db.password = security.decode_password(
-        password_encode=account_db.password, secret_key=secret_key)
+        password_encode=account_db.password, user_key=user_key)
 
     return account_db
 
@@ -280,14 +706,14 @@ def update_account(
                response_model=account_schema.AccountOut,
                summary='Delete an account',
                )
-def delete_account(
+async def delete_account(
     id: int = Path(...,
                    gt=0,
                    example=1,
                    description='Account ID to delete.',
                    ),
-    current_user: user_model.UserModel = Depends(get_current_user),
-    session: Session = Depends(get_db),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
 ) -> account_schema.AccountOut:
     """Delete an account
 
@@ -308,7 +734,7 @@ def delete_account(
         json: Account data.
     """
     # Verify account reference by id
-    account_reference = AccountRepository(session).get_account_by_id(
+    account_reference = await AsyncAccountRepository(session).get_account_by_id(
         account_id=id, user_id=current_user.id)
     if not account_reference:
         raise HTTPException(
@@ -317,15 +743,15 @@ def delete_account(
         )
 
     # Delete the account
-    account_db = AccountRepository(session).delete_account(
+    account_db = await AsyncAccountRepository(session).delete_account(
         account_id=id, user_id=current_user.id)
 
-    # Decode secret key
-    secret_key = security.decode_secret_key(
-        secret_key_encode=current_user.secret_key)
+    # Get user key
+    user_key = await key_management.get_user_key_async(
+        user_id=current_user.id, secret_key_encode=current_user.secret_key)
 
-    # Decode password to display in update data
-    account_db.password = security.decode_password(
-        password_encode=account_db.password, secret_key=secret_key)
+    # Decode password to display in update data, it may be in the legacy format
+    account_db.password = await run_in_threadpool(
+        security.decode_password, account_db.password, user_key)
 
     return account_db
@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Depends, Body, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.infra.schemas import user_schema, token_schema
-from src.infra.database.repositories.user_repository import UserRepository
-from src.infra.database.config.database import get_db
+from src.infra.database.repositories.base_repository import DuplicateError
+from src.infra.database.repositories.directory_repository import AsyncDirectoryRepository
+from src.infra.database.repositories.user_repository import AsyncUserRepository
+from src.infra.database.config import sharding
+from src.infra.database.config.sharding import get_db, get_directory_db
 from src.core import security
 from src.infra.providers import password_provider, token_provider
 from src.utils import auth_utils
@@ -17,10 +21,16 @@ router = APIRouter()
              response_model=user_schema.UserOut,
              summary='Add a new user to the app',
              )
-def signup_user(user: user_schema.UserLogin = Body(...), session: Session = Depends(get_db)):
+async def signup_user(
+    user: user_schema.UserLogin = Body(...),
+    session: AsyncSession = Depends(get_db),
+    directory: AsyncSession = Depends(get_directory_db),
+):
     """Add a new user to the app
 
-    This is the path operation add a new account to the app.    
+    This is the path operation add a new account to the app. The user id
+    and the names are reserved in the user directory, then the user is
+    created in its shard.
 
     Args:
 
@@ -36,12 +46,21 @@ def signup_user(user: user_schema.UserLogin = Body(...), session: Session = Depe
             Code: 400,
             detail: Username already registered.
 
+        HTTPException(json): If a concurrent signup registered the email or the username.
+            Code: 400,
+            detail: Email or username already registered.
+
+        HTTPException(json): If the password hashing queue is full.
+            Code: 503,
+            detail: Too many password hashing requests, retry later.
+
     Returns:
 
         json: User data.
     """
-    # Verify user
-    user_reference_email = UserRepository(session).get_user(user.email)
+    # Verify user, the names are unique in all the shards
+    directory_repository = AsyncDirectoryRepository(directory)
+    user_reference_email = await directory_repository.get_user_id(user.email)
 
     if user_reference_email:
         raise HTTPException(
@@ -49,7 +68,7 @@ def signup_user(user: user_schema.UserLogin = Body(...), session: Session = Depe
             detail='Email already registered.'
         )
 
-    user_reference_username = UserRepository(session).get_user(user.username)
+    user_reference_username = await directory_repository.get_user_id(user.username)
     if user_reference_username:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -59,12 +78,29 @@ def signup_user(user: user_schema.UserLogin = Body(...), session: Session = Depe
     # Generate the user secret key
     secret_key = security.secret_key_generator()
     # Encode secret_key     
-    user.secret_key = security.encode_secret_key(secret_key)
+    user.secret_key = await run_in_threadpool(
+        security.encode_secret_key, secret_key)
     # Hash password
-    user.password = password_provider.hash_password(user.password)
+    user.password = await password_provider.hash_password_async(user.password)
+
+    # Reserve the user id and the names, the shard is placed by the id
+    try:
+        entry = await directory_repository.create_entry(
+            email=user.email, username=user.username, place=sharding.shard_map.place)
+    except DuplicateError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Email or username already registered.'
+        )
 
     # Create new user
-    user_db = UserRepository(session).create_user(user)
+    async with sharding.shard_session(entry.shard, session) as shard_session:
+        try:
+            user_db = await AsyncUserRepository(shard_session).create_user(user, user_id=entry.id)
+        except Exception:
+            # Release the names of the user that was not created
+            await directory_repository.delete_entry(entry.id)
+            raise
 
     return user_db
 
@@ -74,10 +110,15 @@ def signup_user(user: user_schema.UserLogin = Body(...), session: Session = Depe
              response_model=token_schema.Token,
              summary='Login a user'
              )
-def login_for_access_token(login_data: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(get_db)):
+async def login_for_access_token(
+    login_data: OAuth2PasswordRequestForm = Depends(),
+    session: AsyncSession = Depends(get_db),
+    directory: AsyncSession = Depends(get_directory_db),
+):
     """Login for access token
 
-    This path operation login the user for access token.
+    This path operation login the user for access token, the user is
+    verified in its shard.
 
     Args:
 
@@ -91,12 +132,22 @@ def login_for_access_token(login_data: OAuth2PasswordRequestForm = Depends(), se
             Code: 401,
             detail: Incorrect email or password.
 
+        HTTPException(json): If the password hashing queue is full.
+            Code: 503,
+            detail: Too many password hashing requests, retry later.
+
     Returns:
 
         json: json access token and token type.
     """
-    user_reference = auth_utils.authenticate_user(
-        login_data.username, login_data.password, session)
+    user_reference = False
+    # Find the shard of the user
+    user_id = await AsyncDirectoryRepository(directory).get_user_id(login_data.username)
+    if user_id is not None:
+        shard = await sharding.shard_map.get_shard_async(user_id)
+        async with sharding.shard_session(shard, session) as shard_session:
+            user_reference = await auth_utils.authenticate_user(
+                login_data.username, login_data.password, shard_session)
 
     if not user_reference:
         raise HTTPException(
@@ -107,6 +158,6 @@ def login_for_access_token(login_data: OAuth2PasswordRequestForm = Depends(), se
 
     # Token Generate
     accesss_token = token_provider.create_access_token(
-        {'sub': user_reference.email})
+        {'sub': str(user_reference.id), 'ver': user_reference.token_version})
 
     return token_schema.Token(access_token=accesss_token, token_type='bearer')
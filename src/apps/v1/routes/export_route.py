@@ -0,0 +1,128 @@
+import base64
+import json
+import os
+from typing import AsyncIterator, List
+from fastapi import APIRouter, Depends, Header, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core import security, key_management
+from src.core.settings import Settings
+from src.infra.schemas import account_schema, vault_schema, user_schema
+from src.infra.database.models import account_model
+from src.infra.database.repositories.account_repository import AsyncAccountRepository
+from src.infra.database.repositories.vault_repository import AsyncVaultRepository
+from src.infra.database.config.sharding import get_db
+from src.utils.auth_utils import get_current_user
+
+
+router = APIRouter()
+settings = Settings()
+
+EXPORT_VERSION = 1
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+ACCOUNT_FIELDS = tuple(account_schema.AccountOut.__fields__)
+VAULT_FIELDS = tuple(vault_schema.VaultOut.__fields__)
+
+
+def _line(type: str, data: dict) -> str:
+    return json.dumps({'type': type, **data}, separators=(',', ':')) + '\n'
+
+
+def _export_accounts(accounts_db: List[account_model.AccountModel], user_key: security.UserKey,
+                     export_key: security.UserKey | None) -> str:
+    """Decrypt a batch of accounts and serialize it as NDJSON lines.
+
+    With an export key the passwords are encrypted again under it.
+    """
+    lines = []
+    for account in accounts_db:
+        data = {field: getattr(account, field) for field in ACCOUNT_FIELDS}
+        password = security.decode_password(
+            password_encode=account.password, user_key=user_key)
+        if password is False:
+            data['password'] = None
+        elif export_key is not None:
+            data['password'] = security.encode_password(
+                password=password, user_key=export_key)
+        else:
+            data['password'] = password
+        lines.append(_line('account', data))
+    return ''.join(lines)
+
+
+async def _export(current_user: user_schema.UserPrincipal, session: AsyncSession,
+                  export_passphrase: str | None) -> AsyncIterator[str]:
+    """Yield the export of the user, one batch of NDJSON lines at a time."""
+    encryption = None
+    export_key = None
+    if export_passphrase is not None:
+        salt = os.urandom(security.EXPORT_SALT_SIZE)
+        export_key = await run_in_threadpool(
+            security.derive_export_key, export_passphrase, salt)
+        encryption = {
+            **security.EXPORT_KDF,
+            'salt': base64.urlsafe_b64encode(salt).decode(),
+            'envelope_version': security.ENVELOPE_VERSION,
+        }
+
+    yield _line('export', {
+        'version': EXPORT_VERSION,
+        'user_id': current_user.id,
+        'encryption': encryption,
+    })
+
+    async for vaults_db in AsyncVaultRepository(session).stream_vaults(
+            user_id=current_user.id, batch_size=settings.export_batch_size):
+        yield ''.join(
+            _line('vault', {field: getattr(vault, field) for field in VAULT_FIELDS})
+            for vault in vaults_db
+        )
+
+    # The user key is unwrapped once, every batch is decrypted in the threadpool
+    user_key = await key_management.get_user_key_async(
+        user_id=current_user.id, secret_key_encode=current_user.secret_key)
+    async for accounts_db in AsyncAccountRepository(session).stream_accounts(
+            user_id=current_user.id, batch_size=settings.export_batch_size):
+        yield await run_in_threadpool(_export_accounts, accounts_db, user_key, export_key)
+
+
+@router.get(path='/',
+            status_code=status.HTTP_200_OK,
+            response_class=StreamingResponse,
+            summary='Export all vaults and accounts',
+            )
+async def export_data(
+    export_passphrase: str | None = Header(None,
+                                           min_length=12,
+                                           description='Passphrase to encrypt the passwords of the export.',
+                                           ),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+) -> StreamingResponse:
+    """Export all vaults and accounts
+
+    This is the path operation to export all the vaults and accounts of the
+    user as NDJSON, one object per line. The first line describes the export,
+    it is followed by the vaults and then by the accounts. The export is
+    streamed in batches, so the memory used does not depend on the number of
+    accounts.
+
+    With the Export-Passphrase header the passwords are encrypted in the
+    versioned envelope with a key derived from the passphrase, the key
+    derivation parameters and the salt are in the first line.
+
+    Args:
+
+        Export-Passphrase (str): Optional passphrase to encrypt the passwords.
+        Token (str): This is the bearer token.
+
+    Returns:
+
+        NDJSON: The export lines.
+    """
+    return StreamingResponse(
+        _export(current_user, session, export_passphrase),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={'Content-Disposition': 'attachment; filename="11pass-export.ndjson"'},
+    )
@@ -0,0 +1,61 @@
+from typing import Any, Dict
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import PlainTextResponse
+from src.core import metrics
+from src.infra.database.config import pool
+from src.utils.auth_utils import verify_internal_token
+
+
+router = APIRouter()
+
+
+@router.get(path='/metrics',
+            status_code=status.HTTP_200_OK,
+            response_class=PlainTextResponse,
+            summary='Get the metrics of the process',
+            dependencies=[Depends(verify_internal_token)],
+            )
+async def get_metrics() -> PlainTextResponse:
+    """Get the metrics of the process
+
+    This path operation return the metrics in the Prometheus text format.
+
+    Raises:
+
+        HTTPException(json): If the bearer token is not INTERNAL_TOKEN.
+            Code: 401,
+            detail: Could not validate credentials.
+
+    Returns:
+
+        text: Metrics.
+    """
+    return PlainTextResponse(
+        content=metrics.registry.render(),
+        media_type='text/plain; version=0.0.4',
+    )
+
+
+@router.get(path='/pool',
+            status_code=status.HTTP_200_OK,
+            summary='Get the state of the connection pools',
+            dependencies=[Depends(verify_internal_token)],
+            )
+async def get_pool() -> Dict[str, Dict[str, Any]]:
+    """Get the state of the connection pools
+
+    This path operation return, for every engine, the pool size and limits,
+    the checked out, idle and overflow connections, and the checkout wait
+    times and timeouts since the start of the process.
+
+    Raises:
+
+        HTTPException(json): If the bearer token is not INTERNAL_TOKEN.
+            Code: 401,
+            detail: Could not validate credentials.
+
+    Returns:
+
+        json: Pool state by engine.
+    """
+    return {name: pool.pool_status(name, engine_pool) for name, engine_pool in pool.pools.items()}
@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends, Body, Path, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import Any, Dict
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core import key_management
 from src.infra.schemas import user_schema
 from src.infra.database.models import user_model
-from src.infra.database.repositories.user_repository import UserRepository
+from src.infra.database.repositories.base_repository import DuplicateError
+from src.infra.database.repositories.directory_repository import AsyncDirectoryRepository
+from src.infra.database.repositories.user_repository import AsyncUserRepository
 from src.infra.providers import password_provider
-from src.infra.database.config.database import get_db
-from src.utils.auth_utils import get_current_user
+from src.infra.database.config.sharding import get_db, get_directory_db, shard_map
+from src.utils.auth_utils import get_current_user, invalidate_principal
 
 
 router = APIRouter()
@@ -16,15 +20,15 @@ router = APIRouter()
             response_model=user_schema.UserOut,
             summary='Find user by ID',
             )
-def get_user(
+async def get_user(
     id: int = Path(...,
                    gt=0,
                    example=1,
                    description='ID of user to return.',
                    ),
-    current_user: user_model.UserModel = Depends(get_current_user),
-    session: Session = Depends(get_db),
-) -> user_schema.UserOut:
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+) -> Dict[str, Any]:
     """Find user by ID
 
     This path operation get user by ID, and return a single user.
@@ -44,21 +48,16 @@ def get_user(
 
         json: User data.
     """
-    user_reference = UserRepository(session).get_user_by_id(id)
-    if not user_reference:
+    # Only the current user is found, the profile is served by the response cache
+    user = await AsyncUserRepository(session).get_user_profile(
+        id, token_version=current_user.token_version) if id == current_user.id else None
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found',
         )
 
-    if id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail='User not found',
-        )
-
-    user_db = user_reference
-    return user_db
+    return user
 
 
 @router.put(path='/{id}',
@@ -66,19 +65,21 @@ def get_user(
             response_model=user_schema.UserOut,
             summary='Update an existing user',
             )
-def update_user(
+async def update_user(
     id: int = Path(...,
                    gt=0,
                    example=1,
                    description='ID of user to update.',
                    ),
     update_data: user_schema.UserLogin = Body(...,),
-    current_user: user_model.UserModel = Depends(get_current_user),
-    session: Session = Depends(get_db),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+    directory: AsyncSession = Depends(get_directory_db),
 ) -> user_schema.UserOut:
     """Update an existing user
 
     This is the path operation that updates an existing user in the app.
+    The names are verified and updated in the user directory first.
 
     Args:
 
@@ -100,12 +101,20 @@ def update_user(
             Code: 400,
             detail: Username already registered.
 
+        HTTPException(json): If a concurrent write registered the email or the username.
+            Code: 400,
+            detail: Email or username already registered.
+
+        HTTPException(json): If the password hashing queue is full.
+            Code: 503,
+            detail: Too many password hashing requests, retry later.
+
     Returns:
 
         json: User data.
     """
     # Verify user
-    user_reference = UserRepository(session).get_user_by_id(user_id=id)
+    user_reference = await AsyncUserRepository(session).get_user_by_id(user_id=id)
     if not user_reference:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -118,20 +127,19 @@ def update_user(
             detail='User not found',
         )
 
-    # Verify email duplicate in db
+    # Verify email duplicate in all the shards
+    directory_repository = AsyncDirectoryRepository(directory)
     if update_data.email != user_reference.email:
-        user_email_reference = UserRepository(
-            session).get_user(update_data.email)
+        user_email_reference = await directory_repository.get_user_id(update_data.email)
         if user_email_reference:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail='Email already registered.'
             )
 
-    # Verify username duplicate in db
+    # Verify username duplicate in all the shards
     if update_data.username != user_reference.username:
-        username_reference = UserRepository(
-            session).get_user(update_data.username)
+        username_reference = await directory_repository.get_user_id(update_data.username)
         if username_reference:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -139,12 +147,28 @@ def update_user(
             )
 
     # Hash password
-    update_data.password = password_provider.hash_password(
-        update_data.password
-    )
+    update_data.password = await password_provider.hash_password_async(
+        update_data.password)
+
+    try:
+        await directory_repository.update_entry(
+            user_id=id, email=update_data.email, username=update_data.username)
+    except DuplicateError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Email or username already registered.'
+        )
 
-    user_db = UserRepository(session).update_user(
-        user_id=id, update_data=update_data)
+    try:
+        user_db = await AsyncUserRepository(session).update_user(
+            user_id=id, update_data=update_data)
+    except Exception:
+        # Restore the names of the user that was not updated
+        await directory_repository.update_entry(
+            user_id=id, email=user_reference.email, username=user_reference.username)
+        raise
+    key_management.invalidate_user_key(user_id=id)
+    invalidate_principal(user_id=id)
 
     return user_db
 
@@ -154,14 +178,15 @@ def update_user(
                response_model=user_schema.UserOut,
                summary='Delete an user',
                )
-def delete_user(
+async def delete_user(
     id: int = Path(...,
                    gt=0,
                    example=1,
                    description='User ID to delete.',
                    ),
-    current_user=Depends(get_current_user),
-    session: Session = Depends(get_db)
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+    directory: AsyncSession = Depends(get_directory_db),
 ):
     """Delete an user
 
@@ -182,7 +207,7 @@ def delete_user(
         json: User data.
     """
     # Verify user
-    user_reference = UserRepository(session).get_user_by_id(user_id=id)
+    user_reference = await AsyncUserRepository(session).get_user_by_id(user_id=id)
     if not user_reference:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -196,6 +221,11 @@ def delete_user(
             detail='User not found',
         )
 
-    user_db = UserRepository(session).delete_user(user_id=id)
+    user_db = await AsyncUserRepository(session).delete_user(user_id=id)
+    # Release the names after the user is deleted from its shard
+    await AsyncDirectoryRepository(directory).delete_entry(user_id=id)
+    shard_map.invalidate(user_id=id)
+    key_management.invalidate_user_key(user_id=id)
+    invalidate_principal(user_id=id)
 
     return user_db
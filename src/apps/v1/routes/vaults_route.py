@@ -1,14 +1,78 @@
-from fastapi import APIRouter, Depends, Body, Path, HTTPException, status, Query
-from typing import List
-from sqlalchemy.orm import Session
-from src.infra.schemas import vault_schema
+from fastapi import APIRouter, Depends, Body, Path, HTTPException, status, Query, Request, Response
+from typing import Any, Dict, List, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.settings import Settings
+from src.infra.schemas import account_schema, card_schema, vault_schema, user_schema
 from src.infra.database.models import user_model, vault_model
-from src.infra.database.repositories.vault_repository import VaultRepository
-from src.infra.database.config.database import get_db
+from src.infra.database.repositories.base_repository import DuplicateError
+from src.infra.database.repositories.vault_repository import AsyncVaultRepository
+from src.infra.database.vault_purger import vault_purger
+from src.infra.database.config.sharding import get_db
 from src.utils.auth_utils import get_current_user
+from src.utils import etag_utils, pagination_utils, serialization_utils
 
 
 router = APIRouter()
+settings = Settings()
+
+VAULT_FIELDS = tuple(vault_schema.VaultPartialOut.__fields__)
+MAX_PAGE_SIZE = 500
+INCLUDE_RELATIONSHIPS = ('accounts', 'cards')
+# The passwords are left to the reveal endpoints of the accounts
+ACCOUNT_OUT_FIELDS = tuple(account_schema.AccountMetadataOut.__fields__)
+CARD_OUT_FIELDS = tuple(card_schema.CardOut.__fields__)
+
+
+def _parse_include(include: str | None) -> Tuple[str, ...]:
+    """Parse the comma separated relationships to include in the vaults."""
+    if not include:
+        return ()
+
+    relationships = tuple(dict.fromkeys(
+        relationship.strip() for relationship in include.split(',') if relationship.strip()))
+    unknown = [
+        relationship for relationship in relationships if relationship not in INCLUDE_RELATIONSHIPS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Unknown include: {", ".join(unknown)}.',
+        )
+    return relationships
+
+
+def _vault_trees(vaults_db: List[vault_model.VaultModel], fields: List[str],
+                 include: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    """Vault trees
+
+    This is function build the nested vaults, the children are already
+    loaded. The accounts are returned without their password.
+
+    Args:
+
+        vaults_db (List[VaultModel]): The vaults, with the included relationships loaded.
+        fields (List[str]): Vault fields to return.
+        include (Tuple[str, ...]): Relationships to return.
+
+    Returns:
+
+        List[Dict[str, Any]]: The vaults data, with their children.
+    """
+    vaults = []
+    for vault_db in vaults_db:
+        vault = {field: getattr(vault_db, field) for field in fields}
+        if 'accounts' in include:
+            vault['accounts'] = [
+                {field: getattr(account, field) for field in ACCOUNT_OUT_FIELDS}
+                for account in sorted(vault_db.accounts, key=lambda account: account.id)
+            ]
+        if 'cards' in include:
+            vault['cards'] = [
+                {field: getattr(card, field) for field in CARD_OUT_FIELDS}
+                for card in sorted(vault_db.cards, key=lambda card: card.id)
+            ]
+        vaults.append(vault)
+
+    return vaults
 
 
 @router.post(path='/',
@@ -16,10 +80,10 @@ router = APIRouter()
              response_model=vault_schema.VaultOut,
              summary='Create a new vault to the app',
              )
-def create_vault(
+async def create_vault(
     vault: vault_schema.VaultBase,
-    current_user: user_model.UserModel = Depends(get_current_user),
-    session: Session = Depends(get_db),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
 ) -> vault_schema.VaultOut:
     """Create a new vault in the app
 
@@ -51,46 +115,59 @@ def create_vault(
             detail='User not found.',
         )
 
-    # Verify vault name reference
-    vault_name_reference = VaultRepository(session).get_vault_by_name(
-        vault_name=vault.name, user_id=vault.user_id)
-    if vault_name_reference:
+    # Add to db, the vault name is verified by the insert
+    try:
+        vault_db = await AsyncVaultRepository(session).create_vault(vault)
+    except DuplicateError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail='Vault name already exists.'
         )
 
-    # Add to db
-    vault_db = VaultRepository(session).create_vault(vault)
-
     return vault_db
 
 
 @router.get(path='/{id}',
             status_code=status.HTTP_200_OK,
-            response_model=vault_schema.VaultOut,
+            response_model=vault_schema.VaultTreeOut,
+            response_model_exclude_unset=True,
             summary='Find vault by ID',
             )
-def get_vault(
+async def get_vault(
+    request: Request,
+    response: Response,
     id: int = Path(...,
                    gt=0,
                    example=1,
                    description='ID of vault to return.',
                    ),
-    current_user: user_model.UserModel = Depends(get_current_user),
-    session: Session = Depends(get_db),
-) -> vault_schema.VaultOut:
+    include: str | None = Query(None,
+                                example='accounts,cards',
+                                description='Comma separated children to return, accounts or cards.',
+                                ),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+) -> Dict[str, Any]:
     """Find vault by ID
 
     This path operation get vault by ID, and return a single vault.
+    The included children are nested in the vault, each one is loaded with a
+    single statement, the accounts without their password. The response has
+    an ETag, with a matching If-None-Match the answer is 304 without reading
+    the vault.
 
     Args:
 
         id (int): This is the vault ID.
+        include (str): Comma separated children to return, accounts or cards.
         Token (str): This is the bearer token.
 
     Raises:
 
+        HTTPException(json): If it is not a valid include.
+            Code: 400,
+            detail: Unknown include.
+
         HTTPException(json): If it is not a valid vault ID.
             Code: 404,
             detail: Vault not found.
@@ -99,36 +176,91 @@ def get_vault(
 
         json: Vault data.
     """
-    vault_db = VaultRepository(session).get_vault_by_id(
-        vault_id=id, user_id=current_user.id)
-    if not vault_db:
+    relationships = _parse_include(include)
+
+    # Answer from the client cache if the vaults did not change
+    not_modified, collection_version = await etag_utils.conditional_get(
+        request, response, current_user.id, session)
+    if not_modified:
+        return not_modified
+
+    # The vault alone is served by the response cache
+    if relationships:
+        vault_db = await AsyncVaultRepository(session).get_vault_by_id(
+            vault_id=id, user_id=current_user.id, include=relationships)
+        vaults = _vault_trees([vault_db] if vault_db else [], VAULT_FIELDS, relationships)
+    else:
+        vault = await AsyncVaultRepository(session).get_vault(
+            vault_id=id, user_id=current_user.id, collection_version=collection_version)
+        vaults = [vault] if vault else []
+    if not vaults:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='Vault not found',
         )
 
-    return vault_db
+    vault, = vaults
+    return vault
 
 
 @router.get(path='/',
             status_code=status.HTTP_200_OK,
-            response_model=List[vault_schema.VaultOut],
+            response_model=List[vault_schema.VaultTreeOut],
+            response_model_exclude_unset=True,
             summary='Get a list with all vaults.',
             )
-def get_vaults(
-    current_user: user_model.UserModel = Depends(get_current_user),
-    session: Session = Depends(get_db),
-) -> List[vault_schema.VaultOut]:
+async def get_vaults(
+    request: Request,
+    response: Response,
+    limit: int | None = Query(None,
+                              ge=1,
+                              le=MAX_PAGE_SIZE,
+                              description='Max number of vaults, all the vaults if it is not set.',
+                              ),
+    cursor: str | None = Query(None,
+                               description=f'Cursor of the next page, from the {pagination_utils.NEXT_CURSOR_HEADER} header.',
+                               ),
+    sort: str = Query('id',
+                      regex=pagination_utils.SORT_PATTERN,
+                      example='-name',
+                      description='Sort field, prefixed with - for descending order.',
+                      ),
+    fields: str | None = Query(None,
+                               example='name,icon_type',
+                               description='Comma separated fields to return, all the fields if it is not set.',
+                               ),
+    include: str | None = Query(None,
+                                example='accounts,cards',
+                                description='Comma separated children to return, accounts or cards.',
+                                ),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
+) -> List[Dict[str, Any]]:
     """Get a list with all vaults.
 
     This is the path operation to return a list of all vaults in the app.
+    The list is paginated when a limit is set, the cursor of the next page is
+    returned in the X-Next-Cursor header. The id and the sort field are
+    always returned. The included children are nested in the vaults, each one
+    is loaded with a single statement for the whole page, the accounts without
+    their password. The response has an ETag, with a matching If-None-Match
+    the answer is 304 without reading the vaults.
 
     Args:
 
+        limit (int): Max number of vaults.
+        cursor (str): Cursor of the next page.
+        sort (str): Sort field, id or name, prefixed with - for descending order.
+        fields (str): Comma separated fields to return.
+        include (str): Comma separated children to return, accounts or cards.
         Token (str): This is the bearer token.
 
     Raises:
 
+        HTTPException(json): If it is not a valid field, include or cursor.
+            Code: 400,
+            detail: Unknown fields, Unknown include or Invalid cursor.
+
         HTTPException(json): If it is not vaults.
             Code: 404,
             detail: Vaults not found.
@@ -137,14 +269,46 @@ def get_vaults(
 
         List[json]: Vaults data.
     """
-    vaults_db = VaultRepository(session).get_vaults(user_id=current_user.id)
-    if not vaults_db:
+    sort_field, _ = pagination_utils.parse_sort(sort)
+    columns = pagination_utils.parse_fields(
+        fields, VAULT_FIELDS, required_fields=('id', sort_field))
+    relationships = _parse_include(include)
+    after = pagination_utils.decode_cursor(cursor, sort)
+
+    # Answer from the client cache if the vaults did not change
+    not_modified, collection_version = await etag_utils.conditional_get(
+        request, response, current_user.id, session)
+    if not_modified:
+        return not_modified
+
+    # Fetch one more row to know if there is a next page
+    if relationships:
+        vaults_db = await AsyncVaultRepository(session).get_vault_trees(
+            user_id=current_user.id, include=relationships, sort=sort, after=after,
+            limit=limit + 1 if limit else None)
+    else:
+        vaults_db = await AsyncVaultRepository(session).get_vaults(
+            user_id=current_user.id, collection_version=collection_version, fields=columns,
+            sort=sort, after=after, limit=limit + 1 if limit else None)
+    if not vaults_db and after is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='Vaults not found',
         )
 
-    return vaults_db
+    vaults_db, next_cursor = pagination_utils.split_page(vaults_db, limit, sort)
+    if next_cursor:
+        response.headers[pagination_utils.NEXT_CURSOR_HEADER] = next_cursor
+
+    if relationships:
+        vaults = _vault_trees(vaults_db, columns, relationships)
+    else:
+        to_dict = serialization_utils.row_serializer(tuple(columns), VAULT_FIELDS)
+        vaults = list(map(to_dict, vaults_db))
+
+    if settings.fast_serialization:
+        return serialization_utils.json_response(vaults, response)
+    return vaults
 
 
 @router.put(path='/{id}',
@@ -152,15 +316,15 @@ def get_vaults(
             response_model=vault_schema.VaultOut,
             summary='Update an existing vault',
             )
-def update_vault(
+async def update_vault(
     id: int = Path(...,
                    gt=0,
                    example=1,
                    description='ID of vault to update.',
                    ),
     update_data: vault_schema.VaultBase = Body(...,),
-    current_user: user_model.UserModel = Depends(get_current_user),
-    session: Session = Depends(get_db),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
 ) -> vault_schema.VaultOut:
     """Update an existing vault
 
@@ -186,29 +350,21 @@ def update_vault(
 
         json: Vault data.
     """
-    # Verify vault
-    vault_reference = VaultRepository(session).get_vault_by_id(
-        vault_id=id, user_id=current_user.id)
-    if not vault_reference:
+    # Update vault data, the vault name is verified by the update
+    try:
+        vault_db = await AsyncVaultRepository(session).update_vault(
+            user_id=current_user.id, vault_id=id, update_data=update_data)
+    except DuplicateError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Vault name already exists.'
+        )
+    if not vault_db:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='Vault not found.',
         )
 
-    # Verify vault name duplicate in db
-    if update_data.name != vault_reference.name:
-        vault_name_reference = VaultRepository(session).get_vault_by_name(
-            vault_name=update_data.name, user_id=current_user.id)
-        if vault_name_reference:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail='Vault name already exists.'
-            )
-
-    # Update vault data
-    vault_db = VaultRepository(session).update_vault(
-        user_id=current_user.id, vault_id=id, update_data=update_data)
-
     return vault_db
 
 
@@ -217,18 +373,20 @@ def update_vault(
                response_model=vault_schema.VaultOut,
                summary='Delete an vault',
                )
-def delete_vault(
+async def delete_vault(
     id: int = Path(...,
                    gt=0,
                    example=1,
                    description='Vault ID to delete.',
                    ),
-    current_user: user_model.UserModel = Depends(get_current_user),
-    session: Session = Depends(get_db),
+    current_user: user_schema.UserPrincipal = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db),
 ) -> vault_schema.VaultOut:
     """Delete an vault
 
-    This is the path operation that deletes an existing vault in the app.
+    This is the path operation that deletes an existing vault in the app,
+    with its accounts and cards. The items of a large vault are deleted in
+    background, the vault is gone for the user at once.
 
     Args:
 
@@ -244,16 +402,15 @@ def delete_vault(
     Returns:
         json: Vault data.
     """
-    # Verify vault reference by id
-    vault_reference = VaultRepository(session).get_vault_by_id(
-        vault_id=id, user_id=current_user.id)
-    if not vault_reference:
+    # Delete the vault, the vault reference is verified by the delete
+    vault_db, purge = await AsyncVaultRepository(session).delete_vault(
+        vault_id=id, user_id=current_user.id, purge_threshold=settings.vault_purge_threshold)
+    if not vault_db:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='Vault not found.'
         )
-
-    # Delete the vault
-    vault_db = VaultRepository(session).delete_vault(vault_id=id, user_id=current_user.id)
+    if purge:
+        vault_purger.wake()
 
     return vault_db
@@ -0,0 +1,247 @@
+import asyncio
+import json
+import logging
+from collections import namedtuple
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List
+from urllib.parse import urlparse
+from src.core import metrics
+from src.core.settings import Settings
+from src.core.ttl_cache import TTLCache
+
+settings = Settings()
+logger = logging.getLogger(__name__)
+
+MEMORY_BACKEND = 'memory'
+DISABLED_BACKEND = 'none'
+
+cache_hits = metrics.counter(
+    'cache_hits_total', 'Response cache reads served from the cache.', ['resource'])
+cache_misses = metrics.counter(
+    'cache_misses_total', 'Response cache reads loaded from the database.', ['resource'])
+cache_evictions = metrics.counter(
+    'cache_evictions_total', 'Response cache entries evicted to stay under the size limit.', ['backend'])
+cache_errors = metrics.counter(
+    'cache_errors_total', 'Response cache backend errors, served as misses.', ['backend'])
+
+
+class CacheBackend():
+    """Cache backend
+
+    Base of the response cache backends, the values are JSON text. A backend
+    error must never fail the request, the cache treats it as a miss.
+    """
+    name = DISABLED_BACKEND
+
+    async def get(self, key: str) -> str | None:
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        pass
+
+    async def delete(self, keys: Iterable[str]) -> None:
+        pass
+
+    async def clear(self) -> None:
+        """Drop the entries of this process, a shared backend keeps them."""
+
+
+class MeteredTTLCache(TTLCache):
+    """TTL cache that counts the entries evicted by the size limit."""
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            full = key not in self._entries and len(self._entries) >= self.max_size
+            super().set(key, value)
+        if full:
+            cache_evictions.inc(backend=MEMORY_BACKEND)
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Memory cache backend
+
+    In-process LRU with TTL, the entries over the size limit are evicted
+    least recently used first.
+    """
+    name = MEMORY_BACKEND
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._entries = MeteredTTLCache(max_size=max_size, ttl=ttl)
+
+    async def get(self, key: str) -> str | None:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: str) -> None:
+        self._entries.set(key, value)
+
+    async def delete(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self._entries.invalidate(key)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+
+class RedisError(Exception):
+    """Raised with the error replies of the server."""
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis cache backend
+
+    Minimal RESP client of GET, SET EX and DEL over a single connection, any
+    server that speaks the Redis protocol can serve it. The eviction is left
+    to the server (maxmemory-policy allkeys-lru).
+    """
+    name = 'redis'
+
+    def __init__(self, url: str, ttl: int) -> None:
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.ttl = ttl
+        self._connection = None
+        self._loop = None
+        self._lock = None
+
+    async def get(self, key: str) -> str | None:
+        value = await self._command('GET', key)
+        return value.decode() if value is not None else None
+
+    async def set(self, key: str, value: str) -> None:
+        await self._command('SET', key, value, 'EX', self.ttl)
+
+    async def delete(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if keys:
+            await self._command('DEL', *keys)
+
+    async def _command(self, *args: Any) -> Any:
+        # The connection and the lock belong to the event loop that made them
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._connection, self._loop, self._lock = None, loop, asyncio.Lock()
+
+        async with self._lock:
+            try:
+                if self._connection is None:
+                    self._connection = await self._connect()
+                return await self._execute(self._connection, args)
+            except (OSError, EOFError, asyncio.IncompleteReadError, RedisError) as error:
+                cache_errors.inc(backend=self.name)
+                logger.warning('Response cache command %s failed: %s', args[0], error)
+                self._close()
+                return None
+
+    async def _connect(self):
+        connection = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._execute(connection, ('AUTH', self.password))
+        if self.db:
+            await self._execute(connection, ('SELECT', self.db))
+        return connection
+
+    async def _execute(self, connection, args: Iterable[Any]) -> Any:
+        reader, writer = connection
+        parts = [str(arg).encode() for arg in args]
+        writer.write(b''.join(
+            [f'*{len(parts)}\r\n'.encode()]
+            + [f'${len(part)}\r\n'.encode() + part + b'\r\n' for part in parts]
+        ))
+        await writer.drain()
+        return await _read_reply(reader)
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection[1].close()
+        self._connection = None
+
+
+async def _read_reply(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readuntil(b'\r\n')
+    prefix, payload = line[:1], line[1:-2]
+    if prefix == b'+':
+        return payload
+    if prefix == b'-':
+        raise RedisError(payload.decode())
+    if prefix == b':':
+        return int(payload)
+    if prefix == b'$':
+        length = int(payload)
+        if length == -1:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if prefix == b'*':
+        return [await _read_reply(reader) for _ in range(int(payload))]
+    raise RedisError(f'Unknown reply: {line!r}')
+
+
+class ResponseCache():
+    """Response cache
+
+    Cache of the read models in front of the repositories. The keys are by
+    user and by resource, `user:{user_id}:{resource}` and the parts of the
+    value. The parts include the version of the data, the collection version
+    or the token version of the user, so an entry is never stale: a write
+    bumps the version and the old entries are unreachable until they expire.
+    A read that races the write can only store its value under the old key.
+    """
+
+    def __init__(self, backend: CacheBackend) -> None:
+        self.backend = backend
+
+    @staticmethod
+    def key(user_id: int, resource: str, *parts: Any) -> str:
+        return ':'.join(map(str, ('user', user_id, resource, *parts)))
+
+    async def get_or_load(self, user_id: int, resource: str, parts: Iterable[Any],
+                          load: Callable[[], Awaitable[Any]]) -> Any:
+        """Get or load
+
+        This is function return the cached value of the resource, or load it
+        and cache it. A None value is not cached.
+
+        Args:
+
+            user_id (int): The user of the resource.
+            resource (str): The resource name, the label of the metrics.
+            parts (Iterable[Any]): The rest of the key, the id or the query.
+            load (Callable[[], Awaitable[Any]]): Load the JSON serializable value.
+
+        Returns:
+
+            Any: The value.
+        """
+        key = self.key(user_id, resource, *parts)
+        cached = await self.backend.get(key)
+        if cached is not None:
+            cache_hits.inc(resource=resource)
+            return json.loads(cached)
+
+        cache_misses.inc(resource=resource)
+        value = await load()
+        if value is not None:
+            await self.backend.set(key, json.dumps(value))
+        return value
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+
+
+def create_backend(backend: str) -> CacheBackend:
+    """Create the backend of the setting, memory, none or a redis:// url."""
+    if backend == DISABLED_BACKEND:
+        return CacheBackend()
+    if backend.startswith('redis://'):
+        return RedisCacheBackend(backend, ttl=settings.cache_ttl)
+    return MemoryCacheBackend(max_size=settings.cache_size, ttl=settings.cache_ttl)
+
+
+response_cache = ResponseCache(create_backend(settings.cache_backend))
+
+
+def rows(fields: List[str], values: List[Dict[str, Any]]) -> List[Any]:
+    """Rebuild the cached rows, with the attribute access and `_asdict` of a Row."""
+    row = namedtuple('CachedRow', fields)
+    return [row(**value) for value in values]
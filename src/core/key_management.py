@@ -0,0 +1,117 @@
+import hashlib
+from fastapi.concurrency import run_in_threadpool
+from src.core import security
+from src.core.ttl_cache import TTLCache
+from src.core.settings import Settings
+
+settings = Settings()
+
+
+class KeyCache(TTLCache):
+    """Key cache
+
+    Bounded in-process cache of unwrapped user keys. Entries are keyed by
+    user id and the key version, expire after a TTL and are evicted least
+    recently used first. The key bytes are zeroed when an entry leaves the
+    cache, callers get a copy so an eviction never wipes a key in use.
+    """
+
+    def get(self, user_id: int, key_version: str) -> security.UserKey | None:
+        with self._lock:
+            entry = super().get(user_id)
+            if entry is None:
+                return None
+
+            version, user_key = entry
+            if version != key_version:
+                self.invalidate(user_id)
+                return None
+
+            return user_key.copy()
+
+    def set(self, user_id: int, key_version: str, user_key: security.UserKey) -> None:
+        super().set(user_id, (key_version, user_key.copy()))
+
+    def _on_evict(self, entry: tuple) -> None:
+        _, user_key = entry
+        user_key.wipe()
+
+
+key_cache = KeyCache(max_size=settings.key_cache_size,
+                     ttl=settings.key_cache_ttl)
+
+
+def key_version(secret_key_encode: str) -> str:
+    """Key version
+
+    This function return a short fingerprint of the wrapped secret key, it
+    changes every time the user key is wrapped again.
+
+    Args:
+
+        secret_key_encode (str): The encrypted user secret key.
+
+    Returns:
+
+        str: The key version.
+    """
+    return hashlib.blake2b(secret_key_encode.encode(), digest_size=8).hexdigest()
+
+
+def get_user_key(user_id: int, secret_key_encode: str) -> security.UserKey:
+    """Get user key
+
+    This function return the user key, unwrapping the secret key and deriving
+    the data key only when it is not already in the key cache.
+
+    Args:
+
+        user_id (int): The user id.
+        secret_key_encode (str): The encrypted user secret key.
+
+    Returns:
+
+        security.UserKey: The user key.
+    """
+    version = key_version(secret_key_encode)
+    user_key = key_cache.get(user_id, version)
+    if user_key is None:
+        user_key = security.derive_user_key(security.decode_secret_key(
+            secret_key_encode=secret_key_encode))
+        key_cache.set(user_id, version, user_key)
+
+    return user_key
+
+
+async def get_user_key_async(user_id: int, secret_key_encode: str) -> security.UserKey:
+    """Get user key async
+
+    This function is the async version of `get_user_key`, the unwrap of a key
+    that is not in the key cache runs in the threadpool.
+
+    Args:
+
+        user_id (int): The user id.
+        secret_key_encode (str): The encrypted user secret key.
+
+    Returns:
+
+        security.UserKey: The user key.
+    """
+    user_key = key_cache.get(user_id, key_version(secret_key_encode))
+    if user_key is None:
+        user_key = await run_in_threadpool(get_user_key, user_id, secret_key_encode)
+
+    return user_key
+
+
+def invalidate_user_key(user_id: int) -> None:
+    """Invalidate user key
+
+    This function remove the user key from the key cache.
+
+    Args:
+
+        user_id (int): The user id.
+    """
+    key_cache.invalidate(user_id)
@@ -0,0 +1,238 @@
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = '') -> str:
+    labels = [f'{name}="{value}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+class Metric():
+    """Metric
+
+    Base of the metrics, a family of samples with the same name and label
+    names rendered in the Prometheus text format.
+    """
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def values(self) -> Dict[Tuple[str, ...], Any]:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def add(total: Any, value: Any) -> Any:
+        """Sum the values of a sample in two processes."""
+        return total + value
+
+    def samples(self, values: Dict[Tuple[str, ...], Any] | None = None) -> List[str]:
+        values = self.values() if values is None else values
+        return [
+            f'{self.name}{_format_labels(self.labelnames, key)} {value}'
+            for key, value in values.items()
+        ]
+
+    def render(self, values: Dict[Tuple[str, ...], Any] | None = None) -> str:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type_name}',
+        ]
+        lines.extend(self.samples(values))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(
+                key, ([0] * len(self.buckets), 0.0, 0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def snapshot(self, **labels: str) -> Tuple[int, float]:
+        """Return the count and the sum of the observations."""
+        with self._lock:
+            _, total, count = self._values.get(self._key(labels), (None, 0.0, 0))
+        return count, total
+
+    @staticmethod
+    def add(total: Any, value: Any) -> Any:
+        (total_counts, total_sum, total_count), (counts, value_sum, count) = total, value
+        return ([a + b for a, b in zip(total_counts, counts)], total_sum + value_sum, total_count + count)
+
+    def values(self) -> Dict[Tuple[str, ...], Any]:
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+
+    def samples(self, values: Dict[Tuple[str, ...], Any] | None = None) -> List[str]:
+        lines = []
+        values = self.values() if values is None else values
+        for key, (counts, total, count) in values.items():
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{labels} {bucket_count}')
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry():
+    """Registry
+
+    The metrics of the process, rendered together on the metrics endpoint.
+    The workers of a server share them through a directory, every worker
+    dumps its metrics to its own file and the render sums the files of all
+    the workers, the counters and histograms of the stopped workers
+    included.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self.directory: str | None = None
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Add a function that updates metrics read from elsewhere before every render."""
+        self._collectors.append(collector)
+
+    def collect(self) -> None:
+        for collector in self._collectors:
+            collector()
+
+    def share(self, directory: str) -> None:
+        """Sum the metrics of the processes that dump to the directory, the older dumps are removed."""
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(directory, name))
+        self.directory = directory
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def _write(self, pid: int, state: Dict[str, List[Any]]) -> None:
+        # Replaced at once, a render never reads half a file
+        path = self._path(pid)
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(state, file)
+        os.replace(f'{path}.tmp', path)
+
+    def dump(self, live: bool = True) -> None:
+        """Dump the metrics of the process to the shared directory, the gauges only while it is live."""
+        self.collect()
+        self._write(os.getpid(), {
+            name: [[list(key), value] for key, value in metric.values().items()]
+            for name, metric in self._metrics.items()
+            if live or metric.type_name != Gauge.type_name
+        })
+
+    def mark_process_dead(self, pid: int) -> None:
+        """Drop the gauges of a process that exited, its counters and histograms are kept."""
+        try:
+            with open(self._path(pid)) as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return
+        self._write(pid, {
+            name: samples for name, samples in state.items()
+            if name in self._metrics and self._metrics[name].type_name != Gauge.type_name
+        })
+
+    def _shared_values(self) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+        values: Dict[str, Dict[Tuple[str, ...], Any]] = {}
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.json'):
+                continue
+            with open(os.path.join(self.directory, name)) as file:
+                state = json.load(file)
+            for metric_name, samples in state.items():
+                metric = self._metrics.get(metric_name)
+                if metric is None:
+                    continue
+                metric_values = values.setdefault(metric_name, {})
+                for key, value in samples:
+                    key = tuple(key)
+                    metric_values[key] = metric.add(metric_values[key], value) if key in metric_values else value
+        return values
+
+    def render(self) -> str:
+        if self.directory is None:
+            self.collect()
+            return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+        self.dump()
+        values = self._shared_values()
+        return '\n'.join(
+            metric.render(values.get(name, {})) for name, metric in self._metrics.items()) + '\n'
+
+
+registry = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return registry.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (),
+              buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
@@ -0,0 +1,208 @@
+import base64
+import hashlib
+import os
+import secrets
+import cryptocode
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from src.core.settings import Settings
+
+settings = Settings()
+
+# Envelope format: version (1 byte) | key id | nonce | AES-GCM body
+ENVELOPE_VERSION = 1
+KEY_ID_SIZE = 4
+NONCE_SIZE = 12
+HEADER_SIZE = 1 + KEY_ID_SIZE
+# Legacy cryptocode ciphertexts are four base64 fields joined by '*'
+LEGACY_SEPARATOR = '*'
+# Export passphrase key derivation
+EXPORT_KDF = {'name': 'scrypt', 'n': 2 ** 15, 'r': 8, 'p': 1}
+EXPORT_SALT_SIZE = 16
+
+
+class UserKey():
+    """User key
+
+    The unwrapped user secret key and the data key derived from it, the
+    data key is derived only once per user and used for every envelope.
+    """
+
+    def __init__(self, secret_key: bytes, data_key: bytes) -> None:
+        self.secret_key = bytearray(secret_key)
+        self.data_key = bytearray(data_key)
+        self.key_id = hashlib.blake2b(
+            self.data_key, digest_size=KEY_ID_SIZE).digest()
+
+    def copy(self) -> 'UserKey':
+        return UserKey(self.secret_key, self.data_key)
+
+    def wipe(self) -> None:
+        """Overwrite the key bytes with zeros."""
+        self.secret_key[:] = bytes(len(self.secret_key))
+        self.data_key[:] = bytes(len(self.data_key))
+
+
+def secret_key_generator() -> str:
+    """Secret key generator
+
+    This function generate a random secret key for a new user.
+
+    Returns:
+
+        str: The plain secret key.
+    """
+    return secrets.token_urlsafe(32)
+
+
+def encode_secret_key(secret_key: str) -> str:
+    """Encode secret key
+
+    This function encrypt the user secret key with the app secret key.
+
+    Args:
+
+        secret_key (str): The plain user secret key.
+
+    Returns:
+
+        str: The encrypted user secret key.
+    """
+    return cryptocode.encrypt(secret_key, settings.secret_key)
+
+
+def decode_secret_key(secret_key_encode: str) -> str:
+    """Decode secret key
+
+    This function decrypt the user secret key with the app secret key.
+
+    Args:
+
+        secret_key_encode (str): The encrypted user secret key.
+
+    Returns:
+
+        str: The plain user secret key.
+    """
+    return cryptocode.decrypt(secret_key_encode, settings.secret_key)
+
+
+def derive_user_key(secret_key: str) -> UserKey:
+    """Derive user key
+
+    This function derive the AES-GCM data key from the plain user secret key.
+
+    Args:
+
+        secret_key (str): The plain user secret key.
+
+    Returns:
+
+        UserKey: The user key.
+    """
+    secret_key = secret_key.encode()
+    data_key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b'11pass-account-password',
+    ).derive(secret_key)
+    return UserKey(secret_key=secret_key, data_key=data_key)
+
+
+def derive_export_key(passphrase: str, salt: bytes) -> UserKey:
+    """Derive export key
+
+    This function derive the data key of an export from the passphrase of
+    the caller, the passwords of the export are encrypted in the same
+    versioned envelope as the stored ones.
+
+    Args:
+
+        passphrase (str): The export passphrase.
+        salt (bytes): The random salt of the export.
+
+    Returns:
+
+        UserKey: The export key.
+    """
+    data_key = Scrypt(
+        salt=salt,
+        length=32,
+        n=EXPORT_KDF['n'],
+        r=EXPORT_KDF['r'],
+        p=EXPORT_KDF['p'],
+    ).derive(passphrase.encode())
+    return UserKey(secret_key=b'', data_key=data_key)
+
+
+def is_legacy_password(password_encode: str) -> bool:
+    """Is legacy password
+
+    This function check if an encrypted password is in the legacy cryptocode
+    format instead of the versioned envelope.
+
+    Args:
+
+        password_encode (str): The encrypted account password.
+
+    Returns:
+
+        bool: True if the password must be encrypted again.
+    """
+    return LEGACY_SEPARATOR in password_encode
+
+
+def encode_password(password: str, user_key: UserKey) -> str:
+    """Encode password
+
+    This function encrypt an account password in the versioned envelope
+    with the user data key.
+
+    Args:
+
+        password (str): The plain account password.
+        user_key (UserKey): The user key.
+
+    Returns:
+
+        str: The encrypted account password.
+    """
+    header = bytes([ENVELOPE_VERSION]) + user_key.key_id
+    nonce = os.urandom(NONCE_SIZE)
+    body = AESGCM(user_key.data_key).encrypt(nonce, password.encode(), header)
+    return base64.urlsafe_b64encode(header + nonce + body).decode()
+
+
+def decode_password(password_encode: str, user_key: UserKey) -> str | bool:
+    """Decode password
+
+    This function decrypt an account password, in the versioned envelope or
+    in the legacy cryptocode format.
+
+    Args:
+
+        password_encode (str): The encrypted account password.
+        user_key (UserKey): The user key.
+
+    Returns:
+
+        str | bool: The plain account password or False if it can not be decrypted.
+    """
+    if is_legacy_password(password_encode):
+        return cryptocode.decrypt(password_encode, user_key.secret_key.decode())
+
+    envelope = base64.urlsafe_b64decode(password_encode)
+    header = envelope[:HEADER_SIZE]
+    nonce = envelope[HEADER_SIZE:HEADER_SIZE + NONCE_SIZE]
+    body = envelope[HEADER_SIZE + NONCE_SIZE:]
+    if header != bytes([ENVELOPE_VERSION]) + user_key.key_id:
+        return False
+
+    try:
+        return AESGCM(user_key.data_key).decrypt(nonce, body, header).decode()
+    except InvalidTag:
+        return False
@@ -16,11 +16,88 @@ class Settings(BaseSettings):
     db_pass: str = os.getenv('DB_PASS')
     db_host: str = os.getenv('DB_HOST')
     db_port: str = os.getenv('DB_PORT')
+    # Full database url, overrides the postgres settings (e.g. a local sqlite stand-in)
+    database_url: str | None = os.getenv('DATABASE_URL')
+    # Read replicas, comma separated urls, the GET requests read from them
+    database_replica_urls: str | None = os.getenv('DATABASE_REPLICA_URLS')
+    # Seconds an unhealthy replica is skipped before it is probed again
+    db_replica_retry_interval: float = os.getenv('DB_REPLICA_RETRY_SECONDS', 30)
+    # Shards, comma separated urls, every user is placed by a hash of its id.
+    # The database url keeps the user directory, the shard of every user
+    database_shard_urls: str | None = os.getenv('DATABASE_SHARD_URLS')
+    shard_cache_size: int = os.getenv('SHARD_CACHE_SIZE', 4096)
+    shard_cache_ttl: int = os.getenv('SHARD_CACHE_TTL_SECONDS', 300)
+    # Async engine and sessions, set DB_ASYNC=false to use the sync path
+    db_async: bool = os.getenv('DB_ASYNC', True)
+    # Connection pool, by engine
+    db_pool_size: int = os.getenv('DB_POOL_SIZE', 5)
+    db_max_overflow: int = os.getenv('DB_MAX_OVERFLOW', 10)
+    db_pool_timeout: float = os.getenv('DB_POOL_TIMEOUT_SECONDS', 30)
+    db_pool_recycle: int = os.getenv('DB_POOL_RECYCLE_SECONDS', 1800)
+    db_pool_pre_ping: bool = os.getenv('DB_POOL_PRE_PING', True)
+    db_statement_timeout: int = os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000)
+    # Hash partitions by user of the accounts and cards tables, only on Postgres.
+    # Read by the migration that partitions them, a change needs a new migration
+    db_hash_partitions: int = os.getenv('DB_HASH_PARTITIONS', 8)
 
     # Security 
     secret_key: str = os.getenv('SECRET_KEY')
     token_expire: int = os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES')
     algorithm_type: str = os.getenv('ALGORITHM')
+    principal_cache_size: int = os.getenv('PRINCIPAL_CACHE_SIZE', 4096)
+    principal_cache_ttl: int = os.getenv('PRINCIPAL_CACHE_TTL_SECONDS', 30)
+    # Bearer token of the internal endpoints, they are disabled without it
+    internal_token: str | None = os.getenv('INTERNAL_TOKEN')
+
+    # Password hashing, the processes are by server worker, the default shares the cores
+    hashing_workers: int = os.getenv(
+        'HASHING_WORKERS', max((os.cpu_count() or 1) // int(os.getenv('SERVER_WORKERS') or os.cpu_count() or 1), 1))
+    hashing_queue_size: int = os.getenv('HASHING_QUEUE_SIZE', 32)
+    hashing_retry_after: int = os.getenv('HASHING_RETRY_AFTER_SECONDS', 1)
+
+    # Key management
+    key_cache_size: int = os.getenv('KEY_CACHE_SIZE', 1024)
+    key_cache_ttl: int = os.getenv('KEY_CACHE_TTL_SECONDS', 300)
+
+    # Vault deletion, the items of a larger vault are purged in background batches
+    vault_purge_threshold: int = os.getenv('VAULT_PURGE_THRESHOLD', 1000)
+    vault_purge_batch_size: int = os.getenv('VAULT_PURGE_BATCH_SIZE', 500)
+    vault_purge_interval: int = os.getenv('VAULT_PURGE_INTERVAL_SECONDS', 60)
+
+    # Export and import
+    export_batch_size: int = os.getenv('EXPORT_BATCH_SIZE', 200)
+    import_batch_size: int = os.getenv('IMPORT_BATCH_SIZE', 200)
+    import_max_items: int = os.getenv('IMPORT_MAX_ITEMS', 5000)
+    import_max_bytes: int = os.getenv('IMPORT_MAX_BYTES', 5 * 1024 * 1024)
+
+    # Response cache, memory, none or a redis://host:port/db url
+    cache_backend: str = os.getenv('CACHE_BACKEND', 'memory')
+    cache_size: int = os.getenv('CACHE_SIZE', 10000)
+    cache_ttl: int = os.getenv('CACHE_TTL_SECONDS', 60)
+    # Full flush of the in-process caches, for the missed invalidation events
+    cache_flush_interval: int = os.getenv('CACHE_FLUSH_INTERVAL_SECONDS', 300)
+
+    # Account search, the n-gram indexes of the non Postgres databases
+    search_index_cache_size: int = os.getenv('SEARCH_INDEX_CACHE_SIZE', 64)
+    search_index_cache_ttl: int = os.getenv('SEARCH_INDEX_CACHE_TTL_SECONDS', 600)
+
+    # Serialization, orjson responses and the list responses built from the
+    # rows without validating them again
+    fast_serialization: bool = os.getenv('FAST_SERIALIZATION', False)
+
+    # Server of python -m src.main, one async worker by core
+    server_host: str = os.getenv('SERVER_HOST', '0.0.0.0')
+    server_port: int = os.getenv('SERVER_PORT', 8000)
+    server_workers: int = os.getenv('SERVER_WORKERS', os.cpu_count() or 1)
+    server_backlog: int = os.getenv('SERVER_BACKLOG', 2048)
+    server_keepalive: int = os.getenv('SERVER_KEEPALIVE_SECONDS', 5)
+    server_timeout: int = os.getenv('SERVER_TIMEOUT_SECONDS', 60)
+    # Time of the requests in flight to finish after a SIGTERM
+    server_graceful_timeout: int = os.getenv('SERVER_GRACEFUL_TIMEOUT_SECONDS', 30)
+    # Directory of the metrics of the workers, the metrics endpoint sums them.
+    # A temporary directory is used with more than one worker when it is not set
+    metrics_dir: str | None = os.getenv('METRICS_DIR')
+    metrics_dump_interval: int = os.getenv('METRICS_DUMP_INTERVAL_SECONDS', 5)
 
     # Prefix route
     api_v1_url: str = os.getenv('API_PREFIX_ROUTER')
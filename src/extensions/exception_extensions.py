@@ -0,0 +1,27 @@
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
+from src.core.settings import Settings
+from src.infra.providers.hashing_executor import HashingQueueFull
+
+settings = Settings()
+
+
+async def hashing_queue_full_handler(request: Request, exc: HashingQueueFull) -> JSONResponse:
+    """Answer a fast 503 when the password hashing queue is full."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={'detail': 'Too many password hashing requests, retry later.'},
+        headers={'Retry-After': str(settings.hashing_retry_after)},
+    )
+
+
+def register_exception_handlers(app: FastAPI) -> None:
+    """Register the exception handlers
+
+    This is function to register the handlers of the app exceptions.
+
+    Args:
+
+        app (FastAPI): FastAPI instance.
+    """
+    app.add_exception_handler(HashingQueueFull, hashing_queue_full_handler)
@@ -0,0 +1,16 @@
+from fastapi import FastAPI
+from src.infra.database.config.invalidation_bus import bus
+
+
+def register_invalidation_bus(app: FastAPI) -> None:
+    """Register the invalidation bus
+
+    This is function start the listener of the cache invalidation events
+    with the worker, and stop it on shutdown. It only listens on Postgres.
+
+    Args:
+
+        app (FastAPI): FastAPI instance.
+    """
+    app.add_event_handler('startup', bus.start)
+    app.add_event_handler('shutdown', bus.stop)
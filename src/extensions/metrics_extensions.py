@@ -0,0 +1,166 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Any
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from src.core import metrics
+from src.core.settings import Settings
+
+settings = Settings()
+
+# Statements by request, a request with more is in the last bucket
+STATEMENT_BUCKETS = (1, 2, 3, 4, 5, 8, 13, 21, 34, 55)
+UNMATCHED_ROUTE = 'unmatched'
+
+http_requests = metrics.counter(
+    'http_requests_total', 'HTTP requests by route and status code.', ['method', 'route', 'status'])
+http_request_duration = metrics.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route.', ['method', 'route'])
+http_requests_in_flight = metrics.gauge(
+    'http_requests_in_flight', 'HTTP requests being served.')
+db_statements = metrics.histogram(
+    'db_statements_per_request', 'SQL statements run by request.', ['method', 'route'],
+    buckets=STATEMENT_BUCKETS)
+db_duration = metrics.histogram(
+    'db_duration_seconds_per_request', 'Time spent running SQL statements by request.', ['method', 'route'])
+
+
+class RequestStats():
+    """The SQL statements run by the current request and their time."""
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.duration = 0.0
+
+
+# The threadpool and the session greenlets copy the context, the stats
+# object is shared with them and updated in place
+request_stats: ContextVar[RequestStats | None] = ContextVar('request_stats', default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    start = conn.info['query_start'].pop()
+    stats = request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.duration += time.perf_counter() - start
+
+
+def _handle_error(exception_context) -> None:
+    # The failed statement is not counted, only its start time is discarded
+    query_start = exception_context.connection.info.get('query_start') \
+        if exception_context.connection is not None else None
+    if query_start:
+        query_start.pop()
+
+
+class MetricsMiddleware():
+    """Metrics middleware
+
+    Record the latency, the status code and the SQL statements of every
+    request, labeled by the route path template.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            request_stats.reset(token)
+
+            # The route is set in the scope by the router when it matches
+            route = scope.get('route')
+            labels = {
+                'method': scope['method'],
+                'route': getattr(route, 'path', UNMATCHED_ROUTE),
+            }
+            http_requests.inc(status=str(status_code), **labels)
+            http_request_duration.observe(duration, **labels)
+            db_statements.observe(stats.statements, **labels)
+            db_duration.observe(stats.duration, **labels)
+
+
+class MetricsDumper():
+    """Metrics dumper
+
+    Background task of the worker that dumps its metrics to the shared
+    directory every interval, for the renders of the other workers, and
+    once more without its gauges on shutdown. It only runs when the
+    registry is shared.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            metrics.registry.dump()
+
+    def start(self) -> None:
+        if metrics.registry.directory is None or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        metrics.registry.dump(live=False)
+
+
+metrics_dumper = MetricsDumper(interval=settings.metrics_dump_interval)
+
+
+def register_metrics(app: FastAPI) -> None:
+    """Register the metrics
+
+    This is function to add the metrics middleware, count the SQL
+    statements of every engine, and dump the metrics of the worker when
+    the workers share them.
+
+    Args:
+
+        app (FastAPI): FastAPI instance.
+    """
+    app.add_middleware(MetricsMiddleware)
+    app.add_event_handler('startup', metrics_dumper.start)
+    app.add_event_handler('shutdown', metrics_dumper.stop)
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
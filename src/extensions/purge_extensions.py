@@ -0,0 +1,16 @@
+from fastapi import FastAPI
+from src.infra.database.vault_purger import vault_purger
+
+
+def register_vault_purger(app: FastAPI) -> None:
+    """Register the vault purger
+
+    This is function start the purge of the deleted vaults with the worker,
+    and stop it on shutdown.
+
+    Args:
+
+        app (FastAPI): FastAPI instance.
+    """
+    app.add_event_handler('startup', vault_purger.start)
+    app.add_event_handler('shutdown', vault_purger.stop)
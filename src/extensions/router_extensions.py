@@ -1,6 +1,6 @@
 from fastapi import FastAPI
 # Routers
-from src.apps.v1.routes import auth_route, users_route, vaults_route, accounts_route
+from src.apps.v1.routes import auth_route, users_route, vaults_route, accounts_route, export_route, internal_route
 
 
 def register_api_routers(app: FastAPI, prefix_url: str) -> None:
@@ -24,3 +24,10 @@ def register_api_routers(app: FastAPI, prefix_url: str) -> None:
 
     app.include_router(
         accounts_route.router, prefix=f'{prefix_url}/accounts', tags=['Accounts'])
+
+    app.include_router(
+        export_route.router, prefix=f'{prefix_url}/export', tags=['Export'])
+
+    app.include_router(
+        internal_route.router, prefix=f'{prefix_url}/internal', tags=['Internal'],
+        include_in_schema=False)
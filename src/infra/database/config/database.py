@@ -1,24 +1,146 @@
-from sqlalchemy import create_engine
+from typing import List
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from src.core.settings import Settings
+from src.infra.database.config.pool import MeteredQueuePool, MeteredAsyncAdaptedQueuePool
+from src.infra.database.config.routing import ReplicaSet, RoutingSession
 
 settings = Settings()
 
-SQLALCHEMY_DATABASE_URL = f'postgresql://{settings.db_user}:{settings.db_pass}@{settings.db_host}:{settings.db_port}/{settings.db_name}'
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL,)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def async_url(url: str) -> str:
+    """The url of the async driver of a database url."""
+    return url.replace('postgresql://', 'postgresql+asyncpg://', 1).replace('sqlite://', 'sqlite+aiosqlite://', 1)
+
+
+SQLALCHEMY_DATABASE_URL = settings.database_url or f'postgresql://{settings.db_user}:{settings.db_pass}@{settings.db_host}:{settings.db_port}/{settings.db_name}'
+SQLALCHEMY_ASYNC_DATABASE_URL = async_url(SQLALCHEMY_DATABASE_URL)
+REPLICA_DATABASE_URLS = [
+    url.strip() for url in (settings.database_replica_urls or '').split(',') if url.strip()]
+SHARD_DATABASE_URLS = [
+    url.strip() for url in (settings.database_shard_urls or '').split(',') if url.strip()]
+# The sessions of these requests read from the replicas
+READ_METHODS = ('GET', 'HEAD')
+
+if SQLALCHEMY_DATABASE_URL.startswith('sqlite'):
+    # Local stand-in, the connections are used from the threadpool
+    CONNECT_ARGS = ASYNC_CONNECT_ARGS = {'check_same_thread': False}
+else:
+    CONNECT_ARGS = {'options': f'-c statement_timeout={settings.db_statement_timeout}'}
+    ASYNC_CONNECT_ARGS = {'server_settings': {'statement_timeout': str(settings.db_statement_timeout)}}
+
+POOL_OPTIONS = {
+    'pool_size': settings.db_pool_size,
+    'max_overflow': settings.db_max_overflow,
+    'pool_timeout': settings.db_pool_timeout,
+    'pool_recycle': settings.db_pool_recycle,
+    'pool_pre_ping': settings.db_pool_pre_ping,
+}
+
+# The objects returned by the repositories are used after the commit, they must not expire
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    poolclass=MeteredQueuePool,
+    pool_logging_name='sync',
+    connect_args=CONNECT_ARGS,
+    **POOL_OPTIONS,
+)
+replica_engines = [
+    create_engine(
+        url,
+        poolclass=MeteredQueuePool,
+        pool_logging_name=f'sync-replica-{number}',
+        connect_args=CONNECT_ARGS,
+        **POOL_OPTIONS,
+    )
+    for number, url in enumerate(REPLICA_DATABASE_URLS)
+]
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine, class_=RoutingSession,
+    replicas=ReplicaSet(replica_engines, settings.db_replica_retry_interval) if replica_engines else None)
+
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL,
+    poolclass=MeteredAsyncAdaptedQueuePool,
+    pool_logging_name='async',
+    connect_args=ASYNC_CONNECT_ARGS,
+    **POOL_OPTIONS,
+)
+async_replica_engines = [
+    create_async_engine(
+        async_url(url),
+        poolclass=MeteredAsyncAdaptedQueuePool,
+        pool_logging_name=f'async-replica-{number}',
+        connect_args=ASYNC_CONNECT_ARGS,
+        **POOL_OPTIONS,
+    )
+    for number, url in enumerate(REPLICA_DATABASE_URLS)
+]
+# The async sessions route with the sync engines of the async engines
+AsyncSessionLocal = async_sessionmaker(
+    autoflush=False, expire_on_commit=False, bind=async_engine, sync_session_class=RoutingSession,
+    replicas=ReplicaSet([replica.sync_engine for replica in async_replica_engines],
+                        settings.db_replica_retry_interval) if async_replica_engines else None)
+
+shard_engines = [
+    create_engine(
+        url,
+        poolclass=MeteredQueuePool,
+        pool_logging_name=f'sync-shard-{number}',
+        connect_args=CONNECT_ARGS,
+        **POOL_OPTIONS,
+    )
+    for number, url in enumerate(SHARD_DATABASE_URLS)
+]
+async_shard_engines = [
+    create_async_engine(
+        async_url(url),
+        poolclass=MeteredAsyncAdaptedQueuePool,
+        pool_logging_name=f'async-shard-{number}',
+        connect_args=ASYNC_CONNECT_ARGS,
+        **POOL_OPTIONS,
+    )
+    for number, url in enumerate(SHARD_DATABASE_URLS)
+]
+# The sessions by shard, without shards the main database is the only one
+ShardSessionLocal = [
+    sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=shard_engine,
+                 class_=RoutingSession)
+    for shard_engine in shard_engines
+] or [SessionLocal]
+AsyncShardSessionLocal = [
+    async_sessionmaker(autoflush=False, expire_on_commit=False, bind=shard_engine,
+                       sync_session_class=RoutingSession)
+    for shard_engine in async_shard_engines
+] or [AsyncSessionLocal]
 
 # Declarative base return a class, later we will inherit from this class to create each of the database models
 Base = declarative_base()
 
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def sync_engines() -> List[Engine]:
+    """The engines of the process, the async ones by their sync engine."""
+    return [
+        engine,
+        *replica_engines,
+        async_engine.sync_engine,
+        *(replica.sync_engine for replica in async_replica_engines),
+        *shard_engines,
+        *(shard_engine.sync_engine for shard_engine in async_shard_engines),
+    ]
+
+
+def _enable_foreign_keys(dbapi_connection, connection_record) -> None:
+    # SQLite enforces the foreign keys and their ON DELETE CASCADE by connection
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+
+for sync_engine in sync_engines():
+    if sync_engine.dialect.name == 'sqlite':
+        event.listen(sync_engine, 'connect', _enable_foreign_keys)
@@ -0,0 +1,61 @@
+from typing import Any, Dict, List
+from sqlalchemy import PrimaryKeyConstraint, Table, event
+from sqlalchemy.ext.compiler import compiles
+from src.core.settings import Settings
+
+settings = Settings()
+
+
+def hash_partitioned(column: str) -> Dict[str, Any]:
+    """Hash partitioned
+
+    This is function return the table arguments of a table partitioned by a
+    hash of the column on Postgres, the other databases keep a single table.
+    The queries of the table filter by the column, Postgres scans only the
+    partition of the value and its smaller indexes.
+
+    Args:
+
+        column (str): The partition key.
+
+    Returns:
+
+        Dict[str, Any]: The table arguments.
+    """
+    return {'postgresql_partition_by': f'HASH ({column})', 'info': {'partition_key': column}}
+
+
+def partition_names(table_name: str, partitions: int) -> List[str]:
+    return [f'{table_name}_p{remainder}' for remainder in range(partitions)]
+
+
+def create_partitions_ddl(table_name: str, partitions: int, parent: str | None = None) -> List[str]:
+    """The statements that create the partitions of a table, attached to the parent table."""
+    return [
+        f'CREATE TABLE {name} PARTITION OF {parent or table_name} '
+        f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})'
+        for remainder, name in enumerate(partition_names(table_name, partitions))
+    ]
+
+
+@compiles(PrimaryKeyConstraint, 'postgresql')
+def _compile_primary_key(constraint: PrimaryKeyConstraint, compiler: Any, **kw: Any) -> str:
+    # The unique keys of a partitioned table include the partition key, the
+    # mapper and the other databases keep the id alone
+    table = constraint.table
+    partition_key = table.info.get('partition_key') if isinstance(table, Table) else None
+    if partition_key is None or partition_key in constraint.columns:
+        return compiler.visit_primary_key_constraint(constraint, **kw)
+
+    columns = [*constraint.columns.keys(), partition_key]
+    name = f'CONSTRAINT {compiler.preparer.format_constraint(constraint)} ' if constraint.name else ''
+    return f'{name}PRIMARY KEY ({", ".join(compiler.preparer.quote(column) for column in columns)})'
+
+
+@event.listens_for(Table, 'after_create')
+def _create_partitions(table: Table, connection: Any, **kw: Any) -> None:
+    # The migrations create the partitions of the existing databases
+    if connection.dialect.name != 'postgresql' or 'partition_key' not in table.info:
+        return
+    for statement in create_partitions_ddl(table.name, settings.db_hash_partitions):
+        connection.exec_driver_sql(statement)
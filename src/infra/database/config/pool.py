@@ -0,0 +1,90 @@
+import time
+from typing import Any, Dict
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from src.core import metrics
+
+pool_checked_out = metrics.gauge(
+    'db_pool_checked_out', 'Connections in use.', ['pool'])
+pool_idle = metrics.gauge(
+    'db_pool_idle', 'Connections idle in the pool.', ['pool'])
+pool_overflow = metrics.gauge(
+    'db_pool_overflow', 'Connections open over the pool size.', ['pool'])
+pool_checkout_wait = metrics.histogram(
+    'db_pool_checkout_wait_seconds', 'Time to get a connection from the pool, pre-ping included.', ['pool'])
+pool_timeouts = metrics.counter(
+    'db_pool_timeouts_total', 'Checkouts that failed because the pool limit was reached.', ['pool'])
+
+# The metered pools of the process by name, a disposed engine replaces its pool
+pools: Dict[str, QueuePool] = {}
+
+
+class MeteredPoolMixin():
+    """Metered pool
+
+    Queue pool that records the checkout wait time and the timeouts, the
+    pool is named by the `pool_logging_name` of the engine.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        pools[self.logging_name] = self
+
+    def connect(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            pool_timeouts.inc(pool=self.logging_name)
+            raise
+        finally:
+            pool_checkout_wait.observe(
+                time.perf_counter() - start, pool=self.logging_name)
+
+
+class MeteredQueuePool(MeteredPoolMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncAdaptedQueuePool(MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_status(name: str, pool: QueuePool) -> Dict[str, Any]:
+    """Pool status
+
+    This is function return the current state of a pool.
+
+    Args:
+
+        name (str): The pool name.
+        pool (QueuePool): The pool.
+
+    Returns:
+
+        Dict[str, Any]: The pool size and limits, the connections by state
+        and the checkout wait times.
+    """
+    wait_count, wait_total = pool_checkout_wait.snapshot(pool=name)
+    return {
+        'size': pool.size(),
+        'max_overflow': pool._max_overflow,
+        'timeout': pool.timeout(),
+        'checked_out': pool.checkedout(),
+        'idle': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        'checkouts': wait_count,
+        'wait_seconds_total': wait_total,
+        'wait_seconds_mean': wait_total / wait_count if wait_count else 0.0,
+        'timeouts': pool_timeouts.value(pool=name),
+    }
+
+
+def collect() -> None:
+    for name, pool in pools.items():
+        pool_checked_out.set(pool.checkedout(), pool=name)
+        pool_idle.set(pool.checkedin(), pool=name)
+        pool_overflow.set(max(pool.overflow(), 0), pool=name)
+
+
+metrics.registry.add_collector(collect)
@@ -0,0 +1,108 @@
+import itertools
+import logging
+import time
+from typing import Any, Dict, List
+from sqlalchemy import Select, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from src.core import metrics
+
+logger = logging.getLogger(__name__)
+
+replica_down = metrics.counter(
+    'db_replica_down_total', 'Replicas marked unhealthy after a connection error.', ['replica'])
+replica_fallbacks = metrics.counter(
+    'db_replica_fallbacks_total', 'Read sessions sent to the primary because no replica was healthy.')
+
+
+class ReplicaSet():
+    """Replica set
+
+    The read replicas of the primary, chosen round robin. A replica is
+    probed before its first read, and a replica with a connection error is
+    skipped for the retry interval, then it is probed before it takes reads
+    again.
+    """
+
+    def __init__(self, engines: List[Engine], retry_interval: float) -> None:
+        self.engines = engines
+        self.retry_interval = retry_interval
+        # Due for a probe, the probe connection stays in the pool
+        self._down_until: Dict[Engine, float] = {engine: 0.0 for engine in engines}
+        self._next = itertools.count()
+        for engine in engines:
+            event.listen(engine, 'handle_error', self._handle_error)
+
+    def choose(self) -> Engine | None:
+        """Return the next healthy replica, None if there is not one."""
+        for _ in range(len(self.engines)):
+            engine = self.engines[next(self._next) % len(self.engines)]
+            if self.healthy(engine):
+                return engine
+        return None
+
+    def healthy(self, engine: Engine) -> bool:
+        down_until = self._down_until.get(engine)
+        if down_until is None:
+            return True
+        if time.monotonic() < down_until:
+            return False
+
+        try:
+            with engine.connect():
+                pass
+        except Exception:
+            self.mark_down(engine)
+            return False
+        self._down_until.pop(engine, None)
+        return True
+
+    def mark_down(self, engine: Engine) -> None:
+        if self._down_until.get(engine, 0) < time.monotonic():
+            replica_down.inc(replica=engine.pool.logging_name)
+            logger.warning('Replica %s is unhealthy, reading from the primary', engine.pool.logging_name)
+        self._down_until[engine] = time.monotonic() + self.retry_interval
+
+    def _handle_error(self, context: Any) -> None:
+        # Failed connects have no connection, the statement errors are not the replica health
+        if context.is_disconnect or context.connection is None:
+            self.mark_down(context.engine)
+
+
+def _is_read(clause: Any) -> bool:
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
+
+class RoutingSession(Session):
+    """Routing session
+
+    Session of the primary bind that sends the plain SELECTs of a read only
+    session to a replica, the session dependency marks the sessions of the
+    GET requests as read only. The writes go to the primary, and the session
+    stays on the primary after its first write to read its own writes. A
+    session reads from a single replica, its reads are consistent with each
+    other.
+    """
+
+    def __init__(self, *args: Any, replicas: ReplicaSet | None = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+        self.read_only = False
+        self.pinned = False
+        self._replica = None
+
+    def get_bind(self, mapper: Any = None, clause: Any = None, **kwargs: Any) -> Engine:
+        # A bind without a statement is asked for the dialect, it does not pin
+        if self._flushing or (clause is not None and not _is_read(clause)):
+            self.pinned = True
+
+        if self.pinned or not self.read_only or self.replicas is None:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+
+        if self._replica is None:
+            self._replica = self.replicas.choose()
+            if self._replica is None:
+                replica_fallbacks.inc()
+                self.pinned = True
+                return super().get_bind(mapper, clause=clause, **kwargs)
+        return self._replica
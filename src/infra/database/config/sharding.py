@@ -0,0 +1,196 @@
+import hashlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from fastapi import Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security.utils import get_authorization_scheme_param
+from jose import JWTError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from src.core.settings import Settings
+from src.core.ttl_cache import TTLCache
+from src.infra.database.config import database, invalidation_bus
+from src.infra.database.repositories.directory_repository import AsyncDirectoryRepository, DirectoryRepository
+from src.infra.providers import token_provider
+
+settings = Settings()
+
+
+class ShardMap():
+    """Shard map
+
+    The shard of every user is kept in the directory of the main database, a
+    new user is placed by a hash of its id and the resharding moves it. The
+    shards are cached by user id, a move publishes a user change event that
+    evicts the cached shard.
+    """
+
+    def __init__(self, shard_count: int, cache_size: int, cache_ttl: float) -> None:
+        self.shard_count = shard_count
+        self._shards = TTLCache(max_size=cache_size, ttl=cache_ttl)
+
+    def place(self, user_id: int) -> int:
+        """The shard of a new user, a stable hash of its id."""
+        digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'big') % self.shard_count
+
+    def get_shard(self, user_id: int) -> int:
+        """Get shard
+
+        This is function return the shard of a user, from the cache or from
+        the directory. A user not in the directory is on its hash placement.
+
+        Args:
+
+            user_id (int): User id.
+
+        Returns:
+
+            int: The shard number.
+        """
+        if self.shard_count == 1:
+            return 0
+
+        shard = self._shards.get(user_id)
+        if shard is None:
+            with database.SessionLocal() as session:
+                shard = DirectoryRepository(session).get_shard(user_id)
+            shard = self._remember(user_id, shard)
+        return shard
+
+    async def get_shard_async(self, user_id: int) -> int:
+        if self.shard_count == 1:
+            return 0
+        if not settings.db_async:
+            return await run_in_threadpool(self.get_shard, user_id)
+
+        shard = self._shards.get(user_id)
+        if shard is None:
+            async with database.AsyncSessionLocal() as session:
+                shard = await AsyncDirectoryRepository(session).get_shard(user_id)
+            shard = self._remember(user_id, shard)
+        return shard
+
+    def invalidate(self, user_id: int) -> None:
+        self._shards.invalidate(user_id)
+
+    def clear(self) -> None:
+        self._shards.clear()
+
+    def _remember(self, user_id: int, shard: int | None) -> int:
+        if shard is None:
+            return self.place(user_id)
+        self._shards.set(user_id, shard)
+        return shard
+
+
+shard_map = ShardMap(shard_count=len(database.ShardSessionLocal),
+                     cache_size=settings.shard_cache_size, cache_ttl=settings.shard_cache_ttl)
+
+
+def _evict_shard(event: invalidation_bus.ChangeEvent) -> None:
+    # A moved user is published as a user change
+    if event.kind == invalidation_bus.USER:
+        shard_map.invalidate(event.user_id)
+
+
+invalidation_bus.bus.subscribe(_evict_shard, shard_map.clear)
+
+
+def _token_user_id(request: Request) -> int | None:
+    # Only routes the session, the token is verified again by get_current_user
+    scheme, token = get_authorization_scheme_param(request.headers.get('Authorization'))
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        return token_provider.verify_token(token).user_id
+    except JWTError:
+        return None
+
+
+# Dependency
+def get_sync_db(request: Request):
+    """The session of the shard of the user of the token, the main database without a token."""
+    # Without shards the main database is the only one
+    user_id = _token_user_id(request) if shard_map.shard_count > 1 else None
+    shard = shard_map.get_shard(user_id) if user_id is not None else None
+    db = database.ShardSessionLocal[shard]() if shard is not None else database.SessionLocal()
+    db.info['shard'] = shard
+    db.read_only = request.method in database.READ_METHODS
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db(request: Request):
+    user_id = _token_user_id(request) if shard_map.shard_count > 1 else None
+    shard = await shard_map.get_shard_async(user_id) if user_id is not None else None
+    session_local = database.AsyncShardSessionLocal[shard] if shard is not None else database.AsyncSessionLocal
+    async with session_local() as db:
+        db.info['shard'] = shard
+        db.sync_session.read_only = request.method in database.READ_METHODS
+        yield db
+
+
+def get_sync_directory_db(request: Request, session: Session = Depends(get_sync_db)):
+    """The session of the user directory, the request session when it is of the main database."""
+    if shard_map.shard_count == 1 or session.info['shard'] is None:
+        yield session
+        return
+
+    db = database.SessionLocal()
+    db.read_only = request.method in database.READ_METHODS
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_directory_db(request: Request, session: AsyncSession = Depends(get_async_db)):
+    if shard_map.shard_count == 1 or session.info['shard'] is None:
+        yield session
+        return
+
+    async with database.AsyncSessionLocal() as db:
+        db.sync_session.read_only = request.method in database.READ_METHODS
+        yield db
+
+
+get_db = get_async_db if settings.db_async else get_sync_db
+get_directory_db = get_async_directory_db if settings.db_async else get_sync_directory_db
+
+
+@asynccontextmanager
+async def shard_session(shard: int, session: AsyncSession | Session) -> AsyncIterator[AsyncSession | Session]:
+    """Shard session
+
+    This is function yield the request session when it is of the shard, else
+    a new session of the shard of the same kind. The login and the signup
+    find the shard of the user after the request session is open.
+
+    Args:
+
+        shard (int): The shard number.
+        session (AsyncSession | Session): The request session.
+
+    Yields:
+
+        AsyncSession | Session: The session of the shard.
+    """
+    if shard_map.shard_count == 1 or session.info.get('shard') == shard:
+        yield session
+        return
+
+    if isinstance(session, AsyncSession):
+        async with database.AsyncShardSessionLocal[shard]() as db:
+            db.info['shard'] = shard
+            yield db
+        return
+
+    db = database.ShardSessionLocal[shard]()
+    db.info['shard'] = shard
+    try:
+        yield db
+    finally:
+        await run_in_threadpool(db.close)
@@ -1,4 +1,5 @@
 from .account_model import AccountModel
 from .card_model import CardModel
 from .vault_model import VaultModel
-from .user_model import UserModel
\ No newline at end of file
+from .user_model import UserModel
+from .user_directory_model import UserDirectoryModel
\ No newline at end of file
@@ -1,10 +1,25 @@
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, UniqueConstraint
 from sqlalchemy.orm import relationship
 from src.infra.database.config.database import Base
+from src.infra.database.config.partitioning import hash_partitioned
 
 
 class AccountModel(Base):
     __tablename__ = 'accounts'
+    # Names are unique by user, the indexes back the keyset pagination by id or by name
+    __table_args__ = (
+        UniqueConstraint('user_id', 'name', name='uq_accounts_user_id_name'),
+        Index('ix_accounts_user_id_id', 'user_id', 'id'),
+        Index('ix_accounts_user_id_name_id', 'user_id', 'name', 'id'),
+        # Trigram indexes of the account search, only on Postgres
+        *(
+            Index(f'ix_accounts_{field}_trgm', field, postgresql_using='gin',
+                  postgresql_ops={field: 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+            for field in ('name', 'username', 'email', 'page_url')
+        ),
+        # Partitioned by user on Postgres, the accounts are read by user
+        hash_partitioned('user_id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(length=40), index=True)
@@ -14,7 +29,7 @@ class AccountModel(Base):
     description = Column(String(length=240))
     page_url = Column(String(length=260))
     icon_type = Column(String(length=260))
-    vault_id = Column(Integer, ForeignKey(column='vaults.id', ondelete='CASCADE'))
+    vault_id = Column(Integer, ForeignKey(column='vaults.id', ondelete='CASCADE'), index=True)
     user_id = Column(Integer, ForeignKey(column='users.id'))
 
     user = relationship('UserModel', back_populates='accounts')
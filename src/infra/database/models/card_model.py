@@ -1,10 +1,13 @@
 from sqlalchemy import Column, ForeignKey, Integer, String
 from sqlalchemy.orm import relationship
 from src.infra.database.config.database import Base 
+from src.infra.database.config.partitioning import hash_partitioned
 
 
 class CardModel(Base):
     __tablename__ = 'cards'
+    # Partitioned by user on Postgres, the cards are read by user
+    __table_args__ = hash_partitioned('user_id')
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(length=40), index=True)
@@ -15,7 +18,7 @@ class CardModel(Base):
     expiration = Column(String(length=10))
     pin = Column(String(length=10))
     description = Column(String(length=240))
-    vault_id = Column(Integer, ForeignKey(column='vaults.id', ondelete='CASCADE'))
+    vault_id = Column(Integer, ForeignKey(column='vaults.id', ondelete='CASCADE'), index=True)
     user_id=Column(Integer, ForeignKey(column='users.id'))
     
     user = relationship('UserModel', back_populates='cards')
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, UniqueConstraint
+
+from src.infra.database.config.database import Base
+
+
+class UserDirectoryModel(Base):
+    __tablename__ = 'user_directory'
+    # Global directory of the users in the main database, the ids of the users
+    # of every shard are allocated here and the login looks up the names here.
+    # A user inserted without an entry can not log in and its id may be given
+    # to another user, `resharding register-users` adds the missing entries
+    __table_args__ = (
+        UniqueConstraint('email', name='uq_user_directory_email'),
+        UniqueConstraint('username', name='uq_user_directory_username'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    # Nullable as in the users table, the signup always sets both
+    email = Column(String(length=50))
+    username = Column(String(length=40))
+    # The shard of the user, set by the hash placement on signup and by the resharding
+    shard = Column(Integer, nullable=False, default=0, server_default='0')
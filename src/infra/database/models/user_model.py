@@ -13,6 +13,10 @@ class UserModel(Base):
     password = Column(String(length=64))
     secret_key = Column(String(length=260), index=True)
     profile_url = Column(String(length=260))
+    # Bumped on every update, the access tokens of an older version are rejected
+    token_version = Column(Integer, nullable=False, default=0, server_default='0')
+    # Bumped on every write of the vaults or accounts, the lists ETag is derived from it
+    collection_version = Column(Integer, nullable=False, default=0, server_default='0')
 
     vaults = relationship(
         'VaultModel',
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Boolean, Column, Index, Integer, String, ForeignKey, UniqueConstraint, false, text
 from sqlalchemy.orm import relationship, backref
 
 from src.infra.database.config.database import Base
@@ -6,12 +6,22 @@ from src.infra.database.config.database import Base
 
 class VaultModel(Base):
     __tablename__ = 'vaults'
+    # Names are unique by user, the indexes back the keyset pagination by id or by name
+    __table_args__ = (
+        UniqueConstraint('user_id', 'name', name='uq_vaults_user_id_name'),
+        Index('ix_vaults_user_id_id', 'user_id', 'id'),
+        Index('ix_vaults_user_id_name_id', 'user_id', 'name', 'id'),
+        # The queue of the vault purger
+        Index('ix_vaults_deleted_id', 'id', postgresql_where=text('deleted'), sqlite_where=text('deleted')),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(length=40), index=True)
     description = Column(String(length=240))
     icon_type = Column(String(length=260))
     user_id = Column(Integer, ForeignKey(column='users.id', ondelete='CASCADE'))
+    # Set on the delete of a large vault, it is hidden until its items are purged
+    deleted = Column(Boolean, nullable=False, default=False, server_default=false())
 
     # Is the referencing a collection of items represented by the child.
     user = relationship('UserModel', back_populates='vaults')
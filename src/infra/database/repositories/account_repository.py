@@ -1,42 +1,223 @@
-from typing import List
-from sqlalchemy import or_, and_, select
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Set, Tuple
+from sqlalchemy import or_, and_, func, select, insert, update, delete, bindparam, literal, Row
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from src.infra.database.config import invalidation_bus
+from src.infra.database.config.invalidation_bus import ChangeEvent
+from src.infra.database.repositories.base_repository import AsyncRepository, is_unique_violation, write_transaction
+from src.infra.database.repositories.user_repository import UserRepository
 from src.infra.database.models.user_model import UserModel
 from src.infra.database.models.account_model import AccountModel
+from src.infra.database.models.vault_model import VaultModel
 from src.infra.schemas import account_schema
+from src.utils import pagination_utils, search_utils
+
+
+def _user_accounts(user_id: int) -> Any:
+    # The accounts of the vaults waiting for the purge are gone for the user
+    return and_(AccountModel.user_id == user_id, AccountModel.vault_id.not_in(
+        select(VaultModel.id).where(VaultModel.user_id == user_id, VaultModel.deleted)))
 
 
 class AccountRepository():
     def __init__(self, session: Session) -> None:
         self.session = session
 
-    def create_account(self, account: account_schema.AccountCreate) -> AccountModel:
-        account_db = AccountModel(
-            name=account.name,
-            username=account.username,
-            email=account.email,
-            password=account.password,
-            description=account.description,
-            icon_type=account.icon_type,
-            page_url=account.page_url,
-            vault_id=account.vault_id,
-            user_id=account.user_id,
+    def create_account(self, account: account_schema.AccountCreate) -> AccountModel | None:
+        """Create an account
+
+        This is repository function insert the account in a single round
+        trip, the vault is verified by selecting the values from the vaults
+        of the user, and the account name by the unique constraint.
+
+        Args:
+
+            account (AccountCreate): The account, with the encrypted password.
+
+        Raises:
+
+            DuplicateError: If the account name already exists.
+
+        Returns:
+
+            AccountModel | None: The new account, None if the vault is not found.
+        """
+        fields = account.dict(exclude={'vault_id', 'user_id'})
+        values = select(
+            *(literal(value, getattr(AccountModel, field).type) for field, value in fields.items()),
+            VaultModel.id,
+            VaultModel.user_id,
+        ).where(
+            and_(
+                VaultModel.id == account.vault_id,
+                VaultModel.user_id == account.user_id,
+                ~VaultModel.deleted,
+            )
         )
-        self.session.add(account_db)
-        self.session.commit()
-        self.session.refresh(account_db)
+        statement = insert(AccountModel).from_select(
+            [*fields, 'vault_id', 'user_id'], values).returning(AccountModel)
+
+        with write_transaction(self.session):
+            account_db = self.session.scalars(statement).first()
+            if account_db:
+                UserRepository(self.session).bump_collection_version(account_db.user_id)
+                invalidation_bus.publish(
+                    self.session, account_db.user_id, invalidation_bus.ACCOUNT, account_db.id)
         return account_db
 
-    def get_accounts(self, user_id: int) -> List[account_schema.AccountOut]:
-        statement = select(AccountModel).join_from(
-            AccountModel, UserModel).where(AccountModel.user_id == user_id)
-        return self.session.execute(statement).scalars().all()
+    def create_accounts(self, accounts: List[account_schema.AccountCreate]) -> List[int]:
+        """Create many accounts
+
+        The accounts are inserted with a multi-row statement in a single
+        transaction, without loading them back in the session.
+
+        Args:
+
+            accounts (List[AccountCreate]): The accounts, with the encrypted passwords.
+
+        Raises:
+
+            DuplicateError: If an account name already exists.
+
+        Returns:
+
+            List[int]: The ids of the new accounts, in the same order.
+        """
+        statement = insert(AccountModel).returning(
+            AccountModel.id, sort_by_parameter_order=True)
+        with write_transaction(self.session):
+            account_ids = self.session.scalars(
+                statement, [account.dict() for account in accounts]).all()
+            for user_id in {account.user_id for account in accounts}:
+                UserRepository(self.session).bump_collection_version(user_id)
+                invalidation_bus.publish(self.session, user_id, invalidation_bus.ACCOUNT)
+        return account_ids
+
+    def get_accounts(self, user_id: int, fields: List[str], sort: str = 'id',
+                     after: Tuple[Any, int] | None = None, limit: int | None = None) -> List[Row]:
+        """Get a page of accounts
+
+        This is repository function select only the requested fields of the
+        user accounts, in keyset pagination order.
+
+        Args:
+
+            user_id (int): User id.
+            fields (List[str]): Account columns to select.
+            sort (str): Sort key, prefixed with - for descending order.
+            after (Tuple[Any, int] | None): Position of the last row returned.
+            limit (int | None): Max number of rows.
+
+        Returns:
+
+            List[Row]: The account rows.
+        """
+        sort_field, descending = pagination_utils.parse_sort(sort)
+        statement = select(
+            *(getattr(AccountModel, field) for field in fields)
+        ).where(_user_accounts(user_id))
+        statement = pagination_utils.keyset_page(
+            statement, getattr(AccountModel, sort_field), AccountModel.id,
+            descending, after, limit)
+        return self.session.execute(statement).all()
+
+    def stream_accounts(self, user_id: int, batch_size: int) -> Iterator[List[AccountModel]]:
+        statement = select(AccountModel).where(
+            _user_accounts(user_id)).order_by(AccountModel.id)
+        return self.session.scalars(
+            statement.execution_options(yield_per=batch_size)).partitions()
+
+    def search_accounts(self, user_id: int, query: str, limit: int) -> List[AccountModel]:
+        """Search accounts
+
+        This is repository function rank the user accounts whose name,
+        username, email or page url are similar to the query. Postgres
+        matches with the pg_trgm indexes, the other databases with the
+        in-process n-gram index of the user.
+
+        Args:
+
+            user_id (int): User id.
+            query (str): The search text.
+            limit (int): Max number of accounts.
+
+        Returns:
+
+            List[AccountModel]: The matching accounts, best first.
+        """
+        if self.session.get_bind().dialect.name == 'postgresql':
+            return self._search_accounts_trigram(user_id, query, limit)
+        return self._search_accounts_ngram(user_id, query, limit)
+
+    def _search_accounts_trigram(self, user_id: int, query: str, limit: int) -> List[AccountModel]:
+        columns = [getattr(AccountModel, field) for field in search_utils.SEARCH_FIELDS]
+        score = func.greatest(*(func.word_similarity(query, column) for column in columns))
+
+        # `column %> query` is the indexed form of word_similarity(query, column) >= threshold
+        statement = select(AccountModel).where(
+            _user_accounts(user_id),
+            or_(*(column.op('%>')(query) for column in columns)),
+        ).order_by(score.desc(), AccountModel.id).limit(limit)
+        return self.session.scalars(statement).all()
+
+    def _search_accounts_ngram(self, user_id: int, query: str, limit: int) -> List[AccountModel]:
+        # The version is read first, an index built from newer rows is only rebuilt once more
+        collection_version = UserRepository(self.session).get_collection_version(user_id)
+        index = search_utils.search_index_cache.get(user_id, collection_version)
+        if index is None:
+            statement = select(
+                AccountModel.id,
+                *(getattr(AccountModel, field) for field in search_utils.SEARCH_FIELDS)
+            ).where(_user_accounts(user_id)).order_by(AccountModel.id)
+            index = search_utils.NgramIndex(self.session.execute(statement))
+            search_utils.search_index_cache.set(user_id, collection_version, index)
+
+        ranking = index.search(query, limit)
+        if not ranking:
+            return []
+
+        statement = select(AccountModel).where(
+            _user_accounts(user_id),
+            AccountModel.id.in_([account_id for account_id, _ in ranking]),
+        )
+        accounts_db = {account.id: account for account in self.session.scalars(statement)}
+        return [accounts_db[account_id] for account_id, _ in ranking if account_id in accounts_db]
+
+    def get_account_passwords(self, account_ids: Iterable[int], user_id: int) -> List[Row]:
+        """Get the account passwords
+
+        This is repository function select only the id and the encrypted
+        password of the requested user accounts.
+
+        Args:
+
+            account_ids (Iterable[int]): Account ids.
+            user_id (int): User id.
+
+        Returns:
+
+            List[Row]: The rows of the accounts found, ordered by id.
+        """
+        statement = select(AccountModel.id, AccountModel.password).where(
+            _user_accounts(user_id),
+            AccountModel.id.in_(list(account_ids)),
+        ).order_by(AccountModel.id)
+        return self.session.execute(statement).all()
+
+    def get_account_names(self, account_names: Iterable[str], user_id: int) -> Set[str]:
+        statement = select(AccountModel.name).where(
+            and_(
+                AccountModel.user_id == user_id,
+                AccountModel.name.in_(account_names),
+            )
+        )
+        return set(self.session.scalars(statement))
 
     def get_account_by_name(self,  account_name: str, user_id: int) -> AccountModel:
         return self.session.query(AccountModel).filter(
             and_(
                 AccountModel.name == account_name,
-                AccountModel.user_id == user_id
+                _user_accounts(user_id)
             )
         ).first()
 
@@ -44,29 +225,194 @@ class AccountRepository():
         return self.session.query(AccountModel).filter(
             and_(
                 AccountModel.id == account_id,
-                AccountModel.user_id == user_id
+                _user_accounts(user_id)
             )
         ).first()
 
-    def update_account(self, user_id: int, account_id: id, update_data: account_schema.AccountCreate) -> AccountModel:
-        account_db = self.get_account_by_id(account_id, user_id)
+    def update_account(self, user_id: int, account_id: id, update_data: account_schema.AccountCreate) -> AccountModel | None:
+        """Update an account
 
-        account_db.name = update_data.name
-        account_db.username = update_data.username
-        account_db.email = update_data.email
-        account_db.password = update_data.password
-        account_db.description = update_data.description
-        account_db.page_url = update_data.page_url
-        account_db.icon_type = update_data.icon_type
+        This is repository function update the account in a single round
+        trip, the account name is verified by the unique constraint.
 
-        self.session.add(account_db)
-        self.session.commit()
-        self.session.refresh(account_db)
+        Args:
+
+            user_id (int): User id.
+            account_id (int): Account id.
+            update_data (AccountCreate): The new data, with the encrypted password.
+
+        Raises:
+
+            DuplicateError: If the account name already exists.
+
+        Returns:
+
+            AccountModel | None: The account, None if it is not found.
+        """
+        statement = update(AccountModel).where(
+            and_(
+                AccountModel.id == account_id,
+                _user_accounts(user_id),
+            )
+        ).values(
+            **update_data.dict(exclude={'vault_id', 'user_id'})
+        ).returning(AccountModel)
+
+        with write_transaction(self.session):
+            account_db = self.session.scalars(statement).first()
+            if account_db:
+                UserRepository(self.session).bump_collection_version(account_db.user_id)
+                invalidation_bus.publish(
+                    self.session, account_db.user_id, invalidation_bus.ACCOUNT, account_db.id)
         return account_db
 
+    def update_passwords(self, user_id: int, passwords: Dict[int, str]) -> None:
+        """Update the encrypted passwords of many accounts
+
+        The update runs on the session connection, routed to the primary, and
+        is committed at once. The session objects do not expire on commit, so
+        the accounts already loaded are still usable.
+
+        Args:
+
+            user_id (int): User id.
+            passwords (Dict[int, str]): Encrypted password by account id.
+        """
+        statement = update(AccountModel.__table__).where(
+            and_(
+                AccountModel.id == bindparam('account_id'),
+                AccountModel.user_id == user_id,
+            )
+        ).values(password=bindparam('account_password'))
+
+        with write_transaction(self.session):
+            self.session.execute(statement, [
+                {'account_id': account_id, 'account_password': password}
+                for account_id, password in passwords.items()
+            ])
+
+    def batch_accounts(self, user_id: int,
+                       operations: List[account_schema.AccountBatchOperation]) -> List[Set[int] | None]:
+        """Apply a batch of operations to the accounts
+
+        This is repository function run every operation as a single set based
+        statement on the accounts of the user, in order and in one
+        transaction. A move is skipped when the vault is not of the user, and
+        an update when the new name is of another account. A rename runs in a
+        savepoint, a name taken by a concurrent write only skips its update.
+        A single account is renamed by operation, see AccountBatchOperation.
+
+        Args:
+
+            user_id (int): User id.
+            operations (List[AccountBatchOperation]): The operations, with the encrypted passwords.
+
+        Returns:
+
+            List[Set[int] | None]: The ids changed by every operation, None if it was skipped.
+        """
+        accounts = AccountModel.__table__
+        outcomes = []
+        with write_transaction(self.session):
+            for operation in operations:
+                user_accounts = and_(AccountModel.id.in_(operation.ids), _user_accounts(user_id))
+                if operation.op == 'delete':
+                    statement = delete(accounts).where(user_accounts)
+                elif operation.op == 'move':
+                    vault_found = self.session.scalar(select(VaultModel.id).where(
+                        VaultModel.id == operation.vault_id, VaultModel.user_id == user_id, ~VaultModel.deleted))
+                    if not vault_found:
+                        outcomes.append(None)
+                        continue
+                    statement = update(accounts).where(user_accounts).values(vault_id=operation.vault_id)
+                else:
+                    values = operation.values.dict(exclude_unset=True)
+                    if 'name' in values and self.session.scalar(select(AccountModel.id).where(
+                            AccountModel.user_id == user_id,
+                            AccountModel.name == values['name'],
+                            AccountModel.id.not_in(operation.ids))):
+                        outcomes.append(None)
+                        continue
+                    statement = update(accounts).where(user_accounts).values(**values)
+                    if 'name' in values:
+                        try:
+                            with self.session.begin_nested():
+                                outcomes.append(set(self.session.scalars(statement.returning(AccountModel.id))))
+                        except IntegrityError as error:
+                            if not is_unique_violation(error):
+                                raise
+                            outcomes.append(None)
+                        continue
+                outcomes.append(set(self.session.scalars(statement.returning(AccountModel.id))))
+
+            if any(outcomes):
+                UserRepository(self.session).bump_collection_version(user_id)
+                invalidation_bus.publish(self.session, user_id, invalidation_bus.ACCOUNT)
+        return outcomes
+
     def delete_account(self, account_id: int, user_id: int) -> AccountModel:
         account_db = self.get_account_by_id(account_id, user_id)
 
         self.session.delete(account_db)
+        UserRepository(self.session).bump_collection_version(user_id)
+        invalidation_bus.publish(self.session, user_id, invalidation_bus.ACCOUNT, account_id)
         self.session.commit()
         return account_db
+
+
+class AsyncAccountRepository(AsyncRepository):
+    repository_class = AccountRepository
+
+    async def create_account(self, account: account_schema.AccountCreate) -> AccountModel | None:
+        account_db = await self.run(AccountRepository.create_account, account)
+        await invalidation_bus.bus.evict(ChangeEvent(
+            account.user_id, invalidation_bus.ACCOUNT, account_db.id if account_db else None))
+        return account_db
+
+    async def create_accounts(self, accounts: List[account_schema.AccountCreate]) -> List[int]:
+        account_ids = await self.run(AccountRepository.create_accounts, accounts)
+        for user_id in {account.user_id for account in accounts}:
+            await invalidation_bus.bus.evict(ChangeEvent(user_id, invalidation_bus.ACCOUNT))
+        return account_ids
+
+    async def get_accounts(self, user_id: int, fields: List[str], sort: str = 'id',
+                           after: Tuple[Any, int] | None = None, limit: int | None = None) -> List[Row]:
+        return await self.run(AccountRepository.get_accounts, user_id, fields, sort, after, limit)
+
+    def stream_accounts(self, user_id: int, batch_size: int) -> AsyncIterator[List[AccountModel]]:
+        return self.stream(AccountRepository.stream_accounts, user_id, batch_size)
+
+    async def search_accounts(self, user_id: int, query: str, limit: int) -> List[AccountModel]:
+        return await self.run(AccountRepository.search_accounts, user_id, query, limit)
+
+    async def get_account_passwords(self, account_ids: Iterable[int], user_id: int) -> List[Row]:
+        return await self.run(AccountRepository.get_account_passwords, account_ids, user_id)
+
+    async def get_account_names(self, account_names: Iterable[str], user_id: int) -> Set[str]:
+        return await self.run(AccountRepository.get_account_names, account_names, user_id)
+
+    async def get_account_by_name(self, account_name: str, user_id: int) -> AccountModel:
+        return await self.run(AccountRepository.get_account_by_name, account_name, user_id)
+
+    async def get_account_by_id(self, account_id: int, user_id: int) -> AccountModel:
+        return await self.run(AccountRepository.get_account_by_id, account_id, user_id)
+
+    async def batch_accounts(self, user_id: int,
+                             operations: List[account_schema.AccountBatchOperation]) -> List[Set[int] | None]:
+        outcomes = await self.run(AccountRepository.batch_accounts, user_id, operations)
+        if any(outcomes):
+            await invalidation_bus.bus.evict(ChangeEvent(user_id, invalidation_bus.ACCOUNT))
+        return outcomes
+
+    async def update_account(self, user_id: int, account_id: int, update_data: account_schema.AccountCreate) -> AccountModel | None:
+        account_db = await self.run(AccountRepository.update_account, user_id, account_id, update_data)
+        await invalidation_bus.bus.evict(ChangeEvent(user_id, invalidation_bus.ACCOUNT, account_id))
+        return account_db
+
+    async def update_passwords(self, user_id: int, passwords: Dict[int, str]) -> None:
+        return await self.run(AccountRepository.update_passwords, user_id, passwords)
+
+    async def delete_account(self, account_id: int, user_id: int) -> AccountModel:
+        account_db = await self.run(AccountRepository.delete_account, account_id, user_id)
+        await invalidation_bus.bus.evict(ChangeEvent(user_id, invalidation_bus.ACCOUNT, account_id))
+        return account_db
@@ -0,0 +1,106 @@
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Iterator, List
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+# SQLSTATE of the unique constraint violations
+UNIQUE_VIOLATION = '23505'
+
+
+class DuplicateError(Exception):
+    """Raised when a write violates a unique constraint."""
+
+
+def is_unique_violation(error: IntegrityError) -> bool:
+    # psycopg2 and asyncpg expose the SQLSTATE, sqlite only the message
+    return (getattr(error.orig, 'pgcode', None) == UNIQUE_VIOLATION
+            or 'UNIQUE constraint failed' in str(error.orig))
+
+
+@contextmanager
+def write_transaction(session: Session) -> Iterator[None]:
+    """Commit the writes of the block, or roll them back on error
+
+    A unique constraint violation is raised as DuplicateError, so the path
+    operations do not have to check the names before the write.
+
+    Args:
+
+        session (Session): The session of the repository.
+
+    Raises:
+
+        DuplicateError: If a write violates a unique constraint.
+    """
+    try:
+        yield
+        session.commit()
+    except IntegrityError as error:
+        session.rollback()
+        if is_unique_violation(error):
+            raise DuplicateError() from error
+        raise
+    except Exception:
+        session.rollback()
+        raise
+
+
+class AsyncRepository():
+    """Async repository
+
+    Base of the async repositories. The queries live in the sync repository
+    set in `repository_class`; with an AsyncSession they run on the session
+    greenlet through `run_sync`, so the database round trip never blocks the
+    event loop. With a sync Session (DB_ASYNC=false) they run in the
+    threadpool, which is how the sync path operations behaved.
+    """
+    repository_class = None
+
+    def __init__(self, session: AsyncSession | Session) -> None:
+        self.session = session
+
+    async def run(self, method: Callable, *args, **kwargs) -> Any:
+        """Run a method of the sync repository
+
+        Args:
+
+            method (Callable): Unbound method of the sync repository.
+
+        Returns:
+
+            Any: The method result.
+        """
+        def call(session: Session) -> Any:
+            return method(self.repository_class(session), *args, **kwargs)
+
+        return await self._run_sync(call)
+
+    async def stream(self, method: Callable, *args, **kwargs) -> AsyncIterator[List[Any]]:
+        """Stream the batches of a method of the sync repository
+
+        The method returns an iterator of batches over a server side cursor,
+        every batch is fetched the same way as `run`, so only one batch is in
+        memory at a time.
+
+        Args:
+
+            method (Callable): Unbound method of the sync repository.
+
+        Yields:
+
+            List[Any]: The next batch.
+        """
+        batches: Iterator[List[Any]] = await self.run(method, *args, **kwargs)
+        while True:
+            batch = await self._run_sync(lambda _: next(batches, None))
+            if batch is None:
+                return
+            yield batch
+
+    async def _run_sync(self, call: Callable[[Session], Any]) -> Any:
+        if isinstance(self.session, AsyncSession):
+            return await self.session.run_sync(call)
+
+        return await run_in_threadpool(call, self.session)
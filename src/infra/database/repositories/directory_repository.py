@@ -0,0 +1,102 @@
+from typing import Callable, List
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.orm import Session
+from src.infra.database.models.user_directory_model import UserDirectoryModel
+from src.infra.database.repositories.base_repository import AsyncRepository, write_transaction
+
+
+class DirectoryRepository():
+    def __init__(self, session: Session) -> None:
+        self.session = session
+
+    def get_user_id(self, user_email: str) -> int | None:
+        """Get the user id by email or username
+
+        This is repository function search a user of any shard by email or
+        username.
+
+        Args:
+
+            user_email (str): User email or username.
+
+        Returns:
+
+            int | None: The user id, None if it is not found.
+        """
+        statement = select(UserDirectoryModel.id).where(
+            or_(
+                UserDirectoryModel.email == user_email,
+                UserDirectoryModel.username == user_email,
+            )
+        ).limit(1)
+        return self.session.scalar(statement)
+
+    def get_shard(self, user_id: int) -> int | None:
+        statement = select(UserDirectoryModel.shard).where(UserDirectoryModel.id == user_id)
+        return self.session.scalar(statement)
+
+    def get_entries(self) -> List[UserDirectoryModel]:
+        return self.session.scalars(select(UserDirectoryModel).order_by(UserDirectoryModel.id)).all()
+
+    def create_entry(self, email: str, username: str, place: Callable[[int], int]) -> UserDirectoryModel:
+        """Create a directory entry
+
+        This is repository function reserve the id and the names of a new
+        user, the unique constraints settle the concurrent signups. The shard
+        is placed from the allocated id.
+
+        Args:
+
+            email (str): User email.
+            username (str): User name.
+            place (Callable[[int], int]): The shard of a user id.
+
+        Raises:
+
+            DuplicateError: If the email or the username is already registered.
+
+        Returns:
+
+            UserDirectoryModel: The entry, with the user id and its shard.
+        """
+        entry = UserDirectoryModel(email=email, username=username)
+        with write_transaction(self.session):
+            self.session.add(entry)
+            self.session.flush()
+            entry.shard = place(entry.id)
+        return entry
+
+    def update_entry(self, user_id: int, email: str, username: str) -> None:
+        """Update the names of a user, DuplicateError if they are already registered."""
+        statement = update(UserDirectoryModel).where(UserDirectoryModel.id == user_id).values(
+            email=email, username=username)
+        with write_transaction(self.session):
+            self.session.execute(statement)
+
+    def set_shard(self, user_id: int, shard: int) -> None:
+        statement = update(UserDirectoryModel).where(UserDirectoryModel.id == user_id).values(shard=shard)
+        with write_transaction(self.session):
+            self.session.execute(statement)
+
+    def delete_entry(self, user_id: int) -> None:
+        with write_transaction(self.session):
+            self.session.execute(delete(UserDirectoryModel).where(UserDirectoryModel.id == user_id))
+
+
+class AsyncDirectoryRepository(AsyncRepository):
+    repository_class = DirectoryRepository
+
+    async def get_user_id(self, user_email: str) -> int | None:
+        return await self.run(DirectoryRepository.get_user_id, user_email)
+
+    async def get_shard(self, user_id: int) -> int | None:
+        return await self.run(DirectoryRepository.get_shard, user_id)
+
+    async def create_entry(self, email: str, username: str, place: Callable[[int], int]) -> UserDirectoryModel:
+        return await self.run(DirectoryRepository.create_entry, email, username, place)
+
+    async def update_entry(self, user_id: int, email: str, username: str) -> None:
+        return await self.run(DirectoryRepository.update_entry, user_id, email, username)
+
+    async def delete_entry(self, user_id: int) -> None:
+        return await self.run(DirectoryRepository.delete_entry, user_id)
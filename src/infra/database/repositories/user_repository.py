@@ -1,5 +1,10 @@
-from sqlalchemy import or_
+from typing import Any, Dict
+from sqlalchemy import or_, select, update
 from sqlalchemy.orm import Session
+from src.core.cache import response_cache
+from src.infra.database.config import invalidation_bus
+from src.infra.database.config.invalidation_bus import ChangeEvent
+from src.infra.database.repositories.base_repository import AsyncRepository, write_transaction
 from src.infra.database.models.user_model import UserModel
 from src.infra.schemas import user_schema
 
@@ -8,16 +13,35 @@ class UserRepository():
     def __init__(self, session: Session) -> None:
         self.session = session
 
-    def create_user(self, user: user_schema.UserLogin):
+    def create_user(self, user: user_schema.UserLogin, user_id: int | None = None):
+        """Create a user
+
+        This is repository function add a new user to its shard, with the id
+        allocated by the user directory.
+
+        Args:
+
+            user (user_schema.UserLogin): user information to add.
+            user_id (int | None): The user id of the directory.
+
+        Raises:
+
+            DuplicateError: If the email or the username is already registered.
+
+        Returns:
+
+            UserModel: usermodel information.
+        """
         user_bd = UserModel(
+            id=user_id,
             username=user.username,
             email=user.email,
             password=user.password,
             secret_key=user.secret_key,
             profile_url=user.profile_url,
         )
-        self.session.add(user_bd)
-        self.session.commit()
+        with write_transaction(self.session):
+            self.session.add(user_bd)
         self.session.refresh(user_bd)
         return user_bd
 
@@ -42,19 +66,63 @@ class UserRepository():
         ).first()
 
     def get_user_by_id(self, user_id: int) -> UserModel:
-        user_db = self.session.query(UserModel).filter(UserModel.id == user_id).first()
+        user_db = self.session.get(UserModel, user_id)
         return user_db
 
+    def get_user_profile(self, user_id: int) -> Dict[str, Any] | None:
+        """Get the user profile
+
+        This is repository function select only the public fields of the
+        user, the read model of GET /users/{id}.
+
+        Args:
+
+            user_id (int): User id.
+
+        Returns:
+
+            Dict[str, Any] | None: The user fields, None if it is not found.
+        """
+        statement = select(
+            *(getattr(UserModel, field) for field in user_schema.UserOut.__fields__)
+        ).where(UserModel.id == user_id)
+        user = self.session.execute(statement).first()
+        return user._asdict() if user else None
+
+    def get_collection_version(self, user_id: int) -> int | None:
+        statement = select(UserModel.collection_version).where(UserModel.id == user_id)
+        return self.session.scalar(statement)
+
+    def bump_collection_version(self, user_id: int) -> None:
+        """Bump the collection version
+
+        This is repository function mark the vaults and accounts of the user
+        as changed, it runs in the transaction of the write and is committed
+        with it.
+
+        Args:
+
+            user_id (int): User id.
+        """
+        statement = update(UserModel).where(UserModel.id == user_id).values(
+            collection_version=UserModel.collection_version + 1)
+        self.session.execute(statement)
+
     def update_user(self, user_id: int, update_data: user_schema.UserLogin) -> UserModel:
         """Update a user
 
-        This is repository function update the user by user data and id.
+        This is repository function update the user by user data and id, and
+        bump the token version to revoke the issued access tokens.
 
         Args:
 
             user_id (int): User id.
             update_data (user_schema.UserLogin): user information to update.
 
+        Raises:
+
+            DuplicateError: If the email or the username is already registered.
+
         Returns:
 
             UserModel: usermodel information.
@@ -65,9 +133,11 @@ class UserRepository():
         user_db.username = update_data.username
         user_db.password = update_data.password
         user_db.profile_url = update_data.profile_url
+        user_db.token_version = UserModel.token_version + 1
 
-        self.session.add(user_db)
-        self.session.commit()
+        with write_transaction(self.session):
+            self.session.add(user_db)
+            invalidation_bus.publish(self.session, user_id, invalidation_bus.USER, user_id)
         self.session.refresh(user_db)
         return user_db
 
@@ -88,5 +158,38 @@ class UserRepository():
         user_db = self.get_user_by_id(user_id)
 
         self.session.delete(user_db)
+        invalidation_bus.publish(self.session, user_id, invalidation_bus.USER, user_id)
         self.session.commit()
         return user_db
+
+
+class AsyncUserRepository(AsyncRepository):
+    repository_class = UserRepository
+
+    async def create_user(self, user: user_schema.UserLogin, user_id: int | None = None) -> UserModel:
+        return await self.run(UserRepository.create_user, user, user_id)
+
+    async def get_user(self, user_email: str) -> UserModel:
+        return await self.run(UserRepository.get_user, user_email)
+
+    async def get_user_by_id(self, user_id: int) -> UserModel:
+        return await self.run(UserRepository.get_user_by_id, user_id)
+
+    async def get_user_profile(self, user_id: int, token_version: int) -> Dict[str, Any] | None:
+        # Cached by token version, an update of the user bumps it
+        return await response_cache.get_or_load(
+            user_id, 'profile', (token_version,), lambda: self.run(UserRepository.get_user_profile, user_id))
+
+    async def get_collection_version(self, user_id: int) -> int | None:
+        # Not cached, a read racing a write could cache the old version again
+        return await self.run(UserRepository.get_collection_version, user_id)
+
+    async def update_user(self, user_id: int, update_data: user_schema.UserLogin) -> UserModel:
+        user_db = await self.run(UserRepository.update_user, user_id, update_data)
+        await invalidation_bus.bus.evict(ChangeEvent(user_id, invalidation_bus.USER, user_id))
+        return user_db
+
+    async def delete_user(self, user_id: int) -> UserModel:
+        user_db = await self.run(UserRepository.delete_user, user_id)
+        await invalidation_bus.bus.evict(ChangeEvent(user_id, invalidation_bus.USER, user_id))
+        return user_db
@@ -1,10 +1,36 @@
+import hashlib
+import json
 from operator import and_
-from typing import List
-from sqlalchemy import or_, and_, select
-from sqlalchemy.orm import Session
+from typing import Any, AsyncIterator, Dict, Iterator, List, Sequence, Tuple
+from sqlalchemy import or_, and_, func, select, insert, update, delete, Row
+from sqlalchemy.orm import Session, selectinload
+from src.core import cache
+from src.core.cache import response_cache
+from src.infra.database.config import invalidation_bus
+from src.infra.database.config.invalidation_bus import ChangeEvent
+from src.infra.database.repositories.base_repository import AsyncRepository, write_transaction
+from src.infra.database.repositories.user_repository import UserRepository
+from src.infra.database.models.account_model import AccountModel
+from src.infra.database.models.card_model import CardModel
 from src.infra.database.models.user_model import UserModel
 from src.infra.database.models.vault_model import VaultModel
 from src.infra.schemas import vault_schema
+from src.utils import pagination_utils
+
+
+def _include_options(include: Sequence[str]) -> List[Any]:
+    # A single SELECT ... WHERE vault_id IN (...) by relationship, not one by vault.
+    # The nested accounts are metadata only, their passwords are not read
+    return [
+        selectinload(VaultModel.accounts).defer(AccountModel.password) if relationship == 'accounts'
+        else selectinload(getattr(VaultModel, relationship))
+        for relationship in include
+    ]
+
+
+def _user_vaults(user_id: int) -> Any:
+    # The vaults marked as deleted wait for the purge of their items, they are gone for the user
+    return and_(VaultModel.user_id == user_id, ~VaultModel.deleted)
 
 
 class VaultRepository():
@@ -12,27 +38,125 @@ class VaultRepository():
         self.session = session
 
     def create_vault(self, vault: vault_schema.VaultBase) -> VaultModel:
-        vault_bd = VaultModel(
-            name=vault.name,
-            description=vault.description,
-            icon_type=vault.icon_type,
-            user_id=vault.user_id,
-        )
-        self.session.add(vault_bd)
-        self.session.commit()
-        self.session.refresh(vault_bd)
-        return vault_bd
+        """Create a vault
 
-    def get_vaults(self, user_id: int) -> List[vault_schema.VaultOut]:
-        statement = select(VaultModel).join_from(
-            VaultModel, UserModel).where(VaultModel.user_id == user_id)
-        return self.session.execute(statement).scalars().all()
+        This is repository function insert the vault in a single round trip,
+        the vault name is verified by the unique constraint.
 
-    def get_vault_by_id(self,  vault_id: str, user_id: int) -> VaultModel:
-        return self.session.query(VaultModel).filter(
+        Args:
+
+            vault (VaultBase): The vault.
+
+        Raises:
+
+            DuplicateError: If the vault name already exists.
+
+        Returns:
+
+            VaultModel: The new vault.
+        """
+        statement = insert(VaultModel).values(**vault.dict()).returning(VaultModel)
+
+        with write_transaction(self.session):
+            vault_db = self.session.scalars(statement).one()
+            UserRepository(self.session).bump_collection_version(vault_db.user_id)
+            invalidation_bus.publish(self.session, vault_db.user_id, invalidation_bus.VAULT, vault_db.id)
+        return vault_db
+
+    def get_vaults(self, user_id: int, fields: List[str], sort: str = 'id',
+                   after: Tuple[Any, int] | None = None, limit: int | None = None) -> List[Row]:
+        """Get a page of vaults
+
+        This is repository function select only the requested fields of the
+        user vaults, in keyset pagination order.
+
+        Args:
+
+            user_id (int): User id.
+            fields (List[str]): Vault columns to select.
+            sort (str): Sort key, prefixed with - for descending order.
+            after (Tuple[Any, int] | None): Position of the last row returned.
+            limit (int | None): Max number of rows.
+
+        Returns:
+
+            List[Row]: The vault rows.
+        """
+        sort_field, descending = pagination_utils.parse_sort(sort)
+        statement = select(
+            *(getattr(VaultModel, field) for field in fields)
+        ).where(_user_vaults(user_id))
+        statement = pagination_utils.keyset_page(
+            statement, getattr(VaultModel, sort_field), VaultModel.id,
+            descending, after, limit)
+        return self.session.execute(statement).all()
+
+    def get_vault_trees(self, user_id: int, include: Sequence[str], sort: str = 'id',
+                        after: Tuple[Any, int] | None = None, limit: int | None = None) -> List[VaultModel]:
+        """Get a page of vaults with their children
+
+        This is repository function select the user vaults in keyset
+        pagination order, the included relationships are eager loaded with
+        one statement each.
+
+        Args:
+
+            user_id (int): User id.
+            include (Sequence[str]): Relationships to load, accounts or cards.
+            sort (str): Sort key, prefixed with - for descending order.
+            after (Tuple[Any, int] | None): Position of the last row returned.
+            limit (int | None): Max number of rows.
+
+        Returns:
+
+            List[VaultModel]: The vaults.
+        """
+        sort_field, descending = pagination_utils.parse_sort(sort)
+        statement = select(VaultModel).where(
+            _user_vaults(user_id)
+        ).options(*_include_options(include))
+        statement = pagination_utils.keyset_page(
+            statement, getattr(VaultModel, sort_field), VaultModel.id,
+            descending, after, limit)
+        return self.session.scalars(statement).all()
+
+    def stream_vaults(self, user_id: int, batch_size: int) -> Iterator[List[VaultModel]]:
+        statement = select(VaultModel).where(
+            _user_vaults(user_id)).order_by(VaultModel.id)
+        return self.session.scalars(
+            statement.execution_options(yield_per=batch_size)).partitions()
+
+    def get_vault(self, vault_id: int, user_id: int) -> Dict[str, Any] | None:
+        """Get a vault
+
+        This is repository function select only the fields of the vault,
+        the read model of GET /vaults/{id}.
+
+        Args:
+
+            vault_id (int): Vault id.
+            user_id (int): User id.
+
+        Returns:
+
+            Dict[str, Any] | None: The vault fields, None if it is not found.
+        """
+        statement = select(
+            *(getattr(VaultModel, field) for field in vault_schema.VaultOut.__fields__)
+        ).where(
             and_(
                 VaultModel.id == vault_id,
-                VaultModel.user_id == user_id
+                _user_vaults(user_id),
+            )
+        )
+        vault = self.session.execute(statement).first()
+        return vault._asdict() if vault else None
+
+    def get_vault_by_id(self,  vault_id: str, user_id: int, include: Sequence[str] = ()) -> VaultModel:
+        return self.session.query(VaultModel).options(*_include_options(include)).filter(
+            and_(
+                VaultModel.id == vault_id,
+                _user_vaults(user_id)
             )
         ).first()
 
@@ -40,25 +164,174 @@ class VaultRepository():
         return self.session.query(VaultModel).filter(
             and_(
                 VaultModel.name == vault_name,
-                VaultModel.user_id == user_id
+                _user_vaults(user_id)
             )
         ).first()
 
-    def update_vault(self, user_id: int, vault_id: int, update_data: vault_schema.VaultBase) -> VaultModel:
-        vault_db = self.get_vault_by_id(vault_id, user_id)
-        
-        vault_db.name = update_data.name
-        vault_db.description = update_data.description
-        vault_db.icon_type = update_data.icon_type
+    def update_vault(self, user_id: int, vault_id: int, update_data: vault_schema.VaultBase) -> VaultModel | None:
+        """Update a vault
+
+        This is repository function update the vault in a single round trip,
+        the vault name is verified by the unique constraint.
 
-        self.session.add(vault_db)
-        self.session.commit()
-        self.session.refresh(vault_db)
+        Args:
+
+            user_id (int): User id.
+            vault_id (int): Vault id.
+            update_data (VaultBase): The new data.
+
+        Raises:
+
+            DuplicateError: If the vault name already exists.
+
+        Returns:
+
+            VaultModel | None: The vault, None if it is not found.
+        """
+        statement = update(VaultModel).where(
+            and_(
+                VaultModel.id == vault_id,
+                _user_vaults(user_id),
+            )
+        ).values(
+            **update_data.dict(exclude={'user_id'})
+        ).returning(VaultModel)
+
+        with write_transaction(self.session):
+            vault_db = self.session.scalars(statement).first()
+            if vault_db:
+                UserRepository(self.session).bump_collection_version(vault_db.user_id)
+                invalidation_bus.publish(self.session, vault_db.user_id, invalidation_bus.VAULT, vault_db.id)
         return vault_db
 
-    def delete_vault(self, vault_id: int, user_id) -> VaultModel:
-        vault_db = self.get_vault_by_id(vault_id, user_id)
+    def delete_vault(self, vault_id: int, user_id: int, purge_threshold: int) -> Tuple[VaultModel | None, bool]:
+        """Delete a vault
+
+        This is repository function delete the vault with a single statement,
+        the database cascade deletes its accounts and cards. A vault with
+        more items than the threshold is only marked as deleted, the vault
+        purger deletes its items in batches. The name is released at once.
+
+        Args:
+
+            vault_id (int): Vault id.
+            user_id (int): User id.
+            purge_threshold (int): Max number of items deleted with the vault.
+
+        Returns:
+
+            Tuple[VaultModel | None, bool]: The vault, None if it is not found, and True if it waits for the purge.
+        """
+        vault_filter = and_(VaultModel.id == vault_id, _user_vaults(user_id))
+        with write_transaction(self.session):
+            items = sum(
+                self.session.scalar(select(func.count()).select_from(
+                    select(model.id).where(model.vault_id == vault_id, model.user_id == user_id)
+                    .limit(purge_threshold + 1).subquery()))
+                for model in (AccountModel, CardModel)
+            )
+            purge = items > purge_threshold
+            if purge:
+                # Read before the update, the response has the name
+                vault_db = self.session.scalars(
+                    select(VaultModel).where(vault_filter).with_for_update()).first()
+                if vault_db:
+                    self.session.execute(update(VaultModel.__table__).where(
+                        VaultModel.id == vault_id).values(deleted=True, name=None))
+            else:
+                vault_db = self.session.scalars(
+                    delete(VaultModel).where(vault_filter).returning(VaultModel)).first()
+
+            if vault_db:
+                UserRepository(self.session).bump_collection_version(user_id)
+                invalidation_bus.publish(self.session, user_id, invalidation_bus.VAULT, vault_id)
+        return vault_db, purge and vault_db is not None
+
+    def get_deleted_vaults(self, limit: int) -> List[Row]:
+        statement = select(VaultModel.id, VaultModel.user_id).where(
+            VaultModel.deleted).order_by(VaultModel.id).limit(limit)
+        return self.session.execute(statement).all()
+
+    def purge_vault_items(self, vault_id: int, user_id: int, batch_size: int) -> int:
+        """Purge a batch of vault items
+
+        This is repository function delete a batch of the accounts and cards
+        of a vault marked as deleted, in its own transaction. On Postgres the
+        purgers of the workers skip the rows locked by each other.
 
-        self.session.delete(vault_db)
-        self.session.commit()
+        Args:
+
+            vault_id (int): Vault id.
+            user_id (int): User id, the partition of the items.
+            batch_size (int): Max number of rows of every table.
+
+        Returns:
+
+            int: The number of rows deleted.
+        """
+        deleted = 0
+        with write_transaction(self.session):
+            for model in (AccountModel, CardModel):
+                items = and_(model.vault_id == vault_id, model.user_id == user_id)
+                batch = select(model.id).where(items).limit(batch_size).with_for_update(skip_locked=True)
+                deleted += self.session.execute(
+                    delete(model.__table__).where(items, model.id.in_(batch))).rowcount
+        return deleted
+
+    def delete_purged_vault(self, vault_id: int) -> None:
+        with write_transaction(self.session):
+            self.session.execute(delete(VaultModel.__table__).where(
+                VaultModel.id == vault_id, VaultModel.deleted))
+
+
+class AsyncVaultRepository(AsyncRepository):
+    repository_class = VaultRepository
+
+    async def create_vault(self, vault: vault_schema.VaultBase) -> VaultModel:
+        vault_db = await self.run(VaultRepository.create_vault, vault)
+        await invalidation_bus.bus.evict(ChangeEvent(vault.user_id, invalidation_bus.VAULT, vault_db.id))
+        return vault_db
+
+    async def get_vaults(self, user_id: int, collection_version: int, fields: List[str], sort: str = 'id',
+                         after: Tuple[Any, int] | None = None, limit: int | None = None) -> List[Row]:
+        # The pages are cached by collection version, a write makes them unreachable. The
+        # version is the one read for the ETag, a cached page costs no statement
+        query = hashlib.blake2b(
+            json.dumps([fields, sort, after, limit]).encode(), digest_size=8).hexdigest()
+
+        async def load() -> List[Dict[str, Any]]:
+            vaults_db = await self.run(VaultRepository.get_vaults, user_id, fields, sort, after, limit)
+            return [vault._asdict() for vault in vaults_db]
+
+        vaults = await response_cache.get_or_load(
+            user_id, 'vaults', (collection_version, query), load)
+        return cache.rows(fields, vaults)
+
+    async def get_vault_trees(self, user_id: int, include: Sequence[str], sort: str = 'id',
+                              after: Tuple[Any, int] | None = None, limit: int | None = None) -> List[VaultModel]:
+        return await self.run(VaultRepository.get_vault_trees, user_id, include, sort, after, limit)
+
+    def stream_vaults(self, user_id: int, batch_size: int) -> AsyncIterator[List[VaultModel]]:
+        return self.stream(VaultRepository.stream_vaults, user_id, batch_size)
+
+    async def get_vault(self, vault_id: int, user_id: int, collection_version: int) -> Dict[str, Any] | None:
+        # Cached by collection version, a write makes the vault unreachable
+        return await response_cache.get_or_load(
+            user_id, 'vault', (collection_version, vault_id),
+            lambda: self.run(VaultRepository.get_vault, vault_id, user_id))
+
+    async def get_vault_by_id(self, vault_id: int, user_id: int, include: Sequence[str] = ()) -> VaultModel:
+        return await self.run(VaultRepository.get_vault_by_id, vault_id, user_id, include)
+
+    async def get_vault_by_name(self, vault_name: str, user_id: int) -> VaultModel:
+        return await self.run(VaultRepository.get_vault_by_name, vault_name, user_id)
+
+    async def update_vault(self, user_id: int, vault_id: int, update_data: vault_schema.VaultBase) -> VaultModel | None:
+        vault_db = await self.run(VaultRepository.update_vault, user_id, vault_id, update_data)
+        await invalidation_bus.bus.evict(ChangeEvent(user_id, invalidation_bus.VAULT, vault_id))
         return vault_db
+
+    async def delete_vault(self, vault_id: int, user_id: int, purge_threshold: int) -> Tuple[VaultModel | None, bool]:
+        vault_db, purge = await self.run(VaultRepository.delete_vault, vault_id, user_id, purge_threshold)
+        await invalidation_bus.bus.evict(ChangeEvent(user_id, invalidation_bus.VAULT, vault_id))
+        return vault_db, purge
@@ -0,0 +1,240 @@
+"""Resharding
+
+Offline tool to move users between the shards of DATABASE_SHARD_URLS. A
+user is copied to the target shard with the same ids, the directory is
+switched to the target and then the user is deleted from the source. The
+user must not write while it is moved; a failed move is retried from the
+start, the leftovers of the previous attempt in the target are replaced.
+The servers evict the cached shard of a moved user by NOTIFY on Postgres,
+on other databases they find the move after SHARD_CACHE_TTL_SECONDS.
+
+The ids of the vaults, accounts and cards of a user are kept, so the shards
+need disjoint id ranges. `reserve-ids` moves the Postgres sequences of every
+shard to its own range; on databases without sequences a move stops on an
+id collision instead of overwriting a row.
+
+The user ids are allocated by the directory. `register-users` adds the
+entries of the users inserted without one (they can not log in), and moves
+the directory sequence past their ids so a signup does not take them.
+
+Usage:
+
+    $ python -m src.infra.database.resharding reserve-ids
+    $ python -m src.infra.database.resharding move --user-id 7 --shard 1
+    $ python -m src.infra.database.resharding rebalance --dry-run
+    $ python -m src.infra.database.resharding register-users
+"""
+import argparse
+import logging
+from typing import List, Tuple
+from sqlalchemy import Table, delete, func, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from src.infra.database.config import database, invalidation_bus
+from src.infra.database.config.sharding import shard_map
+from src.infra.database.models import AccountModel, CardModel, UserModel, VaultModel
+from src.infra.database.models.user_directory_model import UserDirectoryModel
+from src.infra.database.repositories.directory_repository import DirectoryRepository
+
+logger = logging.getLogger(__name__)
+
+# The tables of a user, the parents first
+USER_TABLES: List[Table] = [
+    UserModel.__table__, VaultModel.__table__, AccountModel.__table__, CardModel.__table__]
+# The ids of a shard start at its number times the span, 21 shards fit in an Integer
+SHARD_ID_SPAN = 100_000_000
+
+
+class ReshardingError(Exception):
+    """Raised when a user can not be moved."""
+
+
+def _user_filter(table: Table, user_id: int):
+    return table.c.id == user_id if table is UserModel.__table__ else table.c.user_id == user_id
+
+
+def _delete_user_rows(connection, user_id: int) -> None:
+    for table in reversed(USER_TABLES):
+        connection.execute(delete(table).where(_user_filter(table, user_id)))
+
+
+def move_user(user_id: int, target: int) -> bool:
+    """Move user
+
+    This is function move the rows of a user to the target shard, and point
+    the directory to it.
+
+    Args:
+
+        user_id (int): User id.
+        target (int): The target shard.
+
+    Raises:
+
+        ReshardingError: If the user or the shard does not exist, or an id is taken in the target.
+
+    Returns:
+
+        bool: True if the user was moved, False if it is already in the target.
+    """
+    if not 0 <= target < len(database.shard_engines):
+        raise ReshardingError(f'Unknown shard {target}.')
+
+    with database.SessionLocal() as session:
+        source = DirectoryRepository(session).get_shard(user_id)
+    if source is None:
+        raise ReshardingError(f'User {user_id} is not in the directory.')
+    if source == target:
+        return False
+
+    source_engine: Engine = database.shard_engines[source]
+    target_engine: Engine = database.shard_engines[target]
+
+    with source_engine.connect() as connection:
+        rows = [
+            (table, connection.execute(
+                select(table).where(_user_filter(table, user_id)).order_by(table.c.id)).mappings().all())
+            for table in USER_TABLES
+        ]
+
+    try:
+        with target_engine.begin() as connection:
+            _delete_user_rows(connection, user_id)
+            for table, table_rows in rows:
+                if table_rows:
+                    connection.execute(insert(table), [dict(row) for row in table_rows])
+    except IntegrityError as error:
+        raise ReshardingError(f'User {user_id} has an id taken in shard {target}: {error.orig}') from error
+
+    with database.SessionLocal() as session:
+        DirectoryRepository(session).set_shard(user_id, target)
+    with database.SessionLocal() as session, session.begin():
+        # Evict the cached shard of the user in the workers
+        invalidation_bus.publish(session, user_id, invalidation_bus.USER, user_id)
+
+    with source_engine.begin() as connection:
+        _delete_user_rows(connection, user_id)
+
+    logger.info('Moved user %s from shard %s to shard %s', user_id, source, target)
+    return True
+
+
+def misplaced_users() -> List[Tuple[int, int, int]]:
+    """The users that are not on their hash placement, by id, shard and placement."""
+    with database.SessionLocal() as session:
+        entries = DirectoryRepository(session).get_entries()
+    return [
+        (entry.id, entry.shard, shard_map.place(entry.id))
+        for entry in entries
+        if entry.shard != shard_map.place(entry.id)
+    ]
+
+
+def reserve_ids() -> None:
+    """Move the id sequences of every Postgres shard to the start of its range."""
+    for number, engine in enumerate(database.shard_engines):
+        if engine.dialect.name != 'postgresql':
+            logger.warning('Shard %s has no sequences, its ids are not reserved', number)
+            continue
+
+        with engine.begin() as connection:
+            for table in USER_TABLES[1:]:
+                current = connection.scalar(select(func.max(table.c.id))) or 0
+                # The next id is the value, or the one after the rows already in the shard
+                connection.execute(
+                    text('SELECT setval(pg_get_serial_sequence(:table, :column), :value, false)'),
+                    {'table': table.name, 'column': 'id',
+                     'value': max(current, number * SHARD_ID_SPAN) + 1},
+                )
+        logger.info('Reserved the ids of shard %s from %s', number, number * SHARD_ID_SPAN + 1)
+
+
+def register_users() -> List[Tuple[int, int]]:
+    """Register users
+
+    This is function add the directory entries of the users of the shards
+    that have none, and move the directory sequence past their ids on
+    Postgres. Without shards the main database is the only one.
+
+    Raises:
+
+        ReshardingError: If the id of a user is taken in the directory by another user.
+
+    Returns:
+
+        List[Tuple[int, int]]: The registered users, by id and shard.
+    """
+    with database.SessionLocal() as session:
+        entries = {entry.id: entry for entry in DirectoryRepository(session).get_entries()}
+
+    rows = []
+    for number, engine in enumerate(database.shard_engines or [database.engine]):
+        with engine.connect() as connection:
+            users = connection.execute(
+                select(UserModel.id, UserModel.email, UserModel.username).order_by(UserModel.id)).all()
+        for user in users:
+            entry = entries.get(user.id)
+            if entry is None:
+                rows.append({'id': user.id, 'email': user.email, 'username': user.username, 'shard': number})
+            elif (entry.email, entry.username) != (user.email, user.username):
+                raise ReshardingError(f'User {user.id} of shard {number} has the id of another user in the directory.')
+
+    with database.engine.begin() as connection:
+        if rows:
+            try:
+                connection.execute(insert(UserDirectoryModel.__table__), rows)
+            except IntegrityError as error:
+                raise ReshardingError(f'A name of a user is already registered: {error.orig}') from error
+        if connection.dialect.name == 'postgresql':
+            # Never backwards, the ids of the deleted users are not given again
+            connection.execute(text(
+                "SELECT setval(CAST(pg_get_serial_sequence('user_directory', 'id') AS regclass), GREATEST("
+                "COALESCE((SELECT MAX(id) FROM user_directory), 0), COALESCE(pg_sequence_last_value("
+                "CAST(pg_get_serial_sequence('user_directory', 'id') AS regclass)), 0)) + 1, false)"
+            ))
+    for row in rows:
+        logger.info('Registered user %s of shard %s', row['id'], row['shard'])
+    return [(row['id'], row['shard']) for row in rows]
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('reserve-ids', help='Give every shard its own id range.')
+    move_parser = subparsers.add_parser('move', help='Move a user to a shard.')
+    move_parser.add_argument('--user-id', type=int, required=True)
+    move_parser.add_argument('--shard', type=int, required=True)
+    rebalance_parser = subparsers.add_parser(
+        'rebalance', help='Move every user to its hash placement, after the shards change.')
+    rebalance_parser.add_argument('--dry-run', action='store_true')
+    subparsers.add_parser('register-users', help='Add the users without a directory entry to the directory.')
+    args = parser.parse_args()
+
+    if args.command == 'register-users':
+        try:
+            register_users()
+        except ReshardingError as error:
+            parser.exit(1, f'{error}\n')
+        return
+    if not database.shard_engines:
+        parser.error('DATABASE_SHARD_URLS is not set.')
+
+    if args.command == 'reserve-ids':
+        reserve_ids()
+    elif args.command == 'move':
+        try:
+            moved = move_user(args.user_id, args.shard)
+        except ReshardingError as error:
+            parser.exit(1, f'{error}\n')
+        if not moved:
+            print(f'User {args.user_id} is already in shard {args.shard}.')
+    else:
+        for user_id, shard, placement in misplaced_users():
+            print(f'user {user_id}: shard {shard} -> {placement}')
+            if not args.dry_run:
+                move_user(user_id, placement)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from typing import List
+from fastapi.concurrency import run_in_threadpool
+from src.core import metrics
+from src.core.settings import Settings
+from src.infra.database.config import database
+from src.infra.database.repositories.vault_repository import VaultRepository
+
+logger = logging.getLogger(__name__)
+settings = Settings()
+
+vault_items_purged = metrics.counter(
+    'vault_items_purged_total', 'Accounts and cards of the deleted vaults purged in background.')
+vaults_purged = metrics.counter(
+    'vaults_purged_total', 'Deleted vaults removed after the purge of their items.')
+
+# Vaults read from the queue at a time
+QUEUE_BATCH = 100
+
+
+class VaultPurger():
+    """Vault purger
+
+    Background task of the worker that deletes the items of the vaults
+    marked as deleted, a batch by transaction, and then the vaults. The
+    marked vaults are the queue: a delete wakes the purger of its worker, and
+    every interval the purgers look for the vaults left by the other workers
+    or before a restart. The purgers of a vault take distinct batches on
+    Postgres.
+    """
+
+    def __init__(self, batch_size: int, interval: float) -> None:
+        self.batch_size = batch_size
+        self.interval = interval
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def wake(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    def purge(self) -> int:
+        """Purge
+
+        This is function delete the items of the marked vaults of every
+        shard, and then the vaults.
+
+        Returns:
+
+            int: The number of vaults removed.
+        """
+        purged = 0
+        for session_local in database.ShardSessionLocal:
+            with session_local() as session:
+                repository = VaultRepository(session)
+                vaults: List = repository.get_deleted_vaults(limit=QUEUE_BATCH)
+                for vault_id, user_id in vaults:
+                    while True:
+                        deleted = repository.purge_vault_items(vault_id, user_id, self.batch_size)
+                        vault_items_purged.inc(deleted)
+                        if not deleted:
+                            break
+                    repository.delete_purged_vault(vault_id)
+                    vaults_purged.inc()
+                    purged += 1
+        return purged
+
+    async def run(self) -> None:
+        while True:
+            # Cleared first, a delete during the purge runs it again
+            self._wake.clear()
+            try:
+                while await run_in_threadpool(self.purge) == QUEUE_BATCH:
+                    pass
+            except Exception:
+                logger.exception('Vault purge failed, retrying in %s seconds', self.interval)
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._wake = None
+
+
+vault_purger = VaultPurger(batch_size=settings.vault_purge_batch_size,
+                           interval=settings.vault_purge_interval)
@@ -0,0 +1,91 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable
+from src.core import metrics
+from src.core.settings import Settings
+
+settings = Settings()
+
+hashing_queue_depth = metrics.gauge(
+    'hashing_queue_depth', 'Password hashing jobs queued or running.')
+hashing_latency = metrics.histogram(
+    'hashing_latency_seconds', 'Password hashing latency, queue wait included.', ['operation'])
+hashing_rejected = metrics.counter(
+    'hashing_rejected_total', 'Password hashing jobs rejected because the queue was full.', ['operation'])
+
+
+class HashingQueueFull(Exception):
+    """Raised when the hashing queue can not take more jobs."""
+
+
+class HashingExecutor():
+    """Hashing executor
+
+    Dedicated process pool for the bcrypt hashing and verification, so a login
+    burst never takes the threadpool used by the other path operations. The
+    jobs waiting for a process are bounded, a job over the bound is rejected
+    with HashingQueueFull instead of piling up.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int) -> None:
+        self.max_workers = max_workers
+        self.max_pending = max_workers + max_queue
+        self.pending = 0
+        self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use, spawned processes do not inherit the app state
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return self._executor
+
+    async def run(self, operation: str, function: Callable, *args: Any) -> Any:
+        """Run a hashing function in the process pool
+
+        Args:
+
+            operation (str): Operation name for the metrics.
+            function (Callable): Module level function to run.
+
+        Raises:
+
+            HashingQueueFull: If the queue is full.
+
+        Returns:
+
+            Any: The function result.
+        """
+        if self.pending >= self.max_pending:
+            hashing_rejected.inc(operation=operation)
+            raise HashingQueueFull()
+
+        self.pending += 1
+        hashing_queue_depth.set(self.pending)
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), function, *args)
+        finally:
+            self.pending -= 1
+            hashing_queue_depth.set(self.pending)
+            hashing_latency.observe(
+                time.perf_counter() - start, operation=operation)
+
+    def after_fork(self) -> None:
+        """Forget the pool of the parent process, the forked worker creates its own."""
+        self._executor = None
+        self.pending = 0
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hashing_executor = HashingExecutor(max_workers=settings.hashing_workers,
+                                   max_queue=settings.hashing_queue_size)
@@ -1,4 +1,5 @@
 from passlib.context import CryptContext
+from src.infra.providers.hashing_executor import hashing_executor
 
 password_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 
@@ -34,3 +35,40 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         bool: True if the password matches hasehd password or False if not match.
     """
     return password_context.verify(plain_password, hashed_password)
+
+
+async def hash_password_async(password: str) -> str:
+    """Hashes a password using bcrypt in the hashing executor.
+
+    Args:
+
+        password (str): The plain password.
+
+    Raises:
+
+        HashingQueueFull: If the hashing queue is full.
+
+    Returns:
+
+        str: The hased password.
+    """
+    return await hashing_executor.run('hash', hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify Password in the hashing executor.
+
+    Args:
+
+        plain_password (str): Plain password by login.
+        hashed_password (str): Hashed password by database.
+
+    Raises:
+
+        HashingQueueFull: If the hashing queue is full.
+
+    Returns:
+
+        bool: True if the password matches hasehd password or False if not match.
+    """
+    return await hashing_executor.run('verify', verify_password, plain_password, hashed_password)
@@ -1,6 +1,8 @@
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timedelta
-from jose import jwt
+from jose import jwt, JWTError
+from pydantic import ValidationError
+from src.infra.schemas import token_schema
 # Settings
 from src.core.settings import Settings
 
@@ -41,6 +43,30 @@ def create_access_token(data: dict, expieres_delta: timedelta | None = None) ->
 
 
 
-def verify_token(token: str):
+def verify_token(token: str) -> token_schema.TokenData:
+    """Verify token
+
+    This is function decode the token and return the user id and the token
+    version of its claims.
+
+    Args:
+
+        token (str): The user token.
+
+    Raises:
+
+        JWTError: If the token is not valid or its claims are not the expected.
+
+    Returns:
+
+        token_schema.TokenData: The token data.
+    """
     to_decode = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    return to_decode.get('sub')
+    try:
+        return token_schema.TokenData(
+            user_id=to_decode.get('sub'),
+            token_version=to_decode.get('ver'),
+        )
+    except ValidationError:
+        raise JWTError('Invalid token claims.')
+
@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal
+from pydantic import BaseModel, EmailStr, Field, root_validator, validator
 from src.mixins.models_mixin import IDMixin, UserIDReferenceMixin, VaultIDReferenceMixin, NameMixin, UsernameMixin, EmailMixin, PasswordMixin, DescriptionMixin, IconTypeMixin
 
 
@@ -25,3 +26,111 @@ class AccountCreate(AccountBase):
 class AccountOut(IDMixin, AccountCreate, AccountBase):
     class Config:
         orm_mode = True
+
+
+class AccountMetadataOut(IDMixin, AccountBase):
+    """Account without the password, the secrets are revealed on request."""
+    class Config:
+        orm_mode = True
+
+
+class AccountRevealIn(BaseModel):
+    ids: List[int] = Field(
+        ...,
+        min_items=1,
+        max_items=500,
+        unique_items=True,
+        example=[1, 2],
+    )
+
+
+class AccountSecretOut(BaseModel):
+    id: int
+    password: str
+
+
+class AccountPartialOut(BaseModel):
+    """Account with only the fields selected by the client."""
+    id: int | None
+    name: str | None
+    username: str | None
+    email: str | None
+    password: str | None
+    description: str | None
+    page_url: str | None
+    icon_type: str | None
+    vault_id: int | None
+    user_id: int | None
+
+
+class AccountImportResult(BaseModel):
+    row: int = Field(..., ge=1, description='Row of the item in the import, from 1.')
+    status: Literal['imported', 'invalid', 'duplicate']
+    id: int | None
+    name: str | None
+    detail: str | None
+
+
+class AccountImportReport(BaseModel):
+    imported: int
+    failed: int
+    results: List[AccountImportResult]
+
+
+class AccountPatch(BaseModel):
+    """The account fields to change, the fields that are not set keep their values."""
+    name: str | None = Field(None, min_length=1, max_length=40, example='Social')
+    username: str | None = Field(None, min_length=1, max_length=40, example='username123')
+    email: EmailStr | None = None
+    description: str | None = Field(None, min_length=1, max_length=240, example='This is a description.')
+    page_url: str | None = Field(None, max_length=260, example='https://www.facebook.com/')
+    icon_type: str | None = Field(None, min_length=1, max_length=260, example='name-icon')
+    password: str | None = Field(None, min_length=1, max_length=64, example='Mypassword')
+
+    @validator('name', 'username', 'email', 'icon_type', 'password', pre=True)
+    def not_null(cls, value: Any) -> Any:
+        if value is None:
+            raise ValueError('may not be null')
+        return value
+
+
+class AccountBatchOperation(BaseModel):
+    op: Literal['delete', 'move', 'update']
+    ids: List[int] = Field(
+        ...,
+        min_items=1,
+        max_items=500,
+        unique_items=True,
+        example=[1, 2],
+    )
+    vault_id: int | None = Field(None, ge=1, description='The target vault of a move.')
+    values: AccountPatch | None = Field(None, description='The fields of an update.')
+
+    @root_validator(skip_on_failure=True)
+    def check_arguments(cls, operation: Dict[str, Any]) -> Dict[str, Any]:
+        values = operation['values'].dict(exclude_unset=True) if operation['values'] else {}
+        if operation['op'] == 'move' and operation['vault_id'] is None:
+            raise ValueError('A move needs the vault_id.')
+        if operation['op'] == 'update' and not values:
+            raise ValueError('An update needs the values.')
+        # The names are unique by user
+        if 'name' in values and len(operation['ids']) > 1:
+            raise ValueError('A name can only be set to a single account.')
+        return operation
+
+
+class AccountBatchIn(BaseModel):
+    operations: List[AccountBatchOperation] = Field(..., min_items=1, max_items=100)
+
+
+class AccountBatchResult(BaseModel):
+    operation: int = Field(..., ge=1, description='Position of the operation in the batch, from 1.')
+    id: int
+    status: Literal['deleted', 'moved', 'updated', 'not_found', 'duplicate']
+    detail: str | None
+
+
+class AccountBatchReport(BaseModel):
+    applied: int
+    failed: int
+    results: List[AccountBatchResult]
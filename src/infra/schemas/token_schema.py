@@ -22,4 +22,5 @@ class TokenData(BaseModel):
     The token data model content information by the token.
 
     """
-    user_email: str | None = None
+    user_id: int | None = None
+    token_version: int | None = None
@@ -27,3 +27,17 @@ class UserLogin(UserBase, PasswordMixin):
     
     class Config:
         orm_mode = True
+
+
+class UserPrincipal(UserOut):
+    """User Principal
+
+    The authenticated user, a detached copy of the user cached between
+    requests.
+
+    """
+    secret_key: str
+    token_version: int
+
+    class Config:
+        orm_mode = True
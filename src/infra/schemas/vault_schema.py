@@ -1,4 +1,7 @@
+from typing import List
 from pydantic import BaseModel, Field
+from src.infra.schemas.account_schema import AccountMetadataOut
+from src.infra.schemas.card_schema import CardOut
 from src.mixins.models_mixin import UserIDReferenceMixin, DescriptionMixin, IDMixin, NameMixin, IconTypeMixin
 
 
@@ -9,3 +12,18 @@ class VaultBase(NameMixin, DescriptionMixin, IconTypeMixin, UserIDReferenceMixin
 class VaultOut(IDMixin,  VaultBase):
     class Config:
         orm_mode = True
+
+
+class VaultPartialOut(BaseModel):
+    """Vault with only the fields selected by the client."""
+    id: int | None
+    name: str | None
+    description: str | None
+    icon_type: str | None
+    user_id: int | None
+
+
+class VaultTreeOut(VaultPartialOut):
+    """Vault with the children included by the client."""
+    accounts: List[AccountMetadataOut] | None
+    cards: List[CardOut] | None
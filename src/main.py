@@ -1,12 +1,94 @@
+import shutil
+import tempfile
+from typing import Any, Dict
+from gunicorn.app.base import BaseApplication
 from src.application import create_app
+from src.core import metrics
+from src.core.settings import Settings
+from src.infra.database.config import database, invalidation_bus
+from src.infra.providers.hashing_executor import hashing_executor
+
+settings = Settings()
 
 app = create_app()
 
 
+def post_fork(server: Any, worker: Any) -> None:
+    """Post fork
+
+    This is function reset the state a worker inherits from the preloaded
+    master, the pooled connections and the hashing processes of a process
+    are never shared with another. The engines drop their pools without
+    closing the connections, they still belong to the master.
+
+    Args:
+
+        server (Arbiter): The gunicorn master.
+        worker (Worker): The forked worker.
+    """
+    for engine in database.sync_engines():
+        engine.dispose(close=False)
+    hashing_executor.after_fork()
+    invalidation_bus.after_fork()
+
+
+def child_exit(server: Any, worker: Any) -> None:
+    """Drop the gauges of an exited worker from the shared metrics, a crash skips its shutdown."""
+    if metrics.registry.directory is not None:
+        metrics.registry.mark_process_dead(worker.pid)
+
+
+class Server(BaseApplication):
+    """Server
+
+    Gunicorn master of the uvicorn workers, configured from the settings
+    instead of the command line.
+    """
+
+    def __init__(self, options: Dict[str, Any]) -> None:
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return app
+
+
 def main() -> None:
     """Run FastApi
+
+    Start the server with a worker by core. The app is imported once by the
+    master and the workers are forked from it. On SIGTERM the workers stop
+    accepting connections and the requests in flight have the graceful
+    timeout to finish. The workers share their metrics through METRICS_DIR,
+    or a temporary directory removed on exit.
     """
-    app
+    metrics_dir = settings.metrics_dir
+    if metrics_dir is None and settings.server_workers > 1:
+        metrics_dir = tempfile.mkdtemp(prefix='metrics-')
+    if metrics_dir is not None:
+        metrics.registry.share(metrics_dir)
+
+    def on_exit(server: Any) -> None:
+        if settings.metrics_dir is None and metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+    Server({
+        'bind': f'{settings.server_host}:{settings.server_port}',
+        'workers': settings.server_workers,
+        'worker_class': 'uvicorn_worker.UvicornWorker',
+        'preload_app': True,
+        'post_fork': post_fork,
+        'child_exit': child_exit,
+        'on_exit': on_exit,
+        'backlog': settings.server_backlog,
+        'keepalive': settings.server_keepalive,
+        'timeout': settings.server_timeout,
+        'graceful_timeout': settings.server_graceful_timeout,
+    }).run()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,68 @@
+from typing import Dict, List, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core import security
+from src.infra.database.models import account_model
+from src.infra.database.repositories.account_repository import AsyncAccountRepository
+
+
+def decrypt_passwords(accounts_db: List[account_model.AccountModel],
+                      user_key: security.UserKey) -> Tuple[List[str], Dict[int, str]]:
+    """Decrypt passwords
+
+    This is function decrypt the passwords of the accounts, the passwords
+    still in the legacy format are also encrypted again in the versioned
+    envelope.
+
+    Args:
+
+        accounts_db (List[AccountModel]): The accounts, or rows with the password.
+        user_key (UserKey): The key of the user.
+
+    Returns:
+
+        Tuple[List[str], Dict[int, str]]: The passwords in the accounts order,
+        and the passwords encrypted again by account id.
+    """
+    passwords = [
+        security.decode_password(
+            password_encode=account.password, user_key=user_key)
+        for account in accounts_db
+    ]
+
+    reencoded_passwords = {
+        account.id: security.encode_password(
+            password=password, user_key=user_key)
+        for account, password in zip(accounts_db, passwords)
+        if password and security.is_legacy_password(account.password)
+    }
+    return passwords, reencoded_passwords
+
+
+async def decode_passwords(accounts_db: List[account_model.AccountModel], user_id: int,
+                           user_key: security.UserKey, session: AsyncSession) -> List[str]:
+    """Decode passwords
+
+    This is function decrypt the passwords of the accounts in one batch in
+    the threadpool, the legacy passwords encrypted again are saved before
+    the plain text passwords are returned.
+
+    Args:
+
+        accounts_db (List[AccountModel]): The accounts, or rows with the password.
+        user_id (int): User id.
+        user_key (UserKey): The key of the user.
+        session (AsyncSession): The db session.
+
+    Returns:
+
+        List[str]: The passwords in the accounts order.
+    """
+    passwords, reencoded_passwords = await run_in_threadpool(
+        decrypt_passwords, accounts_db, user_key)
+
+    if reencoded_passwords:
+        await AsyncAccountRepository(session).update_passwords(
+            user_id=user_id, passwords=reencoded_passwords)
+
+    return passwords
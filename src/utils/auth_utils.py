@@ -1,28 +1,48 @@
+import hmac
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer, OAuth2PasswordBearer
 # Database
-from sqlalchemy.orm import Session
-from src.infra.database.config.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.infra.database.config.sharding import get_db
 from src.infra.providers import password_provider
 # Repository
-from src.infra.database.repositories.user_repository import UserRepository
+from src.infra.database.repositories.user_repository import AsyncUserRepository
 # JWT
 from jose import JWTError
 from src.infra.providers import token_provider
 # Model
 from src.infra.database.models.user_model import UserModel
+# Schema
+from src.infra.schemas import user_schema
 # Settings
 from src.core.settings import Settings
+from src.core.ttl_cache import TTLCache
+from src.infra.database.config import invalidation_bus
 
 
 settings = Settings()
 url_prefix = settings.api_v1_url
 
+# Authenticated users by id, a short TTL bounds the staleness of a cached user
+principal_cache = TTLCache(max_size=settings.principal_cache_size,
+                           ttl=settings.principal_cache_ttl)
+
+
+def _evict_principal(event: invalidation_bus.ChangeEvent) -> None:
+    # A user written on another worker may have revoked its tokens
+    if event.kind == invalidation_bus.USER:
+        principal_cache.invalidate(event.user_id)
+
+
+invalidation_bus.bus.subscribe(_evict_principal, principal_cache.clear)
+
 # Instance the login url and to validate token
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f'{url_prefix}/auth/login')
+# The internal endpoints answer the 401 themselves
+internal_scheme = HTTPBearer(auto_error=False)
 
 
-def authenticate_user(user_email: str, password: str, session: Session = Depends(get_db)) -> UserModel | bool:
+async def authenticate_user(user_email: str, password: str, session: AsyncSession = Depends(get_db)) -> UserModel | bool:
     """Authenticate user
 
     This is function recibed the username and password and verify to exists and the password is correct.
@@ -36,18 +56,20 @@ def authenticate_user(user_email: str, password: str, session: Session = Depends
 
         UserModel | bool: UserModel is the user object or bool default is False.
     """
-    user = UserRepository(session).get_user(user_email)
+    user = await AsyncUserRepository(session).get_user(user_email)
     if not user:
         return False
-    if not password_provider.verify_password(password, user.password):
+    if not await password_provider.verify_password_async(password, user.password):
         return False
     return user
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_db)) -> UserModel:
+async def get_current_user(token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_db)) -> user_schema.UserPrincipal:
     """Get current user
 
-    This is function recibed a token and verify the token is correct.
+    This is function recibed a token and verify the token is correct. The user
+    is loaded by primary key only when it is not in the principal cache or the
+    cached token version is not the one of the token.
 
     Args:
 
@@ -58,7 +80,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Dep
         credentials_exception: code:401, detail:Could not validate credentials, headers:{WWW-Authenticate: Bearer} 
 
     Returns:
-        UserModel: UserModel is the user object
+        user_schema.UserPrincipal: UserPrincipal is the authenticated user
     """
 
     credentials_exception = HTTPException(
@@ -68,11 +90,63 @@ def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Dep
     )
 
     try:
-        email = token_provider.verify_token(token)
+        token_data = token_provider.verify_token(token)
     except JWTError:
         raise credentials_exception
 
-    user = UserRepository(session).get_user(email)
-    if user is None:
+    if token_data.user_id is None or token_data.token_version is None:
         raise credentials_exception
-    return user
+
+    principal = principal_cache.get(token_data.user_id)
+    if principal is None or principal.token_version != token_data.token_version:
+        user = await AsyncUserRepository(session).get_user_by_id(token_data.user_id)
+        if user is None:
+            raise credentials_exception
+
+        principal = user_schema.UserPrincipal.from_orm(user)
+        principal_cache.set(principal.id, principal)
+
+    if principal.token_version != token_data.token_version:
+        raise credentials_exception
+    return principal
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Invalidate principal
+
+    This is function remove the user from the principal cache, it must be
+    called after the user is updated or deleted.
+
+    Args:
+
+        user_id (int): This is the user id.
+    """
+    principal_cache.invalidate(user_id)
+
+
+async def verify_internal_token(credentials: HTTPAuthorizationCredentials | None = Depends(internal_scheme)) -> None:
+    """Verify internal token
+
+    This is function verify the bearer token of the internal endpoints
+    against the INTERNAL_TOKEN setting. Without the setting the internal
+    endpoints are not served.
+
+    Args:
+
+        credentials (HTTPAuthorizationCredentials | None): The bearer token. Defaults to Depends(internal_scheme).
+
+    Raises:
+
+        HTTPException: code:404, detail:Not Found, if INTERNAL_TOKEN is not set.
+        HTTPException: code:401, detail:Could not validate credentials, headers:{WWW-Authenticate: Bearer}
+    """
+    if not settings.internal_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Not Found')
+
+    if credentials is None or not hmac.compare_digest(
+            credentials.credentials.encode(), settings.internal_token.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
@@ -0,0 +1,74 @@
+import hashlib
+from typing import Tuple
+from fastapi import Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.infra.database.repositories.user_repository import AsyncUserRepository
+
+# The client must revalidate, the representation depends on the token
+CACHE_CONTROL = 'private, no-cache'
+VARY = 'Authorization'
+
+
+def collection_etag(request: Request, user_id: int, collection_version: int) -> str:
+    """Collection ETag
+
+    This is function build the strong ETag of a vaults or accounts response.
+    It changes with the collection version of the user, and the digest of the
+    path and the query keeps the representations of every URL apart.
+
+    Args:
+
+        request (Request): The request.
+        user_id (int): User id.
+        collection_version (int): The collection version of the user.
+
+    Returns:
+
+        str: The quoted ETag.
+    """
+    digest = hashlib.blake2b(
+        f'{user_id}:{request.url.path}?{request.url.query}'.encode(), digest_size=8).hexdigest()
+    return f'"{collection_version}-{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check the If-None-Match header against the ETag, with the weak comparison."""
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in (tag.removeprefix('W/') for tag in tags)
+
+
+async def conditional_get(request: Request, response: Response, user_id: int,
+                          session: AsyncSession) -> Tuple[Response | None, int]:
+    """Conditional GET
+
+    This is function answer 304 when the client already has the current
+    representation, only the collection version of the user is read, from
+    the database and not from the response cache. Else the ETag is set in
+    the response and None is returned. The version is returned too, the
+    cached read models of the path operation are keyed by it.
+
+    Args:
+
+        request (Request): The request.
+        response (Response): The response of the path operation.
+        user_id (int): User id.
+        session (AsyncSession): The db session.
+
+    Returns:
+
+        Tuple[Response | None, int]: The 304 response, or None if the path
+        operation must answer, and the collection version.
+    """
+    collection_version = await AsyncUserRepository(session).get_collection_version(user_id=user_id) or 0
+    etag = collection_etag(request, user_id, collection_version)
+    headers = {'ETag': etag, 'Cache-Control': CACHE_CONTROL, 'Vary': VARY}
+
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers), collection_version
+
+    response.headers.update(headers)
+    return None, collection_version
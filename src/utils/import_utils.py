@@ -0,0 +1,174 @@
+import csv
+import io
+import json
+from typing import Any, Dict, List, Tuple
+from fastapi import HTTPException, Request, status
+from pydantic import ValidationError
+from src.infra.schemas import account_schema
+
+CSV_MEDIA_TYPE = 'text/csv'
+JSON_MEDIA_TYPE = 'application/json'
+DEFAULT_ICON_TYPE = 'default'
+
+# Column names of the common exporters (Bitwarden, LastPass, 1Password,
+# Chrome, Firefox) by account field, compared in lower case
+FIELD_ALIASES = {
+    'name': ('name', 'title'),
+    'username': ('username', 'login_username', 'login'),
+    'email': ('email',),
+    'password': ('password', 'login_password'),
+    'page_url': ('page_url', 'url', 'login_uri', 'website'),
+    'description': ('description', 'notes', 'note', 'extra'),
+    'icon_type': ('icon_type',),
+}
+
+
+def _import_error(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=detail,
+    )
+
+
+def _flatten_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten the nested login of the Bitwarden JSON items."""
+    login = item.get('login')
+    if not isinstance(login, dict):
+        return item
+
+    uris = login.get('uris')
+    uri = uris[0] if isinstance(uris, list) and uris else None
+    return {
+        **item,
+        'username': login.get('username'),
+        'password': login.get('password'),
+        'url': uri.get('uri') if isinstance(uri, dict) else None,
+    }
+
+
+def _normalize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Map an exported item to the account fields."""
+    item = {str(key).strip().lower(): value for key, value in item.items()}
+    account = {}
+    for field, aliases in FIELD_ALIASES.items():
+        values = [item[alias] for alias in aliases if item.get(alias) not in (None, '')]
+        account[field] = values[0] if values else None
+
+    # The exporters only have the login, use it as email when it is one
+    if account['email'] is None and '@' in str(account['username'] or ''):
+        account['email'] = account['username']
+    if account['icon_type'] is None:
+        account['icon_type'] = DEFAULT_ICON_TYPE
+    return account
+
+
+async def read_body(request: Request, max_bytes: int) -> bytes:
+    """Read body
+
+    This is function read the body of an import, it stops as soon as the
+    body is larger than the limit, before it is parsed.
+
+    Args:
+
+        request (Request): The request.
+        max_bytes (int): Max size of the body.
+
+    Raises:
+
+        HTTPException(json): If the body is larger than the limit.
+            Code: 413,
+            detail: Import file too large.
+
+    Returns:
+
+        bytes: The body.
+    """
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail='Import file too large.',
+    )
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise too_large
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > max_bytes:
+            raise too_large
+    return bytes(body)
+
+
+def item_name(item: Dict[str, Any]) -> str | None:
+    """The name of an item for its result, only when it is a string."""
+    name = item.get('name')
+    return name if isinstance(name, str) else None
+
+
+def parse_items(body: bytes, content_type: str) -> List[Dict[str, Any]]:
+    """Parse items
+
+    This is function read the items of an import, a CSV with a header row or
+    a JSON array of items (or an object with the array in `items`).
+
+    Args:
+
+        body (bytes): The request body.
+        content_type (str): The request content type.
+
+    Raises:
+
+        HTTPException(json): If the body can not be parsed.
+            Code: 400,
+            detail: Invalid import file.
+
+    Returns:
+
+        List[Dict[str, Any]]: The items, with the account fields.
+    """
+    try:
+        text = body.decode('utf-8-sig')
+        if content_type.startswith(CSV_MEDIA_TYPE):
+            items = list(csv.DictReader(io.StringIO(text)))
+        else:
+            items = json.loads(text)
+            if isinstance(items, dict):
+                items = items.get('items')
+    except (UnicodeDecodeError, csv.Error, ValueError):
+        raise _import_error('Invalid import file.')
+
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise _import_error('Invalid import file.')
+
+    return [_normalize_item(_flatten_item(item)) for item in items]
+
+
+def validate_items(items: List[Dict[str, Any]], vault_id: int,
+                   user_id: int) -> Tuple[Dict[int, account_schema.AccountCreate], Dict[int, str]]:
+    """Validate items
+
+    This is function validate every item with the rules of a new account.
+
+    Args:
+
+        items (List[Dict[str, Any]]): The items of the import.
+        vault_id (int): The vault of the new accounts.
+        user_id (int): The user of the new accounts.
+
+    Returns:
+
+        Tuple[Dict[int, AccountCreate], Dict[int, str]]: The valid accounts
+        and the errors, by row number.
+    """
+    accounts = {}
+    errors = {}
+    for row, item in enumerate(items, start=1):
+        try:
+            accounts[row] = account_schema.AccountCreate(
+                **item, vault_id=vault_id, user_id=user_id)
+        except ValidationError as error:
+            errors[row] = '; '.join(
+                f'{".".join(map(str, detail["loc"]))}: {detail["msg"]}'
+                for detail in error.errors()
+            )
+    return accounts, errors
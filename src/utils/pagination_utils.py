@@ -0,0 +1,171 @@
+import base64
+import binascii
+import json
+from typing import Any, Iterable, List, Sequence, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import Select, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+
+# Sort keys accepted by the list path operations, all backed by an index
+SORT_PATTERN = '^-?(id|name)$'
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def parse_sort(sort: str) -> Tuple[str, bool]:
+    """Parse sort
+
+    This is function split a sort key like `-name` in the field and the order.
+
+    Args:
+
+        sort (str): The sort key, prefixed with - for descending order.
+
+    Returns:
+
+        Tuple[str, bool]: The sort field and True if the order is descending.
+    """
+    return sort.lstrip('-'), sort.startswith('-')
+
+
+def parse_fields(fields: str | None, allowed_fields: Sequence[str], required_fields: Iterable[str],
+                 default_fields: Sequence[str] | None = None) -> List[str]:
+    """Parse fields
+
+    This is function validate a comma separated projection, the required
+    fields are always returned.
+
+    Args:
+
+        fields (str | None): Comma separated fields, None for the default fields.
+        allowed_fields (Sequence[str]): The fields that can be requested.
+        required_fields (Iterable[str]): The fields always returned.
+        default_fields (Sequence[str] | None): The fields without a projection, all the allowed fields if it is None.
+
+    Raises:
+
+        HTTPException(json): If a field is not allowed.
+            Code: 400,
+            detail: Unknown fields.
+
+    Returns:
+
+        List[str]: The fields to select.
+    """
+    if fields is None:
+        return list(allowed_fields if default_fields is None else default_fields)
+
+    requested_fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown_fields = set(requested_fields) - set(allowed_fields)
+    if unknown_fields:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Unknown fields: {", ".join(sorted(unknown_fields))}.',
+        )
+
+    return list(dict.fromkeys([*required_fields, *requested_fields]))
+
+
+def encode_cursor(sort: str, sort_value: Any, id: int) -> str:
+    """Encode the position after a row in an opaque cursor."""
+    payload = json.dumps([sort, sort_value, id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str | None, sort: str) -> Tuple[Any, int] | None:
+    """Decode cursor
+
+    This is function return the position encoded in a cursor.
+
+    Args:
+
+        cursor (str | None): The cursor of the previous page.
+        sort (str): The sort key of the request.
+
+    Raises:
+
+        HTTPException(json): If the cursor is not valid for the sort key.
+            Code: 400,
+            detail: Invalid cursor.
+
+    Returns:
+
+        Tuple[Any, int] | None: The sort value and the id of the last row.
+    """
+    if cursor is None:
+        return None
+
+    try:
+        cursor_sort, sort_value, id = json.loads(base64.urlsafe_b64decode(cursor))
+    except (binascii.Error, ValueError, TypeError):
+        cursor_sort = None
+
+    if cursor_sort != sort:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Invalid cursor.',
+        )
+
+    return sort_value, id
+
+
+def keyset_page(statement: Select, sort_column: InstrumentedAttribute, id_column: InstrumentedAttribute,
+                descending: bool, after: Tuple[Any, int] | None, limit: int | None) -> Select:
+    """Keyset page
+
+    This is function order a statement by the sort column and the id, and
+    keep only the rows after the cursor position.
+
+    Args:
+
+        statement (Select): The statement to paginate.
+        sort_column (InstrumentedAttribute): The sort column.
+        id_column (InstrumentedAttribute): The primary key, to break the ties.
+        descending (bool): True for descending order.
+        after (Tuple[Any, int] | None): The position of the last row returned.
+        limit (int | None): Max number of rows.
+
+    Returns:
+
+        Select: The paginated statement.
+    """
+    columns = [id_column] if sort_column is id_column else [sort_column, id_column]
+
+    if after is not None:
+        if sort_column is id_column:
+            key, position = id_column, after[1]
+        else:
+            key, position = tuple_(sort_column, id_column), tuple_(*after)
+        statement = statement.where(key < position if descending else key > position)
+
+    statement = statement.order_by(
+        *(column.desc() if descending else column.asc() for column in columns))
+
+    if limit is not None:
+        statement = statement.limit(limit)
+
+    return statement
+
+
+def split_page(rows: List[Any], limit: int | None, sort: str) -> Tuple[List[Any], str | None]:
+    """Split page
+
+    This is function drop the extra row fetched to know if there is a next
+    page, and return the cursor of the next page.
+
+    Args:
+
+        rows (List[Any]): The rows, at most limit + 1.
+        limit (int | None): The page size, None when not paginated.
+        sort (str): The sort key.
+
+    Returns:
+
+        Tuple[List[Any], str | None]: The rows of the page and the next cursor.
+    """
+    if limit is None or len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    sort_field, _ = parse_sort(sort)
+    last_row = rows[-1]
+    return rows, encode_cursor(sort, getattr(last_row, sort_field), last_row.id)
@@ -0,0 +1,163 @@
+import re
+from array import array
+from collections import defaultdict
+from typing import Iterable, List, Sequence, Tuple
+from src.core.settings import Settings
+from src.core.ttl_cache import TTLCache
+
+settings = Settings()
+
+# Account columns matched by the search, in the n-gram index order
+SEARCH_FIELDS = ('name', 'username', 'email', 'page_url')
+# Share of the query trigrams a field must have, the pg_trgm word_similarity_threshold default
+SIMILARITY_THRESHOLD = 0.6
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+
+def trigrams(text: str) -> set:
+    """Trigrams
+
+    This is function split the text in the trigrams of pg_trgm, every
+    lower case word is padded with two spaces before and one after.
+
+    Args:
+
+        text (str): The text.
+
+    Returns:
+
+        set: The trigrams of the text.
+    """
+    result = set()
+    for word in WORD_PATTERN.findall(text.lower()):
+        padded = f'  {word} '
+        result.update([padded[index:index + 3] for index in range(len(padded) - 2)])
+    return result
+
+
+def _bitmap(keys: Iterable[int], size: int) -> int:
+    """Build the int with the bits of the keys set."""
+    bitmap = bytearray((size + 7) // 8)
+    for key in keys:
+        bitmap[key >> 3] |= 1 << (key & 7)
+    return int.from_bytes(bitmap, 'little')
+
+
+class NgramIndex():
+    """N-gram index
+
+    In-process trigram index of the accounts of a user, the fallback of the
+    pg_trgm indexes when the database is not Postgres. A field matches when
+    it has at least SIMILARITY_THRESHOLD of the query trigrams, the score of
+    an account is its best field.
+
+    Every account field is a bit, at the position of the account times the
+    fields plus the field. The common trigrams are kept as int bitmaps and
+    the hits are counted with bitwise operations, a query that matches every
+    account costs a few operations on ints of a few KB, not a loop by account.
+    """
+
+    def __init__(self, rows: Iterable[Sequence]) -> None:
+        # The rows come ordered by id, the ties are ranked by position
+        self._ids = []
+        postings = defaultdict(list)
+        for position, (account_id, *values) in enumerate(rows):
+            self._ids.append(account_id)
+            for key, value in enumerate(values, start=position * len(SEARCH_FIELDS)):
+                if value:
+                    for trigram in trigrams(value):
+                        postings[trigram].append(key)
+
+        self._size = len(self._ids) * len(SEARCH_FIELDS)
+        # A bitmap is stored when it is smaller than the list of its keys
+        dense_postings = self._size // 64
+        self._postings = {
+            trigram: _bitmap(keys, self._size) if len(keys) > dense_postings else array('L', keys)
+            for trigram, keys in postings.items()
+        }
+        self._first_fields = int(('0' * (len(SEARCH_FIELDS) - 1) + '1') * len(self._ids) or '0', 2)
+
+    def search(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        """Search
+
+        This is function rank the accounts that match the query.
+
+        Args:
+
+            query (str): The search text.
+            limit (int): Max number of accounts.
+
+        Returns:
+
+            List[Tuple[int, float]]: The account ids and their score, best first.
+        """
+        query_trigrams = trigrams(query)
+        if not query_trigrams or not self._ids:
+            return []
+
+        # Bit-sliced counter, the digit i has the bit i of the hits of every field
+        digits = []
+        for trigram in query_trigrams:
+            carry = self._postings.get(trigram, 0)
+            if not isinstance(carry, int):
+                carry = _bitmap(carry, self._size)
+            for index, digit in enumerate(digits):
+                if not carry:
+                    break
+                digits[index], carry = digit ^ carry, digit & carry
+            if carry:
+                digits.append(carry)
+
+        ranking = []
+        ranked = 0
+        all_fields = (1 << self._size) - 1
+        hits = len(query_trigrams)
+        while hits / len(query_trigrams) >= SIMILARITY_THRESHOLD and len(ranking) < limit:
+            matches = all_fields if hits < 1 << len(digits) else 0
+            for index, digit in enumerate(digits):
+                matches &= digit if hits >> index & 1 else ~digit
+
+            # Keep the best field of every account, in the bit of its first field
+            accounts = 0
+            for field in range(len(SEARCH_FIELDS)):
+                accounts |= matches >> field & self._first_fields
+            accounts &= ~ranked
+            ranked |= accounts
+
+            while accounts and len(ranking) < limit:
+                lowest = accounts & -accounts
+                position = (lowest.bit_length() - 1) // len(SEARCH_FIELDS)
+                ranking.append((self._ids[position], hits / len(query_trigrams)))
+                accounts ^= lowest
+            hits -= 1
+
+        return ranking
+
+
+class SearchIndexCache(TTLCache):
+    """Search index cache
+
+    Bounded in-process cache of the n-gram indexes by user id. An index is
+    built for a collection version of the user, a write to the vaults or the
+    accounts makes it stale.
+    """
+
+    def get(self, user_id: int, collection_version: int) -> NgramIndex | None:
+        with self._lock:
+            entry = super().get(user_id)
+            if entry is None:
+                return None
+
+            version, index = entry
+            if version != collection_version:
+                self.invalidate(user_id)
+                return None
+
+            return index
+
+    def set(self, user_id: int, collection_version: int, index: NgramIndex) -> None:
+        super().set(user_id, (collection_version, index))
+
+
+search_index_cache = SearchIndexCache(max_size=settings.search_index_cache_size,
+                                      ttl=settings.search_index_cache_ttl)
@@ -0,0 +1,54 @@
+from functools import lru_cache
+from typing import Any, Callable, Dict, Sequence, Tuple
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+# Set by the body of the fast response, the rest of the headers are copied
+BODY_HEADERS = (b'content-length', b'content-type')
+
+RowSerializer = Callable[[Sequence[Any]], Dict[str, Any]]
+
+
+@lru_cache(maxsize=256)
+def row_serializer(fields: Tuple[str, ...], schema_fields: Tuple[str, ...]) -> RowSerializer:
+    """Row serializer
+
+    This is function build the conversion of a row tuple in the dict of the
+    response, a dict by position is cheaper than zip or `_asdict`. The keys
+    follow the order of the schema fields, as the response model does. The
+    serializers are cached by projection.
+
+    Args:
+
+        fields (Tuple[str, ...]): The selected fields, in the order of the row.
+        schema_fields (Tuple[str, ...]): The fields of the response model.
+
+    Returns:
+
+        RowSerializer: The function of a row to its dict.
+    """
+    positions = {field: position for position, field in enumerate(fields)}
+    pairs = tuple((field, positions[field]) for field in schema_fields if field in positions)
+    return lambda row: {name: row[position] for name, position in pairs}
+
+
+def json_response(content: Any, response: Response) -> Response:
+    """Json response
+
+    This is function serialize the content with orjson, without validating
+    it again against the response model. The headers set in the response of
+    the path operation, like the ETag and the cursor, are kept.
+
+    Args:
+
+        content (Any): The JSON serializable content, built from the rows.
+        response (Response): The response of the path operation.
+
+    Returns:
+
+        Response: The response with the serialized body.
+    """
+    fast_response = ORJSONResponse(content)
+    fast_response.raw_headers.extend(
+        header for header in response.raw_headers if header[0] not in BODY_HEADERS)
+    return fast_response